@@ -0,0 +1,41 @@
+# benchmarks/__init__.py
+"""
+Benchmark di HydroFusion. Ogni modulo si esegue da solo (python -m benchmarks.database) e stampa
+i propri confronti; python -m benchmarks esegue la suite completa e scrive i risultati in JSON.
+"""
+
+import importlib, os, time
+from contextlib import contextmanager
+
+def al_secondo(funzione, chiamate):
+    """Chiama `funzione` senza argomenti `chiamate` volte; restituisce microsecondi per chiamata e chiamate al secondo."""
+    inizio = time.perf_counter()
+    for _ in range(chiamate): funzione()
+    durata = time.perf_counter() - inizio
+    return {"chiamate": chiamate, "us_per_chiamata": durata / chiamate * 1e6, "al_secondo": chiamate / durata}
+
+@contextmanager
+def database_temporaneo(cartella, nome="benchmark.db"):
+    """Punta infrastruttura.database su un file nuovo in `cartella` (schema migrato) e ripristina il percorso all'uscita."""
+    from infrastruttura import database  # Non a livello di modulo: "database" è anche il nome di un benchmark del pacchetto
+    percorso_originale = database.DB_PATH
+    database.chiudi_database()
+    database.DB_PATH = os.path.join(cartella, nome)
+    try:
+        database.setup_database()
+        yield database.DB_PATH
+    finally:
+        database.chiudi_database()
+        database.DB_PATH = percorso_originale
+
+def importa_pagina(nome):
+    """
+    Importa dashboard.pages.<nome> fuori dalla dashboard: dash.register_page richiede un'app Dash
+    con use_pages già creata, quindi ne crea una vuota se non esiste.
+    """
+    import dash
+    try:
+        dash.get_app()
+    except Exception:
+        dash.Dash(__name__, use_pages=True, pages_folder="")
+    return importlib.import_module(f"dashboard.pages.{nome}")
@@ -0,0 +1,70 @@
+# benchmarks/__main__.py
+"""
+Suite completa: python -m benchmarks [--righe 10000,1000000] [--avvio] [-o risultati.json]
+
+Scrive un documento JSON con l'ambiente (versioni, CPU) e i risultati di ogni caso, da confrontare
+tra un rilascio e l'altro. Tutto gira in locale su database temporanei, senza rete.
+"""
+
+import argparse, contextlib, json, os, platform, sqlite3, sys, time
+from datetime import datetime
+
+DIMENSIONI_SUITE = (10_000, 1_000_000, 10_000_000)
+
+def ambiente():
+    import numpy, pandas, plotly
+    return {"python": platform.python_version(), "piattaforma": platform.platform(), "cpu": os.cpu_count(),
+            "numpy": numpy.__version__, "pandas": pandas.__version__, "plotly": plotly.__version__, "sqlite": sqlite3.sqlite_version}
+
+def esegui_suite(dimensioni=DIMENSIONI_SUITE, avvio=False):
+    from benchmarks import database, generatori, grafici, monitoraggio
+    casi = {
+        "generatore_sensore": generatori.bench_genera,
+        "generatore_flotta": generatori.bench_flotta,
+        "classifica_stato": monitoraggio.bench_classifica_stato,
+        "esegui_ciclo_sensore": database.bench_ciclo_sensore,
+        "execute_query": database.bench_execute_query,
+        "coda_ingestione": database.bench_ingestione,
+        "grafici_performance": grafici.bench_grafici_performance,
+    }
+    for righe in dimensioni:
+        casi[f"classificazione_{righe}"] = lambda righe=righe: monitoraggio.bench_classificazione(righe)
+        casi[f"prepara_dati_per_grafico_{righe}"] = lambda righe=righe: monitoraggio.bench_interruzioni(righe)
+        casi[f"carica_dati_filtrati_{righe}"] = lambda righe=righe: monitoraggio.bench_carica_dati_filtrati(righe)
+        casi[f"grafici_sensori_{righe}"] = lambda righe=righe: grafici.bench_grafici_sensori(righe)
+    if avvio:
+        from benchmarks import avvio as bench_avvio
+        casi["import"] = bench_avvio.bench_import
+        casi["avvio_a_freddo"] = bench_avvio.bench_avvio_a_freddo
+
+    risultati = {}
+    for nome, caso in casi.items():
+        print(f"[BENCHMARK] {nome}...", file=sys.stderr, flush=True)
+        inizio = time.perf_counter()
+        risultati[nome] = caso()
+        print(f"[BENCHMARK] {nome} completato in {time.perf_counter() - inizio:.1f} s", file=sys.stderr, flush=True)
+    return risultati
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suite di benchmark HydroFusion (risultati in JSON)")
+    parser.add_argument("--righe", default=",".join(str(righe) for righe in DIMENSIONI_SUITE),
+                        help="Dimensioni dei dati sintetici separate da virgola (default: %(default)s)")
+    parser.add_argument("--avvio", action="store_true", help="Misura anche tempi di import e avvio a freddo di simulatore e dashboard")
+    parser.add_argument("-o", "--output", help="File JSON di destinazione (default: standard output)")
+    args = parser.parse_args(argv)
+
+    dimensioni = [int(righe) for righe in args.righe.split(",") if righe]
+    inizio = datetime.now()
+    # I messaggi dei moduli (es. le migrazioni del database) vanno su stderr: stdout resta JSON valido
+    with contextlib.redirect_stdout(sys.stderr):
+        risultati = esegui_suite(dimensioni, args.avvio)
+    documento = {"data": inizio.isoformat(timespec="seconds"), "durata_s": (datetime.now() - inizio).total_seconds(),
+                 "ambiente": ambiente(), "risultati": risultati}
+    testo = json.dumps(documento, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(testo + "\n")
+    else:
+        print(testo)
+
+if __name__ == "__main__":
+    main()
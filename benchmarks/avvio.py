@@ -0,0 +1,65 @@
+# benchmarks/avvio.py
+
+import os, re, socket, subprocess, sys, tempfile
+from simulazione.launcher import ROOT, avvia_sistema, ferma_sistema
+
+# Tempo cumulativo di import (-X importtime) ammesso per modulo, circa il doppio di quello misurato
+BUDGET_IMPORT_MS = {"simulazione.launcher": 30, "simulazione.main": 900, "dashboard.app": 2800}
+# Librerie pesanti caricate solo quando servono: non devono comparire all'import del modulo
+IMPORT_DIFFERITI = {
+    "simulazione.launcher": ("urllib.request",),
+    "simulazione.main": ("urllib.request", "pyarrow.parquet"),
+    "dashboard.app": ("plotly.express", "pyarrow.parquet"),
+}
+# Dall'avvio del launcher alla prima pagina servita dalla dashboard, a freddo
+BUDGET_PRIMA_PAGINA_S = 6.0
+
+def tempi_import(modulo):
+    """Tempi cumulativi di import in ms, {modulo: ms}, da un interprete nuovo con -X importtime."""
+    risultato = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"], cwd=tempfile.gettempdir(),
+                               env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}, capture_output=True, text=True, check=True)
+    tempi = {}
+    for riga in risultato.stderr.splitlines():
+        corrispondenza = re.match(r"import time:\s+\d+ \|\s+(\d+) \| *(\S+)$", riga)
+        if corrispondenza: tempi[corrispondenza.group(2)] = int(corrispondenza.group(1)) / 1000
+    return tempi
+
+def bench_import(ripetizioni=3):
+    """Per ogni modulo: miglior tempo di import su più interpreti, budget e import differiti caricati per errore."""
+    risultati = {}
+    for modulo, budget in BUDGET_IMPORT_MS.items():
+        misure = [tempi_import(modulo) for _ in range(ripetizioni)]
+        risultati[modulo] = {"ms": min(tempi[modulo] for tempi in misure), "budget_ms": budget,
+                             "differiti_caricati": [nome for nome in IMPORT_DIFFERITI.get(modulo, ()) if nome in misure[0]]}
+    return risultati
+
+def _porta_libera():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def bench_avvio_a_freddo():
+    """Avvia simulatore e dashboard su un database nuovo e misura i secondi fino alla prima pagina."""
+    with tempfile.TemporaryDirectory() as cartella:
+        with open(os.path.join(cartella, "output.log"), "w") as output:
+            processi, tempi = avvia_sistema(cartella, porta=_porta_libera(), output=output)
+            ferma_sistema(processi)
+    return {**tempi, "budget_s": BUDGET_PRIMA_PAGINA_S}
+
+def fuori_budget(importazioni, avvio):
+    """Messaggi per ogni budget superato o import differito caricato all'avvio; lista vuota se tutto è in regola."""
+    errori = [f"{modulo}: import {r['ms']:.0f} ms oltre il budget di {r['budget_ms']} ms" for modulo, r in importazioni.items() if r["ms"] > r["budget_ms"]]
+    errori += [f"{modulo}: {nome} caricato all'import" for modulo, r in importazioni.items() for nome in r["differiti_caricati"]]
+    if avvio["prima_pagina_s"] > avvio["budget_s"]: errori.append(f"prima pagina dopo {avvio['prima_pagina_s']:.2f} s, budget {avvio['budget_s']} s")
+    return errori
+
+if __name__ == "__main__":
+    importazioni = bench_import()
+    for modulo, r in importazioni.items():
+        print(f"{modulo:<22} {r['ms']:>8.0f} ms (budget {r['budget_ms']} ms)")
+    avvio = bench_avvio_a_freddo()
+    print(f"{'simulatore pronto':<22} {avvio['simulatore_pronto_s']:>8.2f} s")
+    print(f"{'prima pagina':<22} {avvio['prima_pagina_s']:>8.2f} s (budget {avvio['budget_s']} s)")
+    errori = fuori_budget(importazioni, avvio)
+    for errore in errori: print(f"FUORI BUDGET: {errore}")
+    sys.exit(1 if errori else 0)
@@ -0,0 +1,99 @@
+# benchmarks/database.py
+
+import os, random, sqlite3, tempfile, time
+from datetime import datetime
+import numpy as np
+from benchmarks import al_secondo, database_temporaneo
+from config.config import SENSORI_PER_SERRA
+from infrastruttura import database, ingestione
+from infrastruttura.motori import MotoreSQLite, imposta_motore_dati, motore_dati
+from simulazione.generatori import GeneratoreSensore
+from simulazione.motore import esegui_ciclo_sensore
+
+NUM_INSERIMENTI = 2000
+
+def _insert_connessione_per_query(percorso, righe):
+    """Riproduce il vecchio execute_query: una connessione, un commit e una chiusura per ogni INSERT."""
+    for riga in righe:
+        conn = sqlite3.connect(percorso, timeout=10)
+        try:
+            conn.execute("INSERT INTO misurazioni (sorgente_id, tipo, valore, timestamp) VALUES (?, ?, ?, ?)", riga)
+            conn.commit()
+        finally:
+            conn.close()
+
+def _insert_writer_persistente(righe):
+    for riga in righe: database.insert_misurazione(*riga)
+
+def _misura(funzione, *args):
+    inizio = time.perf_counter()
+    funzione(*args)
+    return time.perf_counter() - inizio
+
+def bench_insert(num_inserimenti=NUM_INSERIMENTI):
+    """Confronta gli inserimenti al secondo prima (connect-per-insert) e dopo (writer persistente in WAL)."""
+    timestamp = datetime.now().isoformat()
+    righe = [("Serra_1", "pH", 7.0 + (i % 10) / 100, timestamp) for i in range(num_inserimenti)]
+    risultati = {}
+    with tempfile.TemporaryDirectory() as cartella:
+        # Vecchio schema e journal di default (DELETE), non WAL
+        percorso_legacy = os.path.join(cartella, "legacy.db")
+        conn = sqlite3.connect(percorso_legacy)
+        conn.execute("CREATE TABLE misurazioni (id INTEGER PRIMARY KEY, sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, valore REAL NOT NULL, timestamp TEXT NOT NULL)")
+        conn.close()
+        durata = _misura(_insert_connessione_per_query, percorso_legacy, righe)
+        risultati["connessione_per_insert"] = num_inserimenti / durata
+
+        with database_temporaneo(cartella, "wal.db"):
+            durata = _misura(_insert_writer_persistente, righe)
+            risultati["writer_persistente_wal"] = num_inserimenti / durata
+    return risultati
+
+def bench_execute_query(num_inserimenti=NUM_INSERIMENTI):
+    """Istruzioni al secondo con execute_query (un commit ciascuna), come aggiorna_stato_attuale per ogni lettura."""
+    timestamp = datetime.now().isoformat()
+    with tempfile.TemporaryDirectory() as cartella, database_temporaneo(cartella):
+        sensori = iter([(f"Serra_{i % 50}", f"Sensore_{i}", "OK", timestamp) for i in range(num_inserimenti)])
+        return al_secondo(lambda: database.execute_query(database.QUERY_AGGIORNA_STATO, next(sensori)), num_inserimenti)
+
+def bench_ingestione(num_inserimenti=NUM_INSERIMENTI * 10):
+    """Righe al secondo attraverso la coda di ingestione (group commit con executemany)."""
+    with tempfile.TemporaryDirectory() as cartella, database_temporaneo(cartella, "coda.db"):
+        riga = database.riga_misurazione("Serra_1", "pH", 7.0, datetime.now().isoformat())
+        coda = ingestione.CodaIngestione()
+        coda.avvia()
+        inizio = time.perf_counter()
+        for _ in range(num_inserimenti):
+            coda.accoda(database.QUERY_INSERT_MISURAZIONE, riga)
+        coda.ferma()
+        durata = time.perf_counter() - inizio
+    return {"coda_ingestione_batch": num_inserimenti / durata}
+
+def bench_ciclo_sensore(cicli=NUM_INSERIMENTI * 5, seed=0):
+    """
+    Cicli al secondo di esegui_ciclo_sensore da capo a fondo su un database temporaneo: generazione,
+    classificazione, log, scrittura tramite la coda di ingestione e allarmi. Il tempo include lo
+    svuotamento finale della coda, così conta anche la scrittura su SQLite.
+    """
+    random.seed(seed); np.random.seed(seed)
+    sensori = [(sorgente, tipo, GeneratoreSensore(tipo)) for sorgente, tipo in
+               [(f"Serra_{i}", tipo) for i in range(1, 4) for tipo in SENSORI_PER_SERRA]]
+    with tempfile.TemporaryDirectory() as cartella, database_temporaneo(cartella, "ciclo.db"):
+        motore_precedente = motore_dati()
+        imposta_motore_dati(MotoreSQLite())
+        ingestione.avvia_ingestione()
+        inizio = time.perf_counter()
+        try:
+            for i in range(cicli):
+                esegui_ciclo_sensore(*sensori[i % len(sensori)])
+        finally:
+            ingestione.ferma_ingestione()
+            imposta_motore_dati(motore_precedente)
+        durata = time.perf_counter() - inizio
+    return {"cicli": cicli, "us_per_ciclo": durata / cicli * 1e6, "cicli_al_secondo": cicli / durata}
+
+if __name__ == "__main__":
+    for nome, valore in {**bench_insert(), **bench_ingestione()}.items():
+        print(f"{nome:<25} {valore:>12,.0f} insert/s")
+    print(f"{'execute_query':<25} {bench_execute_query()['al_secondo']:>12,.0f} istruzioni/s")
+    print(f"{'esegui_ciclo_sensore':<25} {bench_ciclo_sensore()['cicli_al_secondo']:>12,.0f} cicli/s")
@@ -0,0 +1,46 @@
+# benchmarks/generatori.py
+
+import itertools, random, time
+import numpy as np
+from benchmarks import al_secondo
+from simulazione.generatori import GeneratoreSensore, GeneratoreFlotta, CONFIGURAZIONI
+
+def confronta_statistiche(tipo="pH", passi=200, sensori=200, seed=0):
+    """Media, deviazione standard e frazione di passi in anomalia: generatore scalare contro flotta."""
+    np.random.seed(seed)
+    scalari = [GeneratoreSensore(tipo) for _ in range(sensori)]
+    valori_scalari, anomalie_scalari = [], 0
+    for _ in range(passi):
+        for g in scalari:
+            valori_scalari.append(g.genera()); anomalie_scalari += g.fase == "anomalia"
+    flotta = GeneratoreFlotta([tipo] * sensori, seed=seed)
+    valori_flotta, anomalie_flotta = [], 0
+    for _ in range(passi):
+        valori_flotta.append(flotta.genera()); anomalie_flotta += int(flotta.in_anomalia.sum())
+    valori_flotta = np.concatenate(valori_flotta)
+    totale = passi * sensori
+    return {
+        "scalare": {"media": float(np.mean(valori_scalari)), "std": float(np.std(valori_scalari)), "frazione_anomalia": anomalie_scalari / totale},
+        "flotta": {"media": float(valori_flotta.mean()), "std": float(valori_flotta.std()), "frazione_anomalia": anomalie_flotta / totale},
+    }
+
+def bench_genera(chiamate=100_000, seed=0):
+    """GeneratoreSensore.genera: una lettura per chiamata, ciclando sui tipi di sensore come il simulatore live."""
+    random.seed(seed); np.random.seed(seed)
+    generatori = itertools.cycle([GeneratoreSensore(tipo) for tipo in CONFIGURAZIONI])
+    return al_secondo(lambda: next(generatori).genera(), chiamate)
+
+def bench_flotta(sensori=100_000, passi=50):
+    """Sensori aggiornati al secondo da GeneratoreFlotta su un singolo core."""
+    tipi = list(CONFIGURAZIONI)
+    flotta = GeneratoreFlotta([tipi[i % len(tipi)] for i in range(sensori)], seed=0)
+    inizio = time.perf_counter()
+    for _ in range(passi): flotta.genera()
+    durata = time.perf_counter() - inizio
+    return {"sensori": sensori, "ms_per_tick": durata / passi * 1000, "letture_al_secondo": sensori * passi / durata}
+
+if __name__ == "__main__":
+    for tipo in CONFIGURAZIONI:
+        print(tipo, confronta_statistiche(tipo))
+    print(bench_genera())
+    print(bench_flotta())
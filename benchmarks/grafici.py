@@ -0,0 +1,47 @@
+# benchmarks/grafici.py
+
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.monitoraggio import dati_sintetici, DIMENSIONI
+from config.classificatore import classifica_stati
+from dashboard.utils.grafici import linea_temporale_sensori, subplot_per_sorgente, grafico_produzione, grafico_finanziario
+
+RIGHE_PERFORMANCE = 300  # Quante ne legge la pagina performance
+
+def _migliore(funzione, *args, ripetizioni=3):
+    """Miglior tempo in ms su `ripetizioni` costruzioni, più quello di to_json (ciò che Dash invia al browser)."""
+    tempi, tempi_json = [], []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        figura = funzione(*args)
+        tempi.append(time.perf_counter() - inizio)
+        inizio = time.perf_counter()
+        figura.to_json()
+        tempi_json.append(time.perf_counter() - inizio)
+    return {"costruzione_ms": min(tempi) * 1000, "json_ms": min(tempi_json) * 1000, "punti": sum(len(traccia.x) for traccia in figura.data)}
+
+def bench_grafici_sensori(righe, ripetizioni=3):
+    """Grafici del monitoraggio (un tipo, una sorgente) su `righe` letture sintetiche, ricampionamento M4 compreso."""
+    df = dati_sintetici(righe)
+    df['stato'] = classifica_stati(df['tipo'], df['valore'])
+    tipo, sorgente = df['tipo'].iloc[0], df['sorgente_id'].iloc[0]
+    per_tipo, per_sorgente = df[df['tipo'] == tipo], df[df['sorgente_id'] == sorgente]
+    return {"righe": len(df),
+            "linea_temporale_sensori": {"righe": len(per_tipo), **_migliore(linea_temporale_sensori, per_tipo, tipo, ripetizioni=ripetizioni)},
+            "subplot_per_sorgente": {"righe": len(per_sorgente), **_migliore(subplot_per_sorgente, per_sorgente, sorgente, ripetizioni=ripetizioni)}}
+
+def bench_grafici_performance(righe=RIGHE_PERFORMANCE, ripetizioni=3, seed=0):
+    """Grafici della pagina performance su `righe` cicli di produzione sintetici."""
+    rng = np.random.default_rng(seed)
+    timestamp = pd.date_range("2025-01-01", periods=righe, freq="15s")
+    produzione = pd.DataFrame({"timestamp": timestamp, "biomassa_pesci_kg": np.cumsum(rng.random(righe)), "raccolto_pronto_kg": np.cumsum(rng.random(righe))})
+    ricavi, costi = rng.random(righe) * 10, rng.random(righe) * 8
+    finanziari = pd.DataFrame({"timestamp": timestamp, "ricavi": ricavi, "costi": costi, "profitto_cumulativo": np.cumsum(ricavi - costi)})
+    return {"righe": righe, "grafico_produzione": _migliore(grafico_produzione, produzione, ripetizioni=ripetizioni),
+            "grafico_finanziario": _migliore(grafico_finanziario, finanziari, ripetizioni=ripetizioni)}
+
+if __name__ == "__main__":
+    print(bench_grafici_performance())
+    for righe in DIMENSIONI:
+        print(bench_grafici_sensori(righe))
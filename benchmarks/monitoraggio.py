@@ -0,0 +1,147 @@
+# benchmarks/monitoraggio.py
+
+import itertools, sqlite3, tempfile, time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from benchmarks import al_secondo, database_temporaneo, importa_pagina
+from config.classificatore import classifica_stato, classifica_stati, classificatore, nomi_stati, TUTTE_LE_CONFIG_SENSORI
+from dashboard.utils.cache import svuota_cache
+from infrastruttura import database
+from simulazione.main import elenco_sensori
+
+monitoraggio = importa_pagina("monitoraggio")
+prepara_dati_per_grafico = monitoraggio.prepara_dati_per_grafico
+
+DIMENSIONI = (10_000, 100_000, 1_000_000)
+# Oltre questa dimensione le vecchie implementazioni (apply per riga, groupby per serie) non vengono più cronometrate
+RIGHE_MASSIME_CONFRONTO = 100_000
+RIGHE_PER_BLOCCO = 500_000
+
+def dati_sintetici(righe, serie=26, seed=0):
+    """Misurazioni ogni 5 s per `serie` coppie (sorgente, tipo), con qualche buco oltre i 15 minuti."""
+    rng = np.random.default_rng(seed)
+    tipi = list(TUTTE_LE_CONFIG_SENSORI)
+    per_serie = righe // serie
+    passi = np.full(per_serie, 5.0)
+    passi[rng.random(per_serie) < 0.001] = 1800  # Buchi da mezz'ora
+    secondi = np.cumsum(passi)
+    parti = []
+    for i in range(serie):
+        tipo = tipi[i % len(tipi)]
+        config = TUTTE_LE_CONFIG_SENSORI[tipo]
+        parti.append(pd.DataFrame({
+            "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(secondi, unit="s"),
+            "sorgente_id": f"Sorgente_{i // len(tipi)}", "tipo": tipo,
+            "valore": rng.normal(config["mu"], config["sigma"] * 2, per_serie).round(2),
+        }))
+    return pd.concat(parti, ignore_index=True).sort_values("timestamp", ignore_index=True)
+
+# Implementazioni precedenti, tenute come riferimento per il confronto
+def classifica_per_riga(df):
+    return df.apply(lambda row: classifica_stato(row['tipo'], row['valore']), axis=1)
+
+def prepara_dati_per_gruppo(df, gap_massimo=timedelta(minutes=15)):
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp')
+    gruppi = []
+    for chiavi, gruppo in df.groupby(['sorgente_id', 'tipo']):
+        differenze = gruppo['timestamp'].diff()
+        indici = differenze[differenze > gap_massimo].index
+        if not indici.empty:
+            righe = [{'timestamp': gruppo.loc[i, 'timestamp'] - timedelta(seconds=1), 'sorgente_id': chiavi[0], 'tipo': chiavi[1], 'valore': np.nan, 'stato': 'N/D'} for i in indici]
+            gruppo = pd.concat([gruppo, pd.DataFrame(righe)], ignore_index=True).sort_values('timestamp')
+        gruppi.append(gruppo)
+    return pd.concat(gruppi, ignore_index=True)
+
+def database_sintetico(percorso, righe, seed=0):
+    """
+    Riempie misurazioni_compatte (database già migrato) con circa `righe` letture dei sensori
+    dell'impianto, ognuno al proprio intervallo, fino ad adesso. I rollup restano vuoti.
+    """
+    rng = np.random.default_rng(seed)
+    sensori = elenco_sensori()
+    ids = database.ids_sensori([(sorgente, tipo) for sorgente, tipo, _ in sensori])
+    adesso_ms = database.ts_ms_da_iso(datetime.now().isoformat())
+    per_sensore = righe // len(sensori)
+    conn = sqlite3.connect(percorso)
+    conn.execute("PRAGMA synchronous = OFF")
+    with conn:
+        # A blocchi di tempo dal più vecchio, così le righe arrivano in ordine di ts_ms come dal simulatore
+        passi_per_blocco = max(1, RIGHE_PER_BLOCCO // len(sensori))
+        for fine_blocco in range(per_sensore, 0, -passi_per_blocco):
+            passi = np.arange(fine_blocco - 1, max(0, fine_blocco - passi_per_blocco) - 1, -1)  # Intervalli prima di adesso
+            for (sorgente_id, tipo_id), (_, tipo, intervallo) in zip(ids, sensori):
+                config = TUTTE_LE_CONFIG_SENSORI[tipo]
+                valori = rng.normal(config["mu"], config["sigma"] * 2, len(passi)).round(2)
+                conn.executemany(database.QUERY_INSERT_MISURAZIONE, zip(itertools.repeat(sorgente_id), itertools.repeat(tipo_id),
+                                                                       valori.tolist(), (adesso_ms - passi * intervallo * 1000).tolist()))
+    conn.close()
+    return per_sensore * len(sensori)
+
+def _cronometra(funzione, *args):
+    inizio = time.perf_counter()
+    risultato = funzione(*args)
+    return risultato, (time.perf_counter() - inizio) * 1000
+
+def bench_classifica_stato(chiamate=100_000, seed=0):
+    """classifica_stato su una lettura alla volta, come nel ciclo di ogni sensore del simulatore."""
+    df = dati_sintetici(chiamate, seed=seed)
+    letture = iter(list(zip(df['tipo'], df['valore'])))
+    return al_secondo(lambda: classifica_stato(*next(letture)), len(df))
+
+def bench_classificazione(righe, confronta=None):
+    """Classificazione di un DataFrame intero; con confronta (default fino a RIGHE_MASSIME_CONFRONTO) anche contro l'apply per riga."""
+    df = dati_sintetici(righe)
+    vettoriale, ms_vettoriale = _cronometra(classifica_stati, df['tipo'], df['valore'])
+    # Codici dei tipi calcolati una volta, come per le serie lette ripetutamente
+    compilato = classificatore()
+    codici, ms_codici = _cronometra(compilato.classifica_codici, compilato.codici_tipi(df['tipo']), df['valore'])
+    assert (nomi_stati(codici) == vettoriale).all()
+    risultato = {"righe": len(df), "vettoriale_ms": ms_vettoriale, "codici_ms": ms_codici}
+    if confronta if confronta is not None else righe <= RIGHE_MASSIME_CONFRONTO:
+        per_riga, ms_per_riga = _cronometra(classifica_per_riga, df)
+        assert (per_riga.to_numpy() == vettoriale).all()
+        risultato.update(per_riga_ms=ms_per_riga, speedup=ms_per_riga / ms_vettoriale)
+    return risultato
+
+def bench_interruzioni(righe, confronta=None):
+    """prepara_dati_per_grafico su `righe` letture con qualche buco; con confronta anche contro il vecchio groupby per serie."""
+    df = dati_sintetici(righe)
+    df['stato'] = classifica_stati(df['tipo'], df['valore'])
+    prepara_dati_per_grafico(df.head(1000))  # A vuoto: la prima groupby del processo paga inizializzazioni di pandas
+    vettoriale, ms_vettoriale = _cronometra(prepara_dati_per_grafico, df)
+    risultato = {"righe": len(df), "interruzioni": int(vettoriale['valore'].isna().sum()), "vettoriale_ms": ms_vettoriale}
+    if confronta if confronta is not None else righe <= RIGHE_MASSIME_CONFRONTO:
+        per_gruppo, ms_per_gruppo = _cronometra(prepara_dati_per_gruppo, df)
+        pd.testing.assert_frame_equal(per_gruppo.reset_index(drop=True), vettoriale.reset_index(drop=True))
+        risultato.update(per_gruppo_ms=ms_per_gruppo, speedup=ms_per_gruppo / ms_vettoriale)
+    return risultato
+
+def bench_carica_dati_filtrati(righe, limite=1000, ripetizioni=5):
+    """
+    carica_dati_filtrati (ultime `limite` letture per tipo e per sorgente) su un database sintetico di
+    `righe` misurazioni. "freddo" è la prima chiamata a cache vuota, "in_cache" la migliore delle
+    successive. Va eseguito con il simulatore spento, altrimenti risponde il suo ring buffer.
+    """
+    risultato = {}
+    with tempfile.TemporaryDirectory() as cartella, database_temporaneo(cartella, "sintetico.db") as percorso:
+        inizio = time.perf_counter()
+        risultato["righe"] = database_sintetico(percorso, righe)
+        risultato["creazione_s"] = time.perf_counter() - inizio
+        for filtro, valore in (("tipo", "pH"), ("sorgente_id", "Serra_1")):
+            svuota_cache()
+            df, ms_freddo = _cronometra(monitoraggio.carica_dati_filtrati, filtro, valore, limite)
+            assert len(df) == limite
+            ms_in_cache = min(_cronometra(monitoraggio.carica_dati_filtrati, filtro, valore, limite)[1] for _ in range(ripetizioni))
+            risultato[filtro] = {"freddo_ms": ms_freddo, "in_cache_ms": ms_in_cache}
+        svuota_cache()
+    return risultato
+
+if __name__ == "__main__":
+    print("classifica_stato", bench_classifica_stato())
+    for righe in DIMENSIONI:
+        print("classificazione", bench_classificazione(righe))
+        print("interruzioni   ", bench_interruzioni(righe))
+        print("carica_dati    ", bench_carica_dati_filtrati(righe))
@@ -1,21 +1,146 @@
 # config/classificatore.py
 
 import json
+import logging
+import os
+import runpy
+import threading
+import time
+from itertools import repeat
+import numpy as np
+from config import config as _config
 from config.config import SENSOR_CONFIG, PANNELLO_CONFIG, AZIONI_CORRETTIVE
 
 TUTTE_LE_CONFIG_SENSORI = {**SENSOR_CONFIG, **PANNELLO_CONFIG}
 
+# Stati come interi compatti: l'indice in NOMI_STATI è il codice
+OK, WARNING, CRITICAL, UNKNOWN = range(4)
+NOMI_STATI = ("OK", "WARNING", "CRITICAL", "UNKNOWN")
+CODICI_STATI = {nome: codice for codice, nome in enumerate(NOMI_STATI)}
+_NOMI_STATI = np.array(NOMI_STATI, dtype=object)
+INTERVALLO_CONTROLLO_SOGLIE_SECONDI = 2.0
+# Logger standard: config non dipende da infrastruttura (che importa config.config); i messaggi
+# finiscono comunque nella coda di infrastruttura.logger, che gestisce il logger radice
+_log = logging.getLogger(__name__)
+
+class ClassificatoreCompilato:
+    """
+    Soglie di tutti i tipi di sensore compilate in tabelle: ogni tipo ha un codice intero e i limiti
+    ok/warning stanno in quattro array contigui indicizzati dal codice (l'ultimo, NaN, è il tipo sconosciuto).
+    Lo stato di una lettura è fuori_ok * (1 + fuori_warning): 0 OK, 1 WARNING, 2 CRITICAL.
+    """
+    def __init__(self, configurazioni):
+        self.tipi = tuple(configurazioni)
+        self.indice_tipi = {tipo: i for i, tipo in enumerate(self.tipi)}
+        self.sconosciuto = len(self.tipi)
+        soglie = np.array([[*c["ok"], *c["warning"]] for c in configurazioni.values()] + [[np.nan] * 4], dtype=float)
+        self.ok_min, self.ok_max, self.warning_min, self.warning_max = (np.ascontiguousarray(colonna) for colonna in soglie.T)
+        # Per il percorso scalare le stesse soglie come tuple Python: indicizzare array numpy per un valore costa di più
+        self._soglie_per_tipo = {tipo: tuple(riga) for tipo, riga in zip(self.tipi, soglie.tolist())}
+        # Allarmi: soglie di rientro (strette dell'isteresi) e letture di conferma per tipo
+        isteresi = np.array([c.get("isteresi", 0.0) for c in configurazioni.values()] + [0.0], dtype=float)
+        self.rientro = soglie + isteresi[:, None] * np.array([1, -1, 1, -1])
+        self.debounce = np.array([c.get("debounce", 1) for c in configurazioni.values()] + [1], dtype=np.int32)
+
+    def codice_tipo(self, tipo):
+        return self.indice_tipi.get(tipo, self.sconosciuto)
+
+    def codici_tipi(self, tipi):
+        """Codici interi dei tipi (liste, array o Series); da calcolare una volta sola per serie di letture ripetute."""
+        tipi = np.asarray(tipi, dtype=object).tolist()  # Iterare direttamente una Series è molto più lento
+        return np.fromiter(map(self.indice_tipi.get, tipi, repeat(self.sconosciuto)), dtype=np.intp, count=len(tipi))
+
+    def classifica(self, tipo, valore):
+        """Stato di una lettura come codice intero."""
+        soglie = self._soglie_per_tipo.get(tipo)
+        if soglie is None: return UNKNOWN
+        ok_min, ok_max, warning_min, warning_max = soglie
+        if ok_min <= valore <= ok_max: return OK
+        return WARNING if warning_min <= valore <= warning_max else CRITICAL
+
+    def classifica_codici(self, codici_tipi, valori):
+        """Versione vettoriale su codici già calcolati con codici_tipi(): array int8 di stati."""
+        valori = np.asarray(valori, dtype=float)
+        fuori_ok = ~((self.ok_min[codici_tipi] <= valori) & (valori <= self.ok_max[codici_tipi]))
+        fuori_warning = ~((self.warning_min[codici_tipi] <= valori) & (valori <= self.warning_max[codici_tipi]))
+        stati = fuori_ok.astype(np.int8) * (1 + fuori_warning.astype(np.int8))
+        stati[codici_tipi == self.sconosciuto] = UNKNOWN
+        return stati
+
+    def classifica_batch(self, tipi, valori):
+        return self.classifica_codici(self.codici_tipi(tipi), valori)
+
+    def classifica_con_isteresi(self, codici_tipi, valori, livelli, stati=None):
+        """
+        Livello di allarme proposto per ogni lettura dato il livello attuale: si sale con le soglie
+        normali, si scende (verso OK) solo se il valore è rientrato oltre l'isteresi.
+        `stati` sono gli stati già calcolati con classifica_codici, se disponibili.
+        """
+        valori = np.asarray(valori, dtype=float)
+        stati = self.classifica_codici(codici_tipi, valori) if stati is None else stati
+        rientro = self.rientro[codici_tipi]
+        fuori_ok = ~((rientro[:, 0] <= valori) & (valori <= rientro[:, 1]))
+        fuori_warning = ~((rientro[:, 2] <= valori) & (valori <= rientro[:, 3]))
+        stretti = fuori_ok.astype(np.int8) * (1 + fuori_warning.astype(np.int8))
+        return np.where(stati < livelli, np.minimum(stretti, livelli), stati)
+
+
+def nome_stato(codice):
+    return NOMI_STATI[codice]
+
+def nomi_stati(codici):
+    """Codici di stato -> array numpy di stringhe."""
+    return _NOMI_STATI[codici]
+
+# --- Ricaricamento a caldo: se config/config.py cambia, le soglie vengono ricompilate ---
+_classificatore = ClassificatoreCompilato(TUTTE_LE_CONFIG_SENSORI)
+_lock_ricarica = threading.Lock()
+_mtime_config = os.stat(_config.__file__).st_mtime_ns
+_prossimo_controllo = time.monotonic() + INTERVALLO_CONTROLLO_SOGLIE_SECONDI
+
+def ricarica_soglie(forza=False):
+    """
+    Ricompila le soglie se config/config.py è stato modificato (o sempre con forza=True).
+    Il file viene eseguito in uno spazio dei nomi separato: gli altri moduli che hanno
+    importato config.config non vedono cambiamenti. Restituisce True se le soglie sono cambiate.
+    """
+    global _classificatore, _mtime_config
+    with _lock_ricarica:
+        mtime = os.stat(_config.__file__).st_mtime_ns
+        if mtime == _mtime_config and not forza: return False
+        _mtime_config = mtime
+        nuova = runpy.run_path(_config.__file__)
+        _classificatore = ClassificatoreCompilato({**nuova["SENSOR_CONFIG"], **nuova["PANNELLO_CONFIG"]})  # Sostituzione atomica
+        return True
+
+def controlla_soglie():
+    """Ricarica le soglie se la configurazione è cambiata, controllandone la data di modifica al più ogni INTERVALLO_CONTROLLO_SOGLIE_SECONDI."""
+    global _prossimo_controllo
+    if time.monotonic() < _prossimo_controllo: return
+    _prossimo_controllo = time.monotonic() + INTERVALLO_CONTROLLO_SOGLIE_SECONDI
+    try:
+        if ricarica_soglie(): _log.info("[CONFIG] Soglie dei sensori ricaricate da config/config.py")
+    except Exception as e:
+        _log.warning(f"[CONFIG] Ricaricamento soglie fallito, restano le precedenti: {e}")
+
+def classificatore():
+    """Classificatore corrente (con le soglie ricaricate se la configurazione è cambiata)."""
+    controlla_soglie()
+    return _classificatore
+
 def classifica_stato(tipo, valore):
-    soglie = TUTTE_LE_CONFIG_SENSORI.get(tipo)
-    if not soglie: return "UNKNOWN"
-    ok_min, ok_max = soglie["ok"]
-    warning_min, warning_max = soglie["warning"]
-    if ok_min <= valore <= ok_max: return "OK"
-    elif warning_min <= valore <= warning_max: return "WARNING"
-    else: return "CRITICAL"
+    # Percorso per singola lettura senza controllo della configurazione: il simulatore chiama controlla_soglie() a intervalli
+    return NOMI_STATI[_classificatore.classifica(tipo, valore)]
+
+def classifica_stati(tipi, valori):
+    """
+    Versione vettoriale di classifica_stato per molte letture insieme (liste, array o Series).
+    Restituisce un array numpy di stringhe; per i codici interi usare classificatore().classifica_batch.
+    """
+    return _NOMI_STATI[classificatore().classifica_batch(tipi, valori)]
 
 def get_azioni_correttive(tipo, stato):
     return AZIONI_CORRETTIVE.get(tipo, {}).get(stato, [])
 
 def azioni_correttive_to_json(tipo, stato):
-    return json.dumps(get_azioni_correttive(tipo, stato))
\ No newline at end of file
+    return json.dumps(get_azioni_correttive(tipo, stato))
@@ -1,17 +1,20 @@
 # config/config.py
 
+# Allarmi: "isteresi" è il margine (nell'unità del sensore) di cui il valore deve rientrare oltre la soglia
+# perché l'allarme si chiuda o scenda di livello; "debounce" il numero di letture consecutive che
+# confermano un cambio di livello prima di registrarlo. Senza le chiavi: isteresi 0, debounce 1.
 SENSOR_CONFIG = {
     # MODIFICA: Aggiunta la chiave "unita" a ogni sensore
-    "pH":         {"mu": 7.0, "sigma": 0.2, "ok": (6.5, 7.5), "warning": (6.0, 8.0), "unita": "pH"},
-    "Temperatura":{"mu": 25.0, "sigma": 1.0, "ok": (22.0, 28.0), "warning": (20.0, 30.0), "unita": "°C"},
-    "Umidità":    {"mu": 60.0, "sigma": 5.0, "ok": (50.0, 70.0), "warning": (40.0, 80.0), "unita": "%"},
-    "Ossigeno":   {"mu": 7.0, "sigma": 0.5, "ok": (5.5, 8.5), "warning": (4.0, 10.0), "unita": "mg/L"},
-    "Ammoniaca":  {"mu": 0.4, "sigma": 0.1, "ok": (0.0, 0.8), "warning": (0.0, 1.5), "unita": "mg/L"}
+    "pH":         {"mu": 7.0, "sigma": 0.2, "ok": (6.5, 7.5), "warning": (6.0, 8.0), "unita": "pH", "isteresi": 0.05, "debounce": 2},
+    "Temperatura":{"mu": 25.0, "sigma": 1.0, "ok": (22.0, 28.0), "warning": (20.0, 30.0), "unita": "°C", "isteresi": 0.3, "debounce": 2},
+    "Umidità":    {"mu": 60.0, "sigma": 5.0, "ok": (50.0, 70.0), "warning": (40.0, 80.0), "unita": "%", "isteresi": 1.5, "debounce": 2},
+    "Ossigeno":   {"mu": 7.0, "sigma": 0.5, "ok": (5.5, 8.5), "warning": (4.0, 10.0), "unita": "mg/L", "isteresi": 0.15, "debounce": 2},
+    "Ammoniaca":  {"mu": 0.4, "sigma": 0.1, "ok": (0.0, 0.8), "warning": (0.0, 1.5), "unita": "mg/L", "isteresi": 0.03, "debounce": 2}
 }
 
 PANNELLO_CONFIG = {
     # MODIFICA: Aggiunta la chiave "unita"
-    "Produzione": {"mu": 5.0, "sigma": 1.5, "ok": (2.5, 6.5), "warning": (0.0, 8.0), "unita": "kWh"}
+    "Produzione": {"mu": 5.0, "sigma": 1.5, "ok": (2.5, 6.5), "warning": (0.0, 8.0), "unita": "kWh", "isteresi": 0.2, "debounce": 3}
 }
 
 NUM_SERRE = 3
@@ -20,6 +23,26 @@ NUM_PESCINE = 3
 SENSORI_PER_PESCI = ["Temperatura", "Ossigeno", "Ammoniaca", "pH"]
 NUM_PANNELLI = 5
 
+# Retention (in giorni) applicata dal compattatore in background; None = conserva per sempre.
+# Dopo RETENZIONE_GIORNI["misurazioni"] in SQLite restano solo i rollup (e l'archivio Parquet, se attivo).
+RETENZIONE_GIORNI = {
+    "misurazioni": 7,
+    "storico_allarmi": 90,
+    "rollup_1m": 90,
+    "rollup_1h": 730,
+    "rollup_1d": None,
+}
+# Misurazioni grezze più vecchie di così passano da SQLite all'archivio Parquet (infrastruttura/archivio.py,
+# richiede pyarrow), prima che la retention le elimini. None = nessuna archiviazione.
+ARCHIVIAZIONE_DOPO_GIORNI = 2
+# Log del simulatore (scritti da un thread in background). Passa una riga per lettura ogni
+# LOG_CAMPIONAMENTO_MISURAZIONI, al più LOG_MISURAZIONI_AL_SECONDO al secondo (None = nessun limite);
+# i cambi di stato e i messaggi di sistema ([AZIONE], [ALLARME], ...) passano sempre.
+# Con LOG_FILE_JSONL le stesse righe finiscono anche in un file JSON Lines compatto (None = disattivato).
+LOG_CAMPIONAMENTO_MISURAZIONI = 1
+LOG_MISURAZIONI_AL_SECONDO = 50
+LOG_FILE_JSONL = None
+
 AZIONI_CORRETTIVE = {
     "pH": {"WARNING": ["Monitorare valore.", "Verificare soluzione nutritiva."], "CRITICAL": ["Correggere pH con agenti specifici.", "Cambiare l'acqua."]},
     "Temperatura": {"WARNING": ["Controllare ventilazione.", "Verificare termostato."], "CRITICAL": ["Attivare raffreddamento/riscaldamento.", "Isolare la serra."]},
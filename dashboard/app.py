@@ -1,9 +1,13 @@
 # dashboard/app.py
 
+import os
 import dash
 from dash import Dash, html, dcc, page_container, callback, Input, Output, State, no_update
 import dash_bootstrap_components as dbc
-import sqlite3
+from infrastruttura.database import connessione_lettura, QUERY_ULTIMO_ALLARME
+from dashboard.utils.cache import risultato_in_cache
+from dashboard.utils.flusso import registra_endpoint_flusso
+from dashboard.utils.esportazione import registra_endpoint_export
 
 # Registrazione dell'app
 app = Dash(
@@ -13,8 +17,8 @@ app = Dash(
     suppress_callback_exceptions=True
 )
 app.title = "HydroFusion | Control Center"
-
-DB_PATH = "hydrofusion.db" # Percorso al database
+registra_endpoint_flusso(app.server)
+registra_endpoint_export(app.server)
 
 # --- NAVBAR (rimane invariata) ---
 nav_links = [
@@ -58,15 +62,14 @@ def get_latest_alert(last_id=0):
     Restituisce i dati dell'allarme più recente, o None se non ce ne sono.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
         # Usiamo ORDER BY id DESC e LIMIT 1 per prendere solo l'ultimo allarme nuovo,
         # evitando una "tempesta" di toast se si verificano più allarmi contemporaneamente.
-        query = "SELECT id, sorgente_id, tipo, stato FROM storico_allarmi WHERE id > ? ORDER BY id DESC LIMIT 1"
-        cursor = conn.cursor()
-        # Usiamo i parametri per la sicurezza
-        res = cursor.execute(query, (last_id,)).fetchone()
-        conn.close()
-        return res
+        # Condiviso tra le schede aperte: la query riparte solo quando storico_allarmi cambia
+        def carica():
+            with connessione_lettura() as conn:
+                # Usiamo i parametri per la sicurezza
+                return conn.execute(QUERY_ULTIMO_ALLARME, (last_id,)).fetchone()
+        return risultato_in_cache(("ultimo_allarme", last_id), ("storico_allarmi",), carica)
     except Exception as e:
         print(f"Errore controllo allarmi: {e}")
         return None
@@ -96,14 +99,19 @@ def show_alert_toast(n, last_shown_id):
         return no_update, no_update, no_update, no_update, no_update
 
     # Se c'è un nuovo allarme, estraiamo i dati
-    new_id, sorgente, tipo_sensore, stato = latest_alert
-    
-    # Prepariamo il contenuto del toast
-    header_text = f"⚠️ ALLARME {stato}"
-    icon_color = "danger" if stato == "CRITICAL" else "warning"
-    
+    new_id, sorgente, tipo_sensore, stato, evento = latest_alert
+
+    # Prepariamo il contenuto del toast: lo storico contiene aperture, cambi di livello e chiusure
+    if evento == "CHIUSURA":
+        header_text, icon_color = "✅ ALLARME RIENTRATO", "success"
+        messaggio = f"Il sensore {tipo_sensore} in {sorgente} è tornato nei limiti."
+    else:
+        header_text = f"⚠️ ALLARME {stato}"
+        icon_color = "danger" if stato == "CRITICAL" else "warning"
+        messaggio = f"Rilevato stato {stato} per il sensore {tipo_sensore} in {sorgente}!"
+
     toast_body = dbc.Alert(
-        f"Rilevato stato {stato} per il sensore {tipo_sensore} in {sorgente}!",
+        messaggio,
         color=icon_color,
         className="m-0" # Rimuove margini per un look pulito dentro il toast
     )
@@ -112,6 +120,8 @@ def show_alert_toast(n, last_shown_id):
     return True, header_text, toast_body, icon_color, new_id
 
 
-# --- ESECUZIONE DELL'APP (rimane invariata) ---
+# --- ESECUZIONE DELL'APP ---
+# Porta e reloader configurabili dal launcher: il reloader di debug reimporta l'intera app in un secondo processo
 if __name__ == "__main__":
-    app.run(debug=True, port=8050)
\ No newline at end of file
+    app.run(debug=True, port=int(os.environ.get("HYDROFUSION_PORTA_DASHBOARD", 8050)),
+            use_reloader=os.environ.get("HYDROFUSION_RELOADER", "1") != "0")
\ No newline at end of file
@@ -0,0 +1,71 @@
+// dashboard/assets/flusso.js
+//
+// Client del flusso live delle misurazioni (dashboard/utils/flusso.py).
+// Apre un EventSource quando la pagina Monitoraggio è in modalità live e aggiunge i punti
+// ricevuti alle tracce del grafico con extendData, senza passare dal server Dash.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    flusso: {
+        collega: function (config) {
+            if (window._flussoMisurazioni) {
+                window._flussoMisurazioni.close();
+                window._flussoMisurazioni = null;
+            }
+            if (!config || !window.EventSource) {
+                return "chiuso";
+            }
+            const sorgente = new EventSource(config.url);
+            sorgente.onmessage = function (evento) {
+                aggiungiPunti(config, JSON.parse(evento.data));
+            };
+            window._flussoMisurazioni = sorgente;
+            return "collegato";
+        }
+    }
+});
+
+// Ogni punto è [timestamp, sorgente_id, tipo, valore, stato]. Nella vista per tipo le tracce
+// sono le sorgenti, nella vista per sorgente sono i tipi di sensore.
+function aggiungiPunti(config, punti) {
+    const grafico = document.getElementById(config.grafico);
+    const plot = grafico && grafico.querySelector(".js-plotly-plot");
+    if (!plot || !plot.data) {
+        return;
+    }
+    const perTipo = config.vista === "tipo";
+    const indici = {};
+    plot.data.forEach(function (traccia, i) { indici[traccia.name] = i; });
+
+    const nuovi = {};
+    punti.forEach(function (punto) {
+        const i = indici[perTipo ? punto[1] : punto[2]];
+        if (i === undefined) {
+            return;  // Serie non ancora nel grafico: comparirà alla prossima ricostruzione
+        }
+        const traccia = plot.data[i];
+        const ultimoX = traccia.x && traccia.x.length ? traccia.x[traccia.x.length - 1] : null;
+        if (ultimoX !== null && confrontaTempi(punto[0], ultimoX) <= 0) {
+            return;  // Già presente dal caricamento iniziale
+        }
+        const serie = nuovi[i] || (nuovi[i] = {x: [], y: [], customdata: []});
+        serie.x.push(punto[0]);
+        serie.y.push(punto[3]);
+        serie.customdata.push(perTipo ? [punto[1], punto[4]] : [punto[4]]);
+    });
+
+    const tracce = Object.keys(nuovi).map(Number);
+    if (!tracce.length) {
+        return;
+    }
+    window.dash_clientside.set_props(config.grafico, {
+        extendData: [{
+            x: tracce.map(function (i) { return nuovi[i].x; }),
+            y: tracce.map(function (i) { return nuovi[i].y; }),
+            customdata: tracce.map(function (i) { return nuovi[i].customdata; })
+        }, tracce, config.max_punti]
+    });
+}
+
+function confrontaTempi(a, b) {
+    return new Date(String(a).replace(" ", "T")) - new Date(String(b).replace(" ", "T"));
+}
@@ -1,13 +1,15 @@
 # dashboard/pages/dati.py
 
 import dash
-from dash import html, dcc, callback, Input, Output
+from dash import html, dcc, callback, Input, Output, State, ctx
 from dash.dash_table import DataTable # <-- L'import corretto
 import dash_bootstrap_components as dbc
 import pandas as pd
-import sqlite3
 
 from dashboard.utils.layout import titolo_sezione
+from dashboard.utils.motore import motore_dashboard
+from dashboard.utils.esportazione import PERCORSO_EXPORT
+from dashboard.utils.paginazione import TABELLE_ESPLORABILI, RIGHE_PER_PAGINA, colonne_tabella, query_pagina, cursore_fine
 
 # Registriamo la nuova pagina. La navbar dinamica la troverà automaticamente.
 dash.register_page(
@@ -18,28 +20,21 @@ dash.register_page(
     icon="bi bi-table"
 )
 
-DB_PATH = "hydrofusion.db"
+def carica_pagina(nome_tabella, filter_query, sort_by, righe, cursore=None, offset=0):
+    """
+    Carica una sola pagina della tabella, già filtrata e ordinata dal database.
 
-def carica_tabella_completa(nome_tabella):
-    """Carica un'intera tabella dal database in un DataFrame Pandas."""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        # Usiamo una query sicura per evitare SQL injection
-        # (anche se qui il nome tabella è controllato, è buona pratica)
-        if nome_tabella in ["misurazioni", "stati_attuali", "storico_allarmi", "dati_produzione", "dati_finanziari"]:
-            df = pd.read_sql_query(f"SELECT * FROM {nome_tabella}", conn)
-        else:
-            df = pd.DataFrame() # Ritorna un df vuoto se il nome non è valido
-        conn.close()
-        return df
-    except Exception as e:
-        print(f"Errore caricamento tabella {nome_tabella}: {e}")
-        return pd.DataFrame()
+    Returns:
+        tuple: (DataFrame della pagina senza le colonne di servizio, cursore per la pagina successiva)
+    """
+    query, params = query_pagina(nome_tabella, filter_query, sort_by, righe, cursore, offset)
+    df = motore_dashboard.interroga(query, params)
+    return df.drop(columns=["_ordine", "_chiave"]), cursore_fine(df)
 
 # --- Layout della Pagina ---
 layout = dbc.Container([
     titolo_sezione("Esplorazione Dati Grezzi", icona="bi bi-table"),
-    
+
     dbc.Alert(
         "Questa sezione consente di visualizzare i dati grezzi registrati nel database. È uno strumento potente per analisi approfondite e debugging.",
         color="info"
@@ -50,59 +45,107 @@ layout = dbc.Container([
             html.Label("Seleziona la tabella da visualizzare:", className="fw-bold"),
             dcc.Dropdown(
                 id="selettore-tabella-dati",
-                options=[
-                    {"label": "Misurazioni Sensori", "value": "misurazioni"},
-                    {"label": "Stati Attuali", "value": "stati_attuali"},
-                    {"label": "Storico Allarmi", "value": "storico_allarmi"},
-                    {"label": "Dati di Produzione", "value": "dati_produzione"},
-                    {"label": "Dati Finanziari", "value": "dati_finanziari"},
-                ],
+                options=[{"label": tabella["etichetta"], "value": nome} for nome, tabella in TABELLE_ESPLORABILI.items()],
                 value="misurazioni", # Tabella di default
                 clearable=False
             )
-        ], md=6, className="mb-3")
+        ], md=6, className="mb-3"),
+        # L'intera tabella si scarica in streaming dal server, senza passare dalla DataTable
+        dbc.Col([
+            dbc.Button([html.I(className="bi bi-filetype-csv me-1"), "Esporta CSV"], id="link-export-csv", color="secondary", outline=True, external_link=True, className="me-2"),
+            dbc.Button([html.I(className="bi bi-file-earmark-binary me-1"), "Esporta Parquet"], id="link-export-parquet", color="secondary", outline=True, external_link=True),
+        ], md=6, className="mb-3 d-flex align-items-end justify-content-md-end")
     ]),
-    
+
     html.Hr(),
-    
-    # Il contenitore dove verrà renderizzata la tabella
+
+    html.Div(id='messaggio-tabella-dati'),
+    # Pagine, ordinamento e filtri sono calcolati dal database: la tabella riceve solo la pagina visibile
     dcc.Loading(
-        html.Div(id='contenitore-tabella-dati')
-    )
-    
+        DataTable(
+            id='tabella-dati-visualizzata',
+            columns=colonne_tabella("misurazioni"),
+
+            # --- Funzionalità Interattive ---
+            page_current=0,
+            page_size=RIGHE_PER_PAGINA,   # Mostra 25 righe per pagina
+            page_action="custom",         # Paginazione lato server (una query per pagina)
+            sort_action="custom",         # Ordinamento lato server (cliccando sugli header)
+            sort_mode="single",
+            sort_by=[],
+            filter_action="custom",       # Filtro lato server (caselle di testo sotto gli header)
+            filter_query="",
+
+            # --- Stile ---
+            style_table={'overflowX': 'auto'}, # Abilita lo scroll orizzontale se ci sono troppe colonne
+            style_cell={'textAlign': 'left', 'minWidth': '120px', 'width': '150px', 'maxWidth': '200px', 'whiteSpace': 'normal'},
+            style_header={'backgroundColor': '#E9ECEF', 'fontWeight': 'bold', 'border': '1px solid black'},
+            style_data_conditional=[{
+                'if': {'row_index': 'odd'},
+                'backgroundColor': 'rgb(248, 248, 248)'
+            }]
+        )
+    ),
+    # Cursori di inizio delle pagine già visitate, validi per la combinazione tabella/filtro/ordinamento in "firma"
+    dcc.Store(id='cursori-tabella-dati')
+
 ], fluid=True)
 
 # --- Callback ---
 @callback(
-    Output('contenitore-tabella-dati', 'children'),
+    Output('link-export-csv', 'href'),
+    Output('link-export-parquet', 'href'),
     Input('selettore-tabella-dati', 'value')
 )
-def aggiorna_tabella_dati(nome_tabella_selezionata):
-    """Carica i dati e crea il componente DataTable."""
-    
-    df = carica_tabella_completa(nome_tabella_selezionata)
-    
-    if df.empty:
-        return dbc.Alert(f"La tabella '{nome_tabella_selezionata}' è vuota o non esiste.", color="warning")
-
-    return DataTable(
-        id='tabella-dati-visualizzata',
-        # I dati devono essere passati come lista di dizionari
-        data=df.to_dict('records'),
-        # Le colonne vengono create dinamicamente dai nomi delle colonne del DataFrame
-        columns=[{"name": i, "id": i} for i in df.columns],
-        
-        # --- Funzionalità Interattive ---
-        page_size=25,              # Mostra 25 righe per pagina
-        sort_action="native",      # Abilita l'ordinamento nativo (cliccando sugli header)
-        filter_action="native",    # Abilita il filtro nativo (caselle di testo sotto gli header)
-        
-        # --- Stile ---
-        style_table={'overflowX': 'auto'}, # Abilita lo scroll orizzontale se ci sono troppe colonne
-        style_cell={'textAlign': 'left', 'minWidth': '120px', 'width': '150px', 'maxWidth': '200px', 'whiteSpace': 'normal'},
-        style_header={'backgroundColor': '#E9ECEF', 'fontWeight': 'bold', 'border': '1px solid black'},
-        style_data_conditional=[{
-            'if': {'row_index': 'odd'},
-            'backgroundColor': 'rgb(248, 248, 248)'
-        }]
-    )
\ No newline at end of file
+def aggiorna_link_export(nome_tabella_selezionata):
+    percorso = PERCORSO_EXPORT.replace("<tabella>", nome_tabella_selezionata)
+    return percorso.replace("<formato>", "csv"), percorso.replace("<formato>", "parquet")
+
+@callback(
+    Output('tabella-dati-visualizzata', 'data'),
+    Output('tabella-dati-visualizzata', 'columns'),
+    Output('tabella-dati-visualizzata', 'page_current'),
+    Output('tabella-dati-visualizzata', 'page_count'),
+    Output('tabella-dati-visualizzata', 'sort_by'),
+    Output('tabella-dati-visualizzata', 'filter_query'),
+    Output('cursori-tabella-dati', 'data'),
+    Output('messaggio-tabella-dati', 'children'),
+    Input('selettore-tabella-dati', 'value'),
+    Input('tabella-dati-visualizzata', 'page_current'),
+    Input('tabella-dati-visualizzata', 'page_size'),
+    Input('tabella-dati-visualizzata', 'sort_by'),
+    Input('tabella-dati-visualizzata', 'filter_query'),
+    State('cursori-tabella-dati', 'data'),
+)
+def aggiorna_tabella_dati(nome_tabella_selezionata, pagina, righe, sort_by, filter_query, cursori):
+    """Carica la pagina richiesta con una sola query limitata."""
+    if nome_tabella_selezionata not in TABELLE_ESPLORABILI:
+        return [], [], 0, None, [], "", None, dbc.Alert(f"La tabella '{nome_tabella_selezionata}' non esiste.", color="warning")
+
+    # Cambio tabella: filtro e ordinamento si riferiscono a colonne che non ci sono più
+    if ctx.triggered_id == 'selettore-tabella-dati':
+        sort_by, filter_query = [], ""
+    righe = righe or RIGHE_PER_PAGINA
+    firma = [nome_tabella_selezionata, filter_query or "", sort_by or [], righe]
+    if not cursori or cursori["firma"] != firma:
+        cursori, pagina = {"firma": firma, "inizi": {}}, 0
+    pagina = pagina or 0
+
+    cursore = cursori["inizi"].get(str(pagina)) if pagina else None
+    try:
+        df, cursore_successivo = carica_pagina(nome_tabella_selezionata, filter_query, sort_by, righe, cursore, 0 if cursore else pagina * righe)
+    except ValueError as e:
+        return [], colonne_tabella(nome_tabella_selezionata), 0, 1, sort_by, filter_query, cursori, dbc.Alert(str(e), color="warning")
+    except Exception as e:
+        print(f"Errore caricamento tabella {nome_tabella_selezionata}: {e}")
+        return [], colonne_tabella(nome_tabella_selezionata), 0, 1, sort_by, filter_query, cursori, dbc.Alert(f"Errore nel caricamento di '{nome_tabella_selezionata}'.", color="danger")
+
+    if cursore_successivo is not None:
+        cursori["inizi"][str(pagina + 1)] = cursore_successivo
+    # Senza COUNT(*) sull'intera tabella: il numero di pagine si conosce solo arrivati all'ultima
+    page_count = pagina + 1 if len(df) < righe else None
+    messaggio = None
+    if df.empty and pagina == 0:
+        messaggio = dbc.Alert(f"Nessuna riga in '{nome_tabella_selezionata}' per il filtro impostato." if filter_query else
+                              f"La tabella '{nome_tabella_selezionata}' è vuota.", color="warning")
+    return df.to_dict('records'), colonne_tabella(nome_tabella_selezionata), pagina, page_count, sort_by, filter_query, cursori, messaggio
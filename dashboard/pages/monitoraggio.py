@@ -1,18 +1,23 @@
 # dashboard/pages/monitoraggio.py
 
 import dash
-from dash import html, dcc, Input, Output, callback, State, ctx
+from dash import html, dcc, Input, Output, callback, clientside_callback, ClientsideFunction, State, ctx, Patch
 import dash_bootstrap_components as dbc
 import pandas as pd
 import numpy as np # Importiamo numpy per usare np.nan
-import sqlite3
+import re
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
 # Import delle utility e configurazioni
 from dashboard.utils.grafici import linea_temporale_sensori, subplot_per_sorgente, crea_grafico_vuoto
 from dashboard.utils.layout import titolo_sezione, stato_badge
 from config.config import SENSOR_CONFIG, PANNELLO_CONFIG, NUM_SERRE, NUM_PESCINE, NUM_PANNELLI
-from config.classificatore import classifica_stato
+from config.classificatore import classifica_stati
+from infrastruttura.rollup import carica_serie
+from dashboard.utils.cache import risultato_in_cache
+from dashboard.utils.motore import motore_dashboard
+from dashboard.utils.flusso import PERCORSO_FLUSSO, ultimo_id_misurazioni
 
 # Registrazione della pagina
 dash.register_page(
@@ -23,58 +28,138 @@ dash.register_page(
     icon="bi bi-bar-chart-line-fill"
 )
 
-DB_PATH = "hydrofusion.db"
 MAX_DATAPOINTS_IN_STORE = 2000
+INTERVALLO_AGGIORNAMENTO_MS = 5000
 MAX_TIME_GAP_MINUTES = 15 # Se il gap è > di questo, interrompiamo la linea
+# Finestre lunghe: i dati arrivano dai rollup con risoluzione scelta in base all'ampiezza
+DURATA_FINESTRE = {"1h": timedelta(hours=1), "24h": timedelta(days=1), "7g": timedelta(days=7), "30g": timedelta(days=30)}
+# Punti per serie chiesti al database: più di quelli disegnati, il ricampionamento M4 in grafici.py sceglie quali tenere
+PUNTI_MASSIMI_FINESTRA = 2000
+_RE_ZOOM_X = re.compile(r"^xaxis\d*\.range(?:\[0\])?$")
 
 # --- FUNZIONI DI PREPARAZIONE DATI ---
 
-def prepara_dati_per_grafico(df: pd.DataFrame) -> pd.DataFrame:
+def prepara_dati_per_grafico(df: pd.DataFrame, gap_massimo=timedelta(minutes=MAX_TIME_GAP_MINUTES)) -> pd.DataFrame:
     """
      Inserisce dei NaN per interrompere le linee nei grafici
-    dove ci sono lunghi intervalli senza dati.
+    dove ci sono intervalli senza dati più lunghi di gap_massimo.
+    Tutto vettoriale: ordinamento per serie e tempo, poi un confronto tra righe consecutive.
     """
     if df.empty:
         return df
 
-    # Assicuriamoci che il df sia ordinato per tempo
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values('timestamp')
-
-    processed_dfs = []
-    # Raggruppiamo per ogni singola linea che verrà disegnata (per ogni sorgente e tipo)
-    for group_keys, group_df in df.groupby(['sorgente_id', 'tipo']):
-        # Calcoliamo la differenza di tempo tra righe consecutive
-        time_diffs = group_df['timestamp'].diff()
-        
-        # Identifichiamo i punti in cui il gap è troppo grande
-        break_points_indices = time_diffs[time_diffs > timedelta(minutes=MAX_TIME_GAP_MINUTES)].index
-        
-        if not break_points_indices.empty:
-            rows_to_insert = []
-            for index in break_points_indices:
-                # Creiamo una riga "fantasma" con valore NaN per spezzare la linea
-                original_row = group_df.loc[index]
-                # Inseriamo il NaN un secondo dopo l'ultimo punto valido
-                nan_timestamp = original_row['timestamp'] - timedelta(seconds=1)
-                
-                # Creiamo la riga da inserire
-                nan_row = {
-                    'timestamp': nan_timestamp,
-                    'sorgente_id': group_keys[0],
-                    'tipo': group_keys[1],
-                    'valore': np.nan, 
-                    'stato': 'N/D'
-                }
-                rows_to_insert.append(nan_row)
-            
-            # Aggiungiamo le nuove righe e riordiniamo
-            group_df = pd.concat([group_df, pd.DataFrame(rows_to_insert)], ignore_index=True)
-            group_df = group_df.sort_values('timestamp')
-        
-        processed_dfs.append(group_df)
-    
-    return pd.concat(processed_dfs, ignore_index=True) if processed_dfs else pd.DataFrame()
+    # Ogni linea del grafico è una coppia (sorgente, tipo): codice intero per serie, poi ordinamento (serie, tempo)
+    timestamp = pd.to_datetime(df['timestamp']).to_numpy()
+    serie = df.groupby(['sorgente_id', 'tipo'], sort=True).ngroup().to_numpy()
+    ordine = np.lexsort((timestamp, serie))
+    df = df.iloc[ordine].assign(timestamp=timestamp[ordine]).reset_index(drop=True)
+    timestamp, serie = timestamp[ordine], serie[ordine]
+
+    interruzioni = np.flatnonzero((serie[1:] == serie[:-1]) & (np.diff(timestamp) > np.timedelta64(gap_massimo))) + 1
+    if interruzioni.size == 0:
+        return df
+
+    # Righe "fantasma" con valore NaN un secondo prima del punto che segue il buco
+    righe_nan = pd.DataFrame({
+        'timestamp': timestamp[interruzioni] - np.timedelta64(1, 's'),
+        'sorgente_id': df['sorgente_id'].to_numpy()[interruzioni],
+        'tipo': df['tipo'].to_numpy()[interruzioni],
+        'valore': np.nan,
+        'stato': 'N/D'
+    })
+    # Posizioni finali: ogni riga originale scala di quante interruzioni la precedono (inclusa la sua)
+    righe, nan = len(df), len(righe_nan)
+    posizioni = np.empty(righe + nan, dtype=np.intp)
+    posizioni[np.arange(righe) + np.searchsorted(interruzioni, np.arange(righe), side='right')] = np.arange(righe)
+    posizioni[interruzioni + np.arange(nan)] = np.arange(righe, righe + nan)
+    return pd.concat([df, righe_nan], ignore_index=True).take(posizioni).reset_index(drop=True)
+
+
+def colonna_tracce(tipo_vista):
+    """Colonna che distingue le tracce del grafico: le sorgenti nella vista per tipo, i tipi in quella per sorgente."""
+    return 'sorgente_id' if tipo_vista == "tipo" else 'tipo'
+
+def gap_massimo_dati(df: pd.DataFrame) -> timedelta:
+    """Gap oltre cui spezzare la linea: con i rollup il passo minimo è il bucket."""
+    gap_massimo = timedelta(minutes=MAX_TIME_GAP_MINUTES)
+    if 'risoluzione_s' in df and not df.empty:
+        gap_massimo = max(gap_massimo, timedelta(seconds=2 * int(df['risoluzione_s'].iloc[0])))
+    return gap_massimo
+
+def _custom_data(righe: pd.DataFrame, tipo_vista) -> list:
+    # Stesso formato di customdata usato da linea_temporale_sensori / subplot_per_sorgente
+    colonne = ['sorgente_id', 'stato'] if tipo_vista == "tipo" else ['stato']
+    return righe[colonne].values.tolist()
+
+def stato_figura(fig, chiave) -> dict:
+    """
+    Riassume la figura appena costruita per gli aggiornamenti incrementali successivi:
+    per ogni traccia l'indice, il numero di punti e l'ultimo timestamp.
+    """
+    tracce = {}
+    for i, traccia in enumerate(fig.data):
+        x = traccia.x if traccia.x is not None else []
+        tracce[traccia.name] = {"indice": i, "punti": len(x), "ultimo_ts": pd.Timestamp(x[-1]).isoformat() if len(x) else None}
+    return {"chiave": chiave, "tracce": tracce}
+
+def patch_incrementale(df: pd.DataFrame, tipo_vista, stato, max_punti=PUNTI_MASSIMI_FINESTRA):
+    """
+    Confronta i dati ricaricati con lo stato della figura e costruisce una Patch che:
+    aggiorna l'ultimo punto (il bucket di rollup ancora aperto cambia valore), aggiunge i punti
+    successivi (con il NaN di interruzione se c'è un buco) e toglie in testa quelli oltre max_punti.
+
+    Returns:
+        (Patch, dict) con la patch e il nuovo stato, oppure None se compare una serie che la
+        figura non ha e serve una ricostruzione completa.
+    """
+    patch, tracce = Patch(), {nome: dict(info) for nome, info in stato["tracce"].items()}
+    if df.empty: return patch, {**stato, "tracce": tracce}
+    df = df.assign(timestamp=pd.to_datetime(df['timestamp'])).sort_values('timestamp')
+    gap_massimo = gap_massimo_dati(df)
+    for nome, gruppo in df.groupby(colonna_tracce(tipo_vista)):
+        info = tracce.get(nome)
+        if info is None: return None
+        i, punti = info["indice"], info["punti"]
+        ultimo = pd.Timestamp(info["ultimo_ts"]) if info["ultimo_ts"] else None
+        nuovi = gruppo
+        if ultimo is not None:
+            uguali = gruppo[gruppo['timestamp'] == ultimo]
+            if not uguali.empty and punti:
+                patch["data"][i]["y"][punti - 1] = float(uguali['valore'].iloc[-1])
+                patch["data"][i]["customdata"][punti - 1] = _custom_data(uguali, tipo_vista)[-1]
+            nuovi = gruppo[gruppo['timestamp'] > ultimo]
+        if nuovi.empty: continue
+
+        x, y, custom = [], [], []
+        if ultimo is not None and nuovi['timestamp'].iloc[0] - ultimo > gap_massimo:
+            x.append((nuovi['timestamp'].iloc[0] - timedelta(seconds=1)).isoformat()); y.append(None)
+            custom.append([nome, 'N/D'] if tipo_vista == "tipo" else ['N/D'])
+        x += [ts.isoformat() for ts in nuovi['timestamp']]
+        y += nuovi['valore'].astype(float).tolist()
+        custom += _custom_data(nuovi, tipo_vista)
+        patch["data"][i]["x"].extend(x)
+        patch["data"][i]["y"].extend(y)
+        patch["data"][i]["customdata"].extend(custom)
+
+        punti += len(x)
+        for _ in range(max(0, punti - max_punti)):
+            for attributo in ("x", "y", "customdata"): del patch["data"][i][attributo][0]
+        info["punti"], info["ultimo_ts"] = min(punti, max_punti), nuovi['timestamp'].iloc[-1].isoformat()
+    return patch, {**stato, "tracce": tracce}
+
+def range_zoom(relayout_data):
+    """
+    Intervallo dell'asse x scelto dall'utente, letto da relayoutData.
+    Con i subplot ad assi condivisi lo zoom arriva come xaxis2.range[0], xaxis3.range, ...
+
+    Returns:
+        list: [inizio, fine] come stringhe ISO, oppure None se non c'è zoom
+    """
+    for chiave, valore in (relayout_data or {}).items():
+        if _RE_ZOOM_X.match(chiave):
+            if chiave.endswith("[0]"): return [valore, relayout_data[chiave.replace("[0]", "[1]")]]
+            return list(valore)
+    return None
 
 
 # --- FUNZIONI DI CARICAMENTO DATI (rimangono uguali) ---
@@ -82,36 +167,46 @@ def carica_dati_filtrati(filtro_tipo, valore_filtro, limit=1000):
     
     if not valore_filtro: return pd.DataFrame()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        query = f"SELECT timestamp, sorgente_id, tipo, valore FROM misurazioni WHERE {filtro_tipo} = ? ORDER BY timestamp DESC LIMIT ?"
-        df = pd.read_sql_query(query, conn, params=(valore_filtro, limit))
-        conn.close()
+        # Dal ring buffer in memoria del simulatore, o da SQLite se non è disponibile
+        df = motore_dashboard.ultime_misurazioni(filtro_tipo, valore_filtro, limit)
         if not df.empty:
-            df['stato'] = df.apply(lambda row: classifica_stato(row['tipo'], row['valore']), axis=1)
+            df['stato'] = classifica_stati(df['tipo'], df['valore'])
     except Exception as e:
         print(f"Errore caricamento dati iniziali: {e}"); df = pd.DataFrame()
     return df
 
-def carica_nuovi_dati(filtro_tipo, valore_filtro, ultimo_timestamp):
-    
-    if not valore_filtro or not ultimo_timestamp: return pd.DataFrame()
+def carica_dati_intervallo(filtro_tipo, valore_filtro, inizio, fine):
+    """Carica un intervallo arbitrario (zoom dell'utente) alla risoluzione più fine che resta sotto PUNTI_MASSIMI_FINESTRA."""
+    if not valore_filtro: return pd.DataFrame()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        query = f"SELECT timestamp, sorgente_id, tipo, valore FROM misurazioni WHERE {filtro_tipo} = ? AND timestamp > ? ORDER BY timestamp ASC"
-        df = pd.read_sql_query(query, conn, params=(valore_filtro, ultimo_timestamp))
-        conn.close()
+        inizio, fine = pd.Timestamp(inizio).to_pydatetime(), pd.Timestamp(fine).to_pydatetime()
+        df = risultato_in_cache(("intervallo", filtro_tipo, valore_filtro, inizio, fine), ("rollup_misurazioni", "misurazioni_compatte"),
+                                lambda: carica_serie(filtro_tipo, valore_filtro, inizio, fine, PUNTI_MASSIMI_FINESTRA))
         if not df.empty:
-            df['stato'] = df.apply(lambda row: classifica_stato(row['tipo'], row['valore']), axis=1)
+            df['stato'] = classifica_stati(df['tipo'], df['valore'])
     except Exception as e:
-        print(f"Errore caricamento nuovi dati: {e}"); df = pd.DataFrame()
+        print(f"Errore caricamento intervallo {inizio} - {fine}: {e}"); df = pd.DataFrame()
+    return df
+
+def carica_dati_finestra(filtro_tipo, valore_filtro, finestra):
+    """Carica una finestra lunga (1h, 24h, 7g, 30g) fino ad adesso, da rollup o dati grezzi a seconda dell'ampiezza."""
+    if not valore_filtro: return pd.DataFrame()
+    try:
+        # Fine finestra allineata all'intervallo di aggiornamento: tutte le schede condividono la stessa voce di cache
+        adesso = datetime.now()
+        fine = adesso.replace(microsecond=0) - timedelta(seconds=adesso.second % (INTERVALLO_AGGIORNAMENTO_MS // 1000))
+        df = risultato_in_cache(("finestra", filtro_tipo, valore_filtro, finestra, fine), ("rollup_misurazioni", "misurazioni_compatte"),
+                                lambda: carica_serie(filtro_tipo, valore_filtro, fine - DURATA_FINESTRE[finestra], fine, PUNTI_MASSIMI_FINESTRA))
+        if not df.empty:
+            df['stato'] = classifica_stati(df['tipo'], df['valore'])
+    except Exception as e:
+        print(f"Errore caricamento finestra {finestra}: {e}"); df = pd.DataFrame()
     return df
 
 def leggi_stati_attuali_da_db():
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT sorgente_id, tipo, stato FROM stati_attuali", conn, index_col=['sorgente_id', 'tipo'])
-        conn.close(); return df.to_dict()['stato']
+        return motore_dashboard.stati_attuali()
     except Exception: return {}
 
 # --- OPZIONI E LAYOUT (con modifica su Graph) ---
@@ -119,13 +214,16 @@ opzioni_per_tipo = [{"label": k, "value": k} for k in sorted({**SENSOR_CONFIG, *
 opzioni_per_sorgente = [{"label": f"Serra {i}", "value": f"Serra_{i}"} for i in range(1, NUM_SERRE + 1)] + \
                        [{"label": f"Pesci {i}", "value": f"Pesci_{i}"} for i in range(1, NUM_PESCINE + 1)] + \
                        [{"label": f"Pannello {i}", "value": f"Pannello_{i}"} for i in range(1, NUM_PANNELLI + 1)]
+opzioni_finestra = [{"label": "Live (ultime misurazioni)", "value": "live"}, {"label": "Ultima ora", "value": "1h"},
+                    {"label": "Ultime 24 ore", "value": "24h"}, {"label": "Ultimi 7 giorni", "value": "7g"}, {"label": "Ultimi 30 giorni", "value": "30g"}]
 
 layout = dbc.Container([
     titolo_sezione("Monitoraggio Sensori in Tempo Reale", icona="bi bi-broadcast"),
     dbc.Card(dbc.CardBody([
         dbc.Row([
-            dbc.Col(dbc.RadioItems(id="selettore-vista", options=[{"label": "Per Tipo Sensore", "value": "tipo"}, {"label": "Per Sorgente", "value": "sorgente_id"}], value="tipo", inline=True), md=6),
-            dbc.Col(dcc.Dropdown(id="dropdown-principale", clearable=False), md=6),
+            dbc.Col(dbc.RadioItems(id="selettore-vista", options=[{"label": "Per Tipo Sensore", "value": "tipo"}, {"label": "Per Sorgente", "value": "sorgente_id"}], value="tipo", inline=True), md=4),
+            dbc.Col(dcc.Dropdown(id="dropdown-principale", clearable=False), md=4),
+            dbc.Col(dcc.Dropdown(id="selettore-finestra", options=opzioni_finestra, value="live", clearable=False), md=4),
         ]),
         html.Div(dcc.Loading(
             #  Aggiunta di uirevision per ridurre il flash
@@ -133,7 +231,11 @@ layout = dbc.Container([
         ), className="mt-3", style={"maxHeight": "600px", "overflowY": "auto"})
     ])),
     dcc.Store(id='dati-grafico-store'),
-    dcc.Interval(id="aggiorna-dati-interval", interval=5000, n_intervals=0),
+    dcc.Store(id='grafico-stato-store'),  # Tracce della figura attuale, per gli aggiornamenti con Patch
+    # In modalità live i punti nuovi arrivano via SSE (assets/flusso.js) e vengono aggiunti al grafico lato client
+    dcc.Store(id='flusso-config-store'),
+    dcc.Store(id='flusso-stato-store'),
+    dcc.Interval(id="aggiorna-dati-interval", interval=INTERVALLO_AGGIORNAMENTO_MS, n_intervals=0),
     html.Hr(),
     titolo_sezione("Stato Attuale di Tutti gli Impianti", icona="bi bi-hdd-stack-fill"),
     dcc.Loading(html.Div(id="contenitore-stati-attuali")),
@@ -150,60 +252,65 @@ def aggiorna_opzioni_dropdown(vista_selezionata):
 
 @callback(
     Output('dati-grafico-store', 'data'),
+    Output('flusso-config-store', 'data'),
+    Output('aggiorna-dati-interval', 'disabled'),
     Input('aggiorna-dati-interval', 'n_intervals'),
     Input("selettore-vista", "value"),
     Input("dropdown-principale", "value"),
-    State('dati-grafico-store', 'data')
+    Input("selettore-finestra", "value"),
+)
+def aggiorna_dati_nello_store(n, tipo_vista, valore_selezionato, finestra):
+    # Il tick dell'intervallo (solo finestre lunghe) aggiorna il grafico con una Patch, non lo store
+    if ctx.triggered_id == 'aggiorna-dati-interval':
+        return dash.no_update, dash.no_update, dash.no_update
+
+    if finestra in DURATA_FINESTRE:
+        df = carica_dati_finestra(tipo_vista, valore_selezionato, finestra)
+        return (df.to_dict('records') if not df.empty else []), None, False
+
+    # Live: caricamento iniziale qui, poi solo i punti nuovi dal flusso SSE (l'intervallo resta fermo).
+    # L'id è letto prima dei dati: al più qualche punto arriva due volte e il client lo scarta.
+    dopo_id = ultimo_id_misurazioni()
+    df = carica_dati_filtrati(tipo_vista, valore_selezionato)
+    serie = df['sorgente_id' if tipo_vista == "tipo" else 'tipo'].nunique() if not df.empty else 1
+    config_flusso = {
+        "url": f"{PERCORSO_FLUSSO}?{urlencode({'filtro': tipo_vista, 'valore': valore_selezionato, 'dopo_id': dopo_id})}",
+        "grafico": "grafico-principale-monitoraggio",
+        "vista": tipo_vista,
+        "max_punti": MAX_DATAPOINTS_IN_STORE // max(1, serie),
+    }
+    return (df.to_dict('records') if not df.empty else []), config_flusso, True
+
+clientside_callback(
+    ClientsideFunction(namespace="flusso", function_name="collega"),
+    Output('flusso-stato-store', 'data'),
+    Input('flusso-config-store', 'data'),
 )
-def aggiorna_dati_nello_store(n, tipo_vista, valore_selezionato, dati_attuali):
-    trigger = ctx.triggered_id
-    
-    if trigger in ["selettore-vista", "dropdown-principale"]:
-        df = carica_dati_filtrati(tipo_vista, valore_selezionato)
-        return df.to_dict('records') if not df.empty else []
-
-    if trigger == 'aggiorna-dati-interval':
-        if not dati_attuali: return dash.no_update
-        df_vecchio = pd.DataFrame(dati_attuali)
-        if df_vecchio.empty: return dash.no_update
-        
-        ultimo_timestamp = df_vecchio['timestamp'].max()
-        df_nuovo = carica_nuovi_dati(tipo_vista, valore_selezionato, ultimo_timestamp)
-
-        if df_nuovo.empty: return dash.no_update
-        
-        df_completo = pd.concat([df_vecchio, df_nuovo]).drop_duplicates(subset=['timestamp', 'sorgente_id', 'tipo']).sort_values('timestamp')
-        
-        if len(df_completo) > MAX_DATAPOINTS_IN_STORE:
-            df_completo = df_completo.tail(MAX_DATAPOINTS_IN_STORE)
-            
-        return df_completo.to_dict('records')
-
-    return dash.no_update
 
 @callback(
     Output("grafico-principale-monitoraggio", "figure"),
+    Output('grafico-stato-store', 'data'),
     Input('dati-grafico-store', 'data'),
     State("selettore-vista", "value"),
     State("dropdown-principale", "value"),
+    State("selettore-finestra", "value"),
     State("grafico-principale-monitoraggio", "relayoutData")
 )
-def aggiorna_grafico_da_store(dati_json, tipo_vista, valore_selezionato, relayout_data):
+def aggiorna_grafico_da_store(dati_json, tipo_vista, valore_selezionato, finestra, relayout_data, zoom=False):
+    # Ricostruzione completa: solo quando cambiano vista, selezione o finestra
     if not dati_json:
-        return crea_grafico_vuoto(f"In attesa di dati per '{valore_selezionato}'...")
+        return crea_grafico_vuoto(f"In attesa di dati per '{valore_selezionato}'..."), None
 
     df_dati_grezzi = pd.DataFrame(dati_json)
     
     #  Prepariamo i dati inserendo i NaN dove necessario
-    df_dati_preparati = prepara_dati_per_grafico(df_dati_grezzi)
+    df_dati_preparati = prepara_dati_per_grafico(df_dati_grezzi, gap_massimo_dati(df_dati_grezzi))
 
-    range_x = None
-    if relayout_data and 'xaxis.range[0]' in relayout_data:
-        range_x = [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
-    else:
+    range_x = range_zoom(relayout_data)
+    if range_x is None and finestra in DURATA_FINESTRE:
         fine_finestra = datetime.now()
-        inizio_finestra = fine_finestra - timedelta(minutes=10)
-        range_x = [inizio_finestra, fine_finestra]
+        range_x = [fine_finestra - DURATA_FINESTRE[finestra], fine_finestra]
+    # In live l'asse x resta in autorange: segue i punti aggiunti dal flusso
 
     if tipo_vista == "tipo":
         fig = linea_temporale_sensori(df_dati_preparati, valore_selezionato, range_x=range_x)
@@ -211,9 +318,69 @@ def aggiorna_grafico_da_store(dati_json, tipo_vista, valore_selezionato, relayou
         fig = subplot_per_sorgente(df_dati_preparati, valore_selezionato, range_x=range_x)
 
     #  Aggiungiamo uirevision per un aggiornamento più fluido
-    fig.update_layout(uirevision=valore_selezionato)
+    fig.update_layout(uirevision=f"{valore_selezionato}-{finestra}")
+    # Valori come liste e non come array binari (plotly li serializza in base64),
+    # altrimenti le Patch successive non potrebbero estenderli e accorciarli
+    figura = fig.to_plotly_json()
+    for traccia, dati in zip(fig.data, figura["data"]):
+        if traccia.y is not None: dati["y"] = np.asarray(traccia.y, dtype=float).tolist()
+
+    # Dopo uno zoom la figura mostra un intervallo fisso: le Patch della finestra scorrevole non si applicano
+    return figura, stato_figura(fig, [tipo_vista, valore_selezionato, finestra] + (["zoom"] if zoom else []))
+
+@callback(
+    Output("grafico-principale-monitoraggio", "figure", allow_duplicate=True),
+    Output('grafico-stato-store', 'data', allow_duplicate=True),
+    Input('aggiorna-dati-interval', 'n_intervals'),
+    State("selettore-vista", "value"),
+    State("dropdown-principale", "value"),
+    State("selettore-finestra", "value"),
+    State('grafico-stato-store', 'data'),
+    State("grafico-principale-monitoraggio", "relayoutData"),
+    prevent_initial_call=True
+)
+def aggiorna_grafico_incrementale(n, tipo_vista, valore_selezionato, finestra, stato, relayout_data):
+    """Finestre lunghe: a ogni tick invia solo l'ultimo bucket aggiornato e i punti nuovi."""
+    if finestra not in DURATA_FINESTRE or not stato or stato["chiave"] != [tipo_vista, valore_selezionato, finestra]:
+        return dash.no_update, dash.no_update
+    df = carica_dati_finestra(tipo_vista, valore_selezionato, finestra)
+    risultato = patch_incrementale(df, tipo_vista, stato)
+    if risultato is None:
+        # Serie comparsa dopo la costruzione della figura: ricostruzione completa
+        return aggiorna_grafico_da_store(df.to_dict('records'), tipo_vista, valore_selezionato, finestra, relayout_data)
+    patch, nuovo_stato = risultato
+    if range_zoom(relayout_data) is None:
+        # La finestra scorre con il tempo, a meno che l'utente non abbia zoomato
+        fine_finestra = datetime.now()
+        patch["layout"]["xaxis"]["range"] = [(fine_finestra - DURATA_FINESTRE[finestra]).isoformat(), fine_finestra.isoformat()]
+    return patch, nuovo_stato
 
-    return fig
+@callback(
+    Output("grafico-principale-monitoraggio", "figure", allow_duplicate=True),
+    Output('grafico-stato-store', 'data', allow_duplicate=True),
+    Input("grafico-principale-monitoraggio", "relayoutData"),
+    State('dati-grafico-store', 'data'),
+    State("selettore-vista", "value"),
+    State("dropdown-principale", "value"),
+    State("selettore-finestra", "value"),
+    prevent_initial_call=True
+)
+def aggiorna_risoluzione_zoom(relayout_data, dati_json, tipo_vista, valore_selezionato, finestra):
+    """
+    Lo zoom rilegge dal database l'intervallo visibile a risoluzione più alta (grezzi o rollup più
+    fini), il doppio clic che ripristina l'asse torna ai dati della finestra.
+    """
+    range_x = range_zoom(relayout_data)
+    if range_x is not None:
+        df = carica_dati_intervallo(tipo_vista, valore_selezionato, *range_x)
+        if df.empty: return dash.no_update, dash.no_update
+        return aggiorna_grafico_da_store(df.to_dict('records'), tipo_vista, valore_selezionato, finestra, relayout_data, zoom=True)
+    if not any(chiave.endswith("autorange") for chiave in (relayout_data or {})):
+        return dash.no_update, dash.no_update
+    if finestra in DURATA_FINESTRE:
+        df = carica_dati_finestra(tipo_vista, valore_selezionato, finestra)
+        dati_json = df.to_dict('records') if not df.empty else []
+    return aggiorna_grafico_da_store(dati_json, tipo_vista, valore_selezionato, finestra, None)
 
 @callback(
     Output("contenitore-stati-attuali", "children"),
@@ -4,25 +4,36 @@ import dash
 from dash import html, dcc, Input, Output, callback
 import dash_bootstrap_components as dbc
 import pandas as pd
-import sqlite3
+from infrastruttura.database import QUERY_PRODUZIONE_RECENTE, QUERY_FINANZIARI_RECENTI
+from infrastruttura.contatori import efficienza, riepilogo
+from dashboard.utils.motore import motore_dashboard
 from dashboard.utils.layout import titolo_sezione, kpi_card
 from dashboard.utils.grafici import grafico_produzione, grafico_finanziario
 
 dash.register_page(__name__, path="/performance", name="Performance", title="HydroFusion | Performance", icon="bi bi-graph-up-arrow")
-DB_PATH = "hydrofusion.db"
 
 def carica_dati_performance():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df_produzione = pd.read_sql_query("SELECT * FROM dati_produzione ORDER BY timestamp DESC LIMIT 300", conn)
-        df_finanziario = pd.read_sql_query("SELECT * FROM dati_finanziari ORDER BY timestamp DESC LIMIT 300", conn)
-        conn.close(); return df_produzione, df_finanziario
+        df_produzione = motore_dashboard.interroga(QUERY_PRODUZIONE_RECENTE, (300,))
+        df_finanziario = motore_dashboard.interroga(QUERY_FINANZIARI_RECENTI, (300,))
+        return df_produzione, df_finanziario
     except Exception as e:
         print(f"Errore caricamento dati performance: {e}"); return pd.DataFrame(), pd.DataFrame()
 
+def crea_kpi_efficienza():
+    """Quota di sensori in stato OK per sottosistema, dai contatori mantenuti dal simulatore."""
+    try:
+        conteggi = motore_dashboard.contatori_stati()
+    except Exception as e:
+        print(f"Errore lettura contatori stati: {e}"); conteggi = None
+    if conteggi is None or not conteggi.any(): return []
+    return [dbc.Col(kpi_card(f"Efficienza {nome.capitalize()}", f"{efficienza(conteggi, [nome]):.0%}", "bi bi-speedometer2", colore="info"), md=3)
+            for nome in riepilogo(conteggi)]
+
 layout = dbc.Container([
     titolo_sezione("Analisi delle Performance Aziendali", icona="bi bi-graph-up-arrow"),
     dbc.Row(id="kpi-container", className="mb-4"),
+    dbc.Row(id="kpi-efficienza-container", className="mb-4"),
     dbc.Row([
         dbc.Col(dcc.Loading(dcc.Graph(id="grafico-performance-produzione")), lg=6),
         dbc.Col(dcc.Loading(dcc.Graph(id="grafico-performance-finanziaria")), lg=6),
@@ -30,7 +41,7 @@ layout = dbc.Container([
     dcc.Interval(id="aggiorna-performance-interval", interval=15000, n_intervals=0)
 ], fluid=True)
 
-@callback(Output("kpi-container", "children"), Output("grafico-performance-produzione", "figure"), Output("grafico-performance-finanziaria", "figure"), Input("aggiorna-performance-interval", "n_intervals"))
+@callback(Output("kpi-container", "children"), Output("kpi-efficienza-container", "children"), Output("grafico-performance-produzione", "figure"), Output("grafico-performance-finanziaria", "figure"), Input("aggiorna-performance-interval", "n_intervals"))
 def aggiorna_pagina_performance(n):
     df_prod, df_fin = carica_dati_performance()
 
@@ -46,4 +57,4 @@ def aggiorna_pagina_performance(n):
         dbc.Col(kpi_card("Raccolto Pronto", raccolto, "bi bi-basket2-fill", unita="kg"), md=3),
     ]
 
-    return kpi_cards, grafico_produzione(df_prod), grafico_finanziario(df_fin)
\ No newline at end of file
+    return kpi_cards, crea_kpi_efficienza(), grafico_produzione(df_prod), grafico_finanziario(df_fin)
\ No newline at end of file
@@ -0,0 +1,188 @@
+# dashboard/utils/cache.py
+"""
+Cache di processo per i risultati delle query della dashboard.
+
+Ogni scheda aperta interroga il database con il proprio dcc.Interval: senza cache N operatori
+che guardano la stessa pagina eseguono N volte la stessa query. Qui i risultati sono condivisi
+tra sessioni e callback, con chiave (query, parametri):
+
+- una voce resta valida finché i contatori in versioni_dati delle tabelle lette non cambiano
+  (li incrementa il writer dell'ingestione a ogni commit) e comunque non oltre il suo TTL;
+- le voci meno usate vengono scartate oltre MAX_VOCI (LRU);
+- se più callback chiedono insieme la stessa voce mancante, la query parte una volta sola
+  e gli altri attendono il risultato (single-flight).
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from infrastruttura.database import connessione_lettura, QUERY_VERSIONI_DATI
+
+TTL_SECONDI = 30
+MAX_VOCI = 256
+INTERVALLO_CONTROLLO_VERSIONI_SECONDI = 0.5
+
+_RE_TABELLE_LETTE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
+# La vista misurazioni legge dalla tabella compatta, che è quella versionata
+_ALIAS_TABELLE = {"misurazioni": "misurazioni_compatte"}
+
+
+def tabelle_lette(query):
+    """
+    Estrae dalla query le tabelle lette (clausole FROM e JOIN).
+
+    Args:
+        query (str): Query SQL
+
+    Returns:
+        tuple: Nomi delle tabelle, ordinati e senza duplicati
+    """
+    tabelle = {_ALIAS_TABELLE.get(nome.lower(), nome.lower()) for nome in _RE_TABELLE_LETTE.findall(query)}
+    return tuple(sorted(tabelle))
+
+
+def _copia(valore):
+    # I chiamanti modificano i DataFrame (nuove colonne, conversioni): ognuno riceve la sua copia
+    return valore.copy() if isinstance(valore, (pd.DataFrame, pd.Series, dict, list)) else valore
+
+
+class CacheQuery:
+    """
+    Cache TTL/LRU thread-safe invalidata dai contatori di versione del database.
+
+    Args:
+        max_voci (int): Numero massimo di risultati conservati
+        ttl (float): Durata massima di una voce in secondi, anche se i dati non cambiano
+        intervallo_versioni (float): Ogni quanto rileggere versioni_dati (al più una volta per intervallo)
+    """
+    def __init__(self, max_voci=MAX_VOCI, ttl=TTL_SECONDI, intervallo_versioni=INTERVALLO_CONTROLLO_VERSIONI_SECONDI):
+        self.max_voci, self.ttl, self.intervallo_versioni = max_voci, ttl, intervallo_versioni
+        self._voci = OrderedDict()
+        self._in_corso = {}
+        self._lock = threading.Lock()
+        self._versioni_lock = threading.Lock()
+        self._versioni, self._ultimo_controllo = {}, float("-inf")
+        self._stats = {"hit": 0, "miss": 0, "attese": 0, "scartate": 0}
+
+    def versioni(self):
+        """Contatori {tabella: versione}, riletti dal database al più ogni intervallo_versioni secondi."""
+        with self._versioni_lock:
+            if time.monotonic() - self._ultimo_controllo >= self.intervallo_versioni:
+                try:
+                    with connessione_lettura() as conn:
+                        self._versioni = dict(conn.execute(QUERY_VERSIONI_DATI).fetchall())
+                except sqlite3.OperationalError:
+                    self._versioni = {}  # Schema non ancora migrato: vale solo il TTL
+                self._ultimo_controllo = time.monotonic()
+            return self._versioni
+
+    def ottieni(self, chiave, tabelle, carica, ttl=None):
+        """
+        Restituisce il risultato in cache per `chiave`, oppure lo calcola con `carica()`.
+
+        Args:
+            chiave (tuple): Chiave hashable del risultato
+            tabelle (tuple): Tabelle da cui dipende il risultato
+            carica (callable): Funzione senza argomenti che produce il risultato
+            ttl (float, optional): TTL specifico per questa voce
+
+        Returns:
+            Una copia del risultato
+        """
+        versioni = self.versioni()
+        firma = tuple(versioni.get(tabella) for tabella in tabelle)
+        with self._lock:
+            voce = self._voci.get(chiave)
+            if voce is not None and voce[1] == firma and voce[2] > time.monotonic():
+                self._voci.move_to_end(chiave)
+                self._stats["hit"] += 1
+                return _copia(voce[0])
+            evento = self._in_corso.get(chiave)
+            proprietario = evento is None
+            if proprietario:
+                evento = self._in_corso[chiave] = threading.Event()
+            else:
+                self._stats["attese"] += 1
+
+        if not proprietario:
+            evento.wait()
+            with self._lock:
+                voce = self._voci.get(chiave)
+            # Se il caricamento in corso è fallito si riprova in proprio
+            return _copia(voce[0]) if voce is not None else carica()
+
+        try:
+            valore = carica()
+            with self._lock:
+                self._voci[chiave] = (valore, firma, time.monotonic() + (self.ttl if ttl is None else ttl))
+                self._voci.move_to_end(chiave)
+                self._stats["miss"] += 1
+                while len(self._voci) > self.max_voci:
+                    self._voci.popitem(last=False)
+                    self._stats["scartate"] += 1
+        finally:
+            with self._lock:
+                self._in_corso.pop(chiave).set()
+        return _copia(valore)
+
+    def svuota(self):
+        with self._lock:
+            self._voci.clear()
+
+    def statistiche(self):
+        with self._lock:
+            stats = dict(self._stats, voci=len(self._voci))
+        richieste = stats["hit"] + stats["miss"] + stats["attese"]
+        stats["hit_ratio"] = (stats["hit"] + stats["attese"]) / richieste if richieste else 0.0
+        return stats
+
+
+_cache = CacheQuery()
+
+
+def query_in_cache(query, params=(), ttl=None, **opzioni_read_sql):
+    """
+    pd.read_sql_query condiviso tra sessioni: la query viene rieseguita solo se le tabelle lette sono cambiate.
+
+    Args:
+        query (str): Query SQL
+        params (tuple): Parametri della query
+        ttl (float, optional): TTL specifico per questa voce
+        **opzioni_read_sql: Opzioni passate a pd.read_sql_query (es. index_col)
+
+    Returns:
+        pd.DataFrame: Copia del risultato
+    """
+    def carica():
+        with connessione_lettura() as conn:
+            return pd.read_sql_query(query, conn, params=params, **opzioni_read_sql)
+    chiave = (query, tuple(params), repr(sorted(opzioni_read_sql.items())))
+    return _cache.ottieni(chiave, tabelle_lette(query), carica, ttl)
+
+
+def risultato_in_cache(chiave, tabelle, carica, ttl=None):
+    """
+    Come query_in_cache per caricamenti arbitrari (più query, post-elaborazione).
+
+    Args:
+        chiave (tuple): Chiave hashable del risultato
+        tabelle (tuple): Tabelle da cui dipende il risultato
+        carica (callable): Funzione senza argomenti che produce il risultato
+        ttl (float, optional): TTL specifico per questa voce
+
+    Returns:
+        Una copia del risultato
+    """
+    return _cache.ottieni(chiave, tuple(tabelle), carica, ttl)
+
+
+def statistiche_cache():
+    return _cache.statistiche()
+
+
+def svuota_cache():
+    """Scarta tutti i risultati in cache (es. dopo aver cambiato il database sottostante)."""
+    _cache.svuota()
@@ -0,0 +1,38 @@
+# dashboard/utils/esportazione.py
+"""
+Download in streaming dei dati grezzi (infrastruttura/export.py) dal server della dashboard.
+
+La risposta viene generata a blocchi mentre il browser scarica: né il server né la pagina
+Esplora Dati tengono in memoria l'intera tabella.
+"""
+
+from flask import Response, request, stream_with_context
+from infrastruttura.export import flusso_export
+
+PERCORSO_EXPORT = "/export/<tabella>.<formato>"
+_TIPI_MIME = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+
+def registra_endpoint_export(server):
+    """
+    Aggiunge al server Flask l'endpoint di esportazione, es. /export/misurazioni.csv?inizio=2025-01-01&tipo=pH.
+
+    Parametri della richiesta (tutti facoltativi): inizio, fine, sorgente, tipo.
+
+    Args:
+        server (flask.Flask): Il server dell'app Dash (app.server)
+    """
+    @server.route(PERCORSO_EXPORT)
+    def esporta_tabella(tabella, formato):
+        filtri = {nome: request.args.get(nome) or None for nome in ("inizio", "fine", "sorgente", "tipo")}
+        try:
+            flusso = flusso_export(tabella, formato, **filtri)
+            primo = next(flusso)  # Fa emergere gli errori sui parametri prima di inviare il 200
+        except (ValueError, ImportError) as e:
+            return Response(str(e), status=400)
+
+        def contenuto():
+            yield primo
+            yield from flusso
+        return Response(stream_with_context(contenuto()), mimetype=_TIPI_MIME[formato],
+                        headers={"Content-Disposition": f'attachment; filename="{tabella}.{formato}"', "X-Accel-Buffering": "no"})
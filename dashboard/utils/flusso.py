@@ -0,0 +1,180 @@
+# dashboard/utils/flusso.py
+"""
+Flusso live delle misurazioni verso il browser con Server-Sent Events.
+
+Un solo thread per processo segue misurazioni_compatte per id (le righe scritte dal writer
+dell'ingestione) e distribuisce i nuovi punti agli iscritti, ciascuno filtrato per tipo o
+sorgente. La dashboard gira in un processo diverso dal simulatore, quindi le righe arrivano da
+SQLite (una lettura per giro, solo se versioni_dati è cambiato) e non direttamente dalla coda. Il client (assets/flusso.js) li aggiunge al grafico con extendData: per ogni
+aggiornamento viaggiano solo i punti nuovi invece dell'intera finestra.
+"""
+
+import json
+import queue
+import threading
+import time
+from flask import Response, request, stream_with_context
+from config.classificatore import classifica_stati
+from infrastruttura.database import connessione_lettura, QUERY_MISURAZIONI_DOPO_ID, QUERY_ULTIMO_ID_MISURAZIONI, QUERY_VERSIONI_DATI
+
+PERCORSO_FLUSSO = "/flusso/misurazioni"
+INTERVALLO_POLLING_SECONDI = 0.5
+INTERVALLO_HEARTBEAT_SECONDI = 15
+RIGHE_PER_LETTURA = 5000
+MAX_RIGHE_RECUPERO = 20000  # Riconnessioni dopo molto tempo: si recupera solo la coda più recente
+MAX_EVENTI_IN_CODA = 120  # Un client più lento di così perde punti invece di far crescere la memoria
+
+# Colonna delle righe lette (id, timestamp, sorgente_id, tipo, valore) su cui filtra ciascuna vista
+_COLONNA_FILTRO = {"tipo": 3, "sorgente_id": 2}
+
+
+def ultimo_id_misurazioni():
+    """
+    Id dell'ultima misurazione scritta, da cui far partire il flusso dopo il caricamento iniziale.
+
+    Returns:
+        int: Id massimo in misurazioni_compatte (0 se vuota)
+    """
+    with connessione_lettura() as conn:
+        return conn.execute(QUERY_ULTIMO_ID_MISURAZIONI).fetchone()[0]
+
+
+def _punti(righe):
+    stati = classifica_stati([riga[3] for riga in righe], [riga[4] for riga in righe])
+    return [[timestamp, sorgente_id, tipo, valore, stato] for (_, timestamp, sorgente_id, tipo, valore), stato in zip(righe, stati)]
+
+
+class _Iscritto:
+    __slots__ = ("filtro", "valore", "coda", "persi")
+
+    def __init__(self, filtro, valore):
+        self.filtro, self.valore = filtro, valore
+        self.coda = queue.Queue(maxsize=MAX_EVENTI_IN_CODA)
+        self.persi = 0
+
+
+class DiffusoreMisurazioni:
+    """
+    Legge le nuove misurazioni una volta sola per tutti i client collegati.
+
+    Il thread parte alla prima iscrizione e a ogni giro controlla prima il contatore di
+    misurazioni_compatte in versioni_dati: se non è cambiato non esegue altre query. Senza iscritti
+    non legge nulla e dimentica la posizione: il primo iscritto successivo riparte dall'ultimo id.
+    """
+    def __init__(self, intervallo=INTERVALLO_POLLING_SECONDI):
+        self.intervallo = intervallo
+        self._iscritti = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ultimo_id, self._ultima_versione = None, None
+
+    def iscrivi(self, filtro, valore, dopo_id):
+        """
+        Registra un client e gli accoda subito i punti successivi a dopo_id già letti dal database.
+
+        Args:
+            filtro (str): 'tipo' o 'sorgente_id'
+            valore (str): Tipo di sensore o sorgente selezionati
+            dopo_id (int): Ultimo id già presente nel grafico del client
+
+        Returns:
+            _Iscritto: Da passare a disiscrivi() alla chiusura
+        """
+        if filtro not in _COLONNA_FILTRO: raise ValueError(f"Filtro non valido: '{filtro}'")
+        iscritto = _Iscritto(filtro, valore)
+        with self._lock:
+            if self._ultimo_id is None: self._ultimo_id = ultimo_id_misurazioni()
+            # Punti tra il caricamento iniziale (o l'ultima riconnessione) e adesso
+            if dopo_id < self._ultimo_id:
+                dopo_id = max(dopo_id, self._ultimo_id - MAX_RIGHE_RECUPERO)
+                self._consegna([iscritto], self._leggi(dopo_id, self._ultimo_id))
+            self._iscritti.add(iscritto)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._ciclo, name="flusso-misurazioni", daemon=True)
+                self._thread.start()
+        return iscritto
+
+    def disiscrivi(self, iscritto):
+        with self._lock:
+            self._iscritti.discard(iscritto)
+            # Nessuno collegato: la posizione invecchierebbe e il prossimo iscritto farebbe leggere ore di righe
+            if not self._iscritti: self._ultimo_id = self._ultima_versione = None
+
+    def _leggi(self, dopo_id, fino_id=None):
+        righe, limite = [], MAX_RIGHE_RECUPERO
+        with connessione_lettura() as conn:
+            while len(righe) < limite:
+                blocco = conn.execute(QUERY_MISURAZIONI_DOPO_ID, (dopo_id, min(RIGHE_PER_LETTURA, limite - len(righe)))).fetchall()
+                if fino_id is not None: blocco = [riga for riga in blocco if riga[0] <= fino_id]
+                righe.extend(blocco)
+                if len(blocco) < RIGHE_PER_LETTURA: break
+                dopo_id = blocco[-1][0]
+        return righe
+
+    def _consegna(self, iscritti, righe):
+        for iscritto in iscritti:
+            colonna = _COLONNA_FILTRO[iscritto.filtro]
+            selezionate = [riga for riga in righe if riga[colonna] == iscritto.valore]
+            if not selezionate: continue
+            try:
+                iscritto.coda.put_nowait((selezionate[-1][0], _punti(selezionate)))
+            except queue.Full:
+                iscritto.persi += len(selezionate)
+
+    def _ciclo(self):
+        while True:
+            time.sleep(self.intervallo)
+            with self._lock:
+                if not self._iscritti: continue
+                dopo_id, ultima_versione = self._ultimo_id, self._ultima_versione
+            try:
+                with connessione_lettura() as conn:
+                    versione = dict(conn.execute(QUERY_VERSIONI_DATI).fetchall()).get("misurazioni_compatte")
+                if versione == ultima_versione: continue
+                # Al più MAX_RIGHE_RECUPERO righe per giro: il resto al giro successivo (la versione resta quella vecchia)
+                righe = self._leggi(dopo_id)
+                with self._lock:
+                    if self._ultimo_id != dopo_id: continue  # Tutti disiscritti nel frattempo: la posizione è stata azzerata
+                    if len(righe) < MAX_RIGHE_RECUPERO: self._ultima_versione = versione
+                    if righe: self._ultimo_id = righe[-1][0]
+                    self._consegna(list(self._iscritti), righe)
+            except Exception as e:
+                print(f"Errore flusso misurazioni: {e}")
+
+
+_diffusore = DiffusoreMisurazioni()
+
+
+def _eventi(iscritto):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                ultimo_id, punti = iscritto.coda.get(timeout=INTERVALLO_HEARTBEAT_SECONDI)
+            except queue.Empty:
+                yield ": heartbeat\n\n"  # Tiene viva la connessione e fa emergere i client chiusi
+                continue
+            yield f"id: {ultimo_id}\ndata: {json.dumps(punti)}\n\n"
+    finally:
+        _diffusore.disiscrivi(iscritto)
+
+
+def registra_endpoint_flusso(server):
+    """
+    Aggiunge al server Flask della dashboard l'endpoint SSE delle misurazioni.
+
+    Parametri della richiesta: filtro ('tipo' o 'sorgente_id'), valore e dopo_id. In caso di
+    riconnessione il browser rimanda l'ultimo id ricevuto nell'header Last-Event-ID.
+
+    Args:
+        server (flask.Flask): Il server dell'app Dash (app.server)
+    """
+    @server.route(PERCORSO_FLUSSO)
+    def flusso_misurazioni():
+        try:
+            dopo_id = int(request.headers.get("Last-Event-ID") or request.args.get("dopo_id", 0))
+            iscritto = _diffusore.iscrivi(request.args.get("filtro", "tipo"), request.args.get("valore", ""), dopo_id)
+        except ValueError as e:
+            return Response(str(e), status=400)
+        return Response(stream_with_context(_eventi(iscritto)), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
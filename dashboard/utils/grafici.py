@@ -6,7 +6,8 @@ Contiene funzioni per creare visualizzazioni interattive dei dati dei sensori,
 inclusi grafici temporali, subplot per sorgente e analisi di produzione/finanziarie.
 """
 
-import plotly.express as px
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from config.config import SENSOR_CONFIG, PANNELLO_CONFIG
@@ -14,6 +15,98 @@ from config.config import SENSOR_CONFIG, PANNELLO_CONFIG
 # Configurazione unificata di tutti i sensori
 TUTTE_LE_CONFIG_SENSORI = {**SENSOR_CONFIG, **PANNELLO_CONFIG}
 
+# Punti per traccia oltre i quali si ricampiona: circa due per pixel su un grafico a tutta larghezza
+PUNTI_MASSIMI_PER_TRACCIA = 1000
+
+def indici_m4(x, y, punti_massimi):
+    """
+    Ricampionamento M4: divide l'asse x in punti_massimi/4 colonne di uguale ampiezza e per
+    ognuna tiene il primo, l'ultimo, il minimo e il massimo. A parità di pixel il disegno
+    della linea è identico a quello dei dati completi: i picchi restano visibili.
+    
+    Args:
+        x (numpy.ndarray): Ascisse numeriche ordinate
+        y (numpy.ndarray): Valori senza NaN
+        punti_massimi (int): Punti massimi da restituire
+        
+    Returns:
+        numpy.ndarray: Indici ordinati dei punti da tenere
+    """
+    colonne = max(1, punti_massimi // 4)
+    ampiezza = (x[-1] - x[0]) or 1
+    colonna = np.minimum(((x - x[0]) * colonne // ampiezza).astype(np.int64), colonne - 1)
+    inizi = np.flatnonzero(np.r_[True, colonna[1:] != colonna[:-1]])
+    fini = np.r_[inizi[1:], len(x)] - 1
+    # Ordinando per (colonna, valore) minimo e massimo di ogni colonna stanno ai suoi estremi
+    ordine = np.lexsort((y, colonna))
+    return np.unique(np.concatenate([inizi, fini, ordine[inizi], ordine[fini]]))
+
+def indici_lttb(x, y, punti_massimi):
+    """
+    Ricampionamento Largest-Triangle-Three-Buckets: per ogni bucket sceglie il punto che forma
+    il triangolo più grande con il punto scelto prima e la media del bucket successivo.
+    Conserva la forma della curva con esattamente punti_massimi punti.
+    
+    Args:
+        x (numpy.ndarray): Ascisse numeriche ordinate
+        y (numpy.ndarray): Valori senza NaN
+        punti_massimi (int): Punti da restituire (almeno 3)
+        
+    Returns:
+        numpy.ndarray: Indici ordinati dei punti da tenere
+    """
+    n = len(x)
+    if punti_massimi >= n or punti_massimi < 3:
+        return np.arange(n)
+    x, y = x.astype(float), y.astype(float)
+    confini = np.linspace(1, n - 1, punti_massimi - 1).astype(np.int64)
+    scelti = np.empty(punti_massimi, dtype=np.int64)
+    scelti[0], scelti[-1], a = 0, n - 1, 0
+    for i in range(punti_massimi - 2):
+        inizio, fine = confini[i], confini[i + 1]
+        prossimo_fine = confini[i + 2] if i + 2 < len(confini) else n
+        media_x, media_y = x[fine:prossimo_fine].mean(), y[fine:prossimo_fine].mean()
+        aree = np.abs((x[a] - media_x) * (y[inizio:fine] - y[a]) - (x[a] - x[inizio:fine]) * (media_y - y[a]))
+        a = scelti[i + 1] = inizio + int(aree.argmax())
+    return scelti
+
+_METODI_RICAMPIONAMENTO = {"m4": indici_m4, "lttb": indici_lttb}
+
+def riduci_punti(df, punti_massimi=PUNTI_MASSIMI_PER_TRACCIA, metodo="m4", colonne_serie=("sorgente_id", "tipo")):
+    """
+    Ricampiona ogni serie del DataFrame a non più di punti_massimi punti (circa).
+    Oltre ai punti scelti dal metodo restano sempre le righe NaN che interrompono le linee e i
+    punti a cavallo di un cambio di stato, così gli attraversamenti delle soglie restano visibili.
+    
+    Args:
+        df (pandas.DataFrame): Dati ordinati per tempo con colonne timestamp, valore e colonne_serie
+        punti_massimi (int): Punti massimi per serie
+        metodo (str): 'm4' oppure 'lttb'
+        colonne_serie (tuple): Colonne che identificano una traccia
+        
+    Returns:
+        pandas.DataFrame: Sottoinsieme delle righe, nello stesso ordine
+    """
+    if df.empty or len(df) <= punti_massimi:
+        return df
+    scegli = _METODI_RICAMPIONAMENTO[metodo]
+    x_tutti = pd.to_datetime(df['timestamp']).to_numpy().astype('datetime64[ns]').astype(np.int64)
+    y_tutti = df['valore'].to_numpy(dtype=float)
+    stati = df['stato'].to_numpy() if 'stato' in df else None
+    tenute = []
+    for posizioni in df.groupby(list(colonne_serie), sort=False).indices.values():
+        if len(posizioni) <= punti_massimi:
+            tenute.append(posizioni); continue
+        y = y_tutti[posizioni]
+        validi = np.flatnonzero(~np.isnan(y))
+        scelti = [validi[scegli(x_tutti[posizioni][validi], y[validi], punti_massimi)]] if len(validi) else []
+        scelti.append(np.flatnonzero(np.isnan(y)))
+        if stati is not None:
+            cambi = np.flatnonzero(stati[posizioni][1:] != stati[posizioni][:-1])
+            if len(cambi) <= punti_massimi // 2: scelti += [cambi, cambi + 1]
+        tenute.append(posizioni[np.unique(np.concatenate(scelti))])
+    return df.iloc[np.sort(np.concatenate(tenute))]
+
 def crea_grafico_vuoto(messaggio="Nessun dato disponibile"):
     """
     Crea un grafico Plotly vuoto con un messaggio personalizzato.
@@ -40,7 +133,7 @@ def crea_grafico_vuoto(messaggio="Nessun dato disponibile"):
     )
     return fig
 
-def linea_temporale_sensori(df, nome_grafico, range_x=None):
+def linea_temporale_sensori(df, nome_grafico, range_x=None, punti_massimi=PUNTI_MASSIMI_PER_TRACCIA):
     """
     Crea un grafico a linee temporali per i dati dei sensori.
     
@@ -48,12 +141,15 @@ def linea_temporale_sensori(df, nome_grafico, range_x=None):
         df (pandas.DataFrame): DataFrame con colonne timestamp, valore, sorgente_id, stato
         nome_grafico (str): Nome del tipo di sensore da visualizzare
         range_x (tuple, optional): Range temporale per l'asse X
+        punti_massimi (int, optional): Punti per sorgente oltre i quali si ricampiona (None per disattivare)
         
     Returns:
         plotly.graph_objects.Figure: Grafico temporale con bande di soglia colorate
     """
     if df.empty:
         return crea_grafico_vuoto(f"Nessun dato per '{nome_grafico}'")
+    if punti_massimi:
+        df = riduci_punti(df, punti_massimi)
     
     # Recupera configurazione e unità di misura del sensore
     config = TUTTE_LE_CONFIG_SENSORI.get(nome_grafico, {})
@@ -69,6 +165,7 @@ def linea_temporale_sensori(df, nome_grafico, range_x=None):
     )
     
     # Creazione grafico principale
+    import plotly.express as px  # ~60 ms di import: caricato al primo grafico, non all'avvio della dashboard
     fig = px.line(
         df, 
         x="timestamp", 
@@ -129,7 +226,7 @@ def linea_temporale_sensori(df, nome_grafico, range_x=None):
         
     return fig
 
-def subplot_per_sorgente(df, sorgente_id, range_x=None):
+def subplot_per_sorgente(df, sorgente_id, range_x=None, punti_massimi=PUNTI_MASSIMI_PER_TRACCIA):
     """
     Crea subplot multipli per visualizzare tutti i sensori di una specifica sorgente.
     
@@ -137,12 +234,15 @@ def subplot_per_sorgente(df, sorgente_id, range_x=None):
         df (pandas.DataFrame): DataFrame filtrato per una sorgente specifica
         sorgente_id (str): ID della sorgente (es. "Serra_1", "Pesci_2")
         range_x (tuple, optional): Range temporale per l'asse X
+        punti_massimi (int, optional): Punti per sensore oltre i quali si ricampiona (None per disattivare)
         
     Returns:
         plotly.graph_objects.Figure: Figura con subplot per ogni tipo di sensore
     """
     if df.empty:
         return crea_grafico_vuoto(f"Nessun dato per '{sorgente_id}'")
+    if punti_massimi:
+        df = riduci_punti(df, punti_massimi)
     
     tipi = sorted(df['tipo'].unique())
     if len(tipi) == 0:
@@ -251,6 +351,7 @@ def grafico_produzione(df):
     if df.empty:
         return crea_grafico_vuoto("Nessun dato di produzione")
     
+    import plotly.express as px
     fig = px.line(
         df, 
         x="timestamp", 
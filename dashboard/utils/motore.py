@@ -0,0 +1,14 @@
+# dashboard/utils/motore.py
+"""
+Motore dati usato da tutte le pagine della dashboard.
+
+Le viste live (ultime misurazioni e stati attuali) arrivano dal ring buffer che il simulatore tiene
+in memoria condivisa. La lettura ripiega su SQLite se il simulatore non è in esecuzione, se il ring
+buffer è pieno e qualche sensore ne è rimasto fuori, o se non contiene tutte le letture richieste.
+Le query sulle tabelle storiche passano sempre dalla cache di processo.
+"""
+
+from infrastruttura.motori import MotoreCombinato, MotoreMemoria, MotoreSQLite
+from dashboard.utils.cache import query_in_cache
+
+motore_dashboard = MotoreCombinato(MotoreMemoria.in_lettura(), MotoreSQLite(interroga=query_in_cache))
@@ -0,0 +1,256 @@
+# dashboard/utils/paginazione.py
+"""
+Paginazione, ordinamento e filtri lato server per le tabelle della pagina Esplora Dati.
+
+La DataTable lavora con page_action/sort_action/filter_action="custom": qui il filtro scritto
+nelle caselle sotto le intestazioni (sintassi filter_query, es. "{tipo} s= pH && {valore} > 7")
+diventa una clausola WHERE parametrizzata e ogni pagina è una sola query con LIMIT.
+
+Le pagine successive usano la paginazione a chiave (keyset): si riparte dopo la coppia
+(valore di ordinamento, id) dell'ultima riga vista, senza OFFSET, quindi la pagina 1000 costa
+quanto la prima. Solo un salto a una pagina mai visitata ricade su OFFSET. Sulle colonne che
+ammettono NULL (in SQLite prima di ogni valore in ASC, dopo in DESC) il cursore può avere valore
+None e la condizione tiene conto delle righe NULL.
+
+Il costo costante per pagina vale per le colonne con un indice nell'ordine richiesto ("ordinata":
+id e tempo delle misurazioni). Ordinare per una colonna senza indice (es. valore, sorgente o tipo
+delle misurazioni) scorre a ogni pagina tutte le righe che soddisfano il filtro, con un
+ordinamento top-N: su tabelle grandi conviene prima restringere con un filtro.
+
+Nei filtri di testo il prefisso "i" (es. "i=", "icontains") confronta senza distinguere maiuscole
+e minuscole, "s" distinguendole; senza prefisso "=" distingue e "contains" no (LIKE di SQLite).
+"""
+
+import re
+from datetime import datetime
+import pandas as pd
+from infrastruttura.database import ts_ms_da_iso
+from infrastruttura.migrazioni import SQL_ISO_DA_MS
+
+RIGHE_PER_PAGINA = 25
+
+# Colonna: espressione SELECT, tipo DataTable, espressione per filtro e ordinamento, sottoquery di lookup,
+# se esiste un indice nell'ordine (espressione, chiave) e se la colonna ammette NULL. Per le misurazioni
+# sorgente e tipo sono interi: il filtro cerca gli id nella tabella dei nomi (poche righe); il tempo si confronta su ts_ms.
+def _colonna(select, tipo="text", espressione=None, lookup=None, ordinata=False, nullabile=False):
+    return {"select": select, "tipo": tipo, "espressione": espressione or select, "lookup": lookup, "ordinata": ordinata, "nullabile": nullabile}
+
+TABELLE_ESPLORABILI = {
+    "misurazioni": {
+        "etichetta": "Misurazioni Sensori",
+        "da": "misurazioni_compatte m JOIN sorgenti s ON s.id = m.sorgente_id JOIN tipi_sensore t ON t.id = m.tipo_id",
+        "chiave": "m.id",
+        "colonne": {
+            "id": _colonna("m.id", "numeric", ordinata=True),
+            "sorgente_id": _colonna("s.nome", lookup="{piu}m.sorgente_id IN (SELECT id FROM sorgenti WHERE {condizione})"),
+            "tipo": _colonna("t.nome", lookup="{piu}m.tipo_id IN (SELECT id FROM tipi_sensore WHERE {condizione})"),
+            "valore": _colonna("m.valore", "numeric"),
+            "timestamp": _colonna(SQL_ISO_DA_MS.format(colonna="m.ts_ms"), "datetime", "m.ts_ms", ordinata=True),
+        },
+    },
+    "stati_attuali": {
+        "etichetta": "Stati Attuali",
+        "da": "stati_attuali",
+        "chiave": "rowid",
+        "colonne": {nome: _colonna(nome, "datetime" if nome == "timestamp" else "text") for nome in ("sorgente_id", "tipo", "stato", "timestamp")},
+    },
+    "storico_allarmi": {
+        "etichetta": "Storico Allarmi",
+        "da": "storico_allarmi",
+        "chiave": "id",
+        "colonne": {"id": _colonna("id", "numeric"), **{nome: _colonna(nome) for nome in ("sorgente_id", "tipo", "evento", "stato")},
+                    "azioni": _colonna("azioni", nullabile=True),
+                    "timestamp": _colonna("timestamp", "datetime")},
+    },
+    "dati_produzione": {
+        "etichetta": "Dati di Produzione",
+        "da": "dati_produzione",
+        "chiave": "id",
+        "colonne": {"id": _colonna("id", "numeric"), "timestamp": _colonna("timestamp", "datetime"),
+                    "biomassa_pesci_kg": _colonna("biomassa_pesci_kg", "numeric", nullabile=True),
+                    "raccolto_pronto_kg": _colonna("raccolto_pronto_kg", "numeric", nullabile=True),
+                    "descrizione": _colonna("descrizione", nullabile=True)},
+    },
+    "dati_finanziari": {
+        "etichetta": "Dati Finanziari",
+        "da": "dati_finanziari",
+        "chiave": "id",
+        "colonne": {"id": _colonna("id", "numeric"), "timestamp": _colonna("timestamp", "datetime"),
+                    **{nome: _colonna(nome, "numeric") for nome in ("ricavi", "costi", "profitto_parziale", "profitto_cumulativo")},
+                    "descrizione": _colonna("descrizione", nullabile=True)},
+    },
+}
+
+_OPERATORI_CONFRONTO = {"=": "=", "eq": "=", "!=": "!=", "ne": "!=", "<": "<", "lt": "<", "<=": "<=", "le": "<=",
+                        ">": ">", "gt": ">", ">=": ">=", "ge": ">="}
+_RE_CONDIZIONE = re.compile(
+    r"^\{(?P<colonna>[^}]+)\}\s+(?P<operatore>is blank|is nil|[si]?(?:contains|datestartswith|!=|<=|>=|=|<|>|eq|ne|lt|le|gt|ge))(?:\s+(?P<valore>.*))?$",
+    re.IGNORECASE)
+# Lunghezza del prefisso di data -> unità da aggiungere per l'estremo superiore di datestartswith
+_UNITA_PREFISSO = {4: pd.DateOffset(years=1), 7: pd.DateOffset(months=1), 10: pd.DateOffset(days=1),
+                   13: pd.DateOffset(hours=1), 16: pd.DateOffset(minutes=1), 19: pd.DateOffset(seconds=1)}
+
+
+def colonne_tabella(nome_tabella):
+    """Definizione delle colonne per la DataTable (nome, id e tipo, usato dalla UI dei filtri)."""
+    return [{"name": nome, "id": nome, "type": colonna["tipo"]} for nome, colonna in TABELLE_ESPLORABILI[nome_tabella]["colonne"].items()]
+
+
+def _togli_virgolette(valore):
+    valore = valore.strip()
+    if len(valore) >= 2 and valore[0] == valore[-1] and valore[0] in "\"'`":
+        return valore[1:-1].replace("\\" + valore[0], valore[0])
+    return valore
+
+
+def _valore_colonna(colonna, valore, nome):
+    """Converte il valore scritto nel filtro nel tipo della colonna (ms per ts_ms, ISO per i timestamp testuali)."""
+    if colonna["tipo"] == "numeric":
+        try: return float(valore)
+        except ValueError: raise ValueError(f"'{valore}' non è un numero valido per '{nome}'")
+    if colonna["tipo"] == "datetime":
+        momento = _data(valore, nome)
+        return ts_ms_da_iso(momento.isoformat()) if colonna["espressione"].endswith("ts_ms") else momento.isoformat()
+    return valore
+
+
+def _data(valore, nome):
+    try: return datetime.fromisoformat(valore.strip().replace(" ", "T"))
+    except ValueError: raise ValueError(f"'{valore}' non è una data valida per '{nome}' (formato AAAA-MM-GG HH:MM:SS)")
+
+
+def _condizione(nome, colonna, operatore, valore):
+    """Una condizione del filtro -> (SQL con {espr} al posto della colonna, parametri)."""
+    operatore = operatore.lower()
+    if operatore in ("is blank", "is nil"):
+        return ("{espr} IS NULL" if operatore == "is nil" else "({espr} IS NULL OR {espr} = '')"), []
+    if valore is None or valore.strip() == "":
+        raise ValueError(f"Manca il valore per il filtro su '{nome}'")
+    valore = _togli_virgolette(valore)
+    # Prefisso s/i: maiuscole distinte o no. Conta solo sulle colonne di testo
+    prefisso = ""
+    if operatore[0] in "si" and (operatore[1:] in _OPERATORI_CONFRONTO or operatore[1:] in ("contains", "datestartswith")):
+        prefisso, operatore = operatore[0], operatore[1:]
+    if operatore == "contains":
+        if colonna["tipo"] != "text":
+            return "{espr} = ?", [_valore_colonna(colonna, valore, nome)]
+        if prefisso == "s":
+            return "instr({espr}, ?) > 0", [valore]  # LIKE ignora le maiuscole, instr no
+        return "{espr} LIKE ? ESCAPE '\\'", ["%" + re.sub(r"([%_\\])", r"\\\1", valore) + "%"]
+    if operatore == "datestartswith":
+        # Intervallo [inizio, inizio + unità del prefisso): resta un confronto sull'indice del tempo
+        prefisso = valore.strip().replace(" ", "T")
+        if len(prefisso) not in _UNITA_PREFISSO:
+            raise ValueError(f"Prefisso di data non valido per '{nome}': '{valore}'")
+        inizio = _data(prefisso + "0000-01-01T00:00:00"[len(prefisso):], nome)
+        fine = (pd.Timestamp(inizio) + _UNITA_PREFISSO[len(prefisso)]).to_pydatetime()
+        return "{espr} >= ? AND {espr} < ?", [_valore_colonna(colonna, inizio.isoformat(), nome), _valore_colonna(colonna, fine.isoformat(), nome)]
+    collazione = " COLLATE NOCASE" if prefisso == "i" and colonna["tipo"] == "text" else ""
+    return f"{{espr}}{collazione} {_OPERATORI_CONFRONTO[operatore]} ?", [_valore_colonna(colonna, valore, nome)]
+
+
+def traduci_filtro(nome_tabella, filter_query, indici_lookup=True):
+    """
+    Traduce il filter_query della DataTable in una clausola WHERE parametrizzata.
+
+    Args:
+        nome_tabella (str): Chiave di TABELLE_ESPLORABILI
+        filter_query (str): Condizioni unite da '&&', es. "{tipo} s= pH && {valore} > 7"
+        indici_lookup (bool): Se False i filtri su sorgente e tipo non usano il loro indice
+            (+colonna), così SQLite sceglie l'indice che dà già l'ordinamento della pagina
+
+    Returns:
+        tuple: (lista di condizioni SQL da unire con AND, lista di parametri)
+
+    Raises:
+        ValueError: Colonna, operatore o valore non validi (il messaggio è mostrato all'utente)
+    """
+    colonne = TABELLE_ESPLORABILI[nome_tabella]["colonne"]
+    condizioni, params = [], []
+    if not filter_query or not filter_query.strip():
+        return condizioni, params
+    if "||" in filter_query:
+        raise ValueError("Il filtro supporta solo condizioni unite da '&&'")
+    for parte in filter_query.split("&&"):
+        parte = parte.strip()
+        while parte.startswith("(") and parte.endswith(")"): parte = parte[1:-1].strip()
+        trovata = _RE_CONDIZIONE.match(parte)
+        if not trovata:
+            raise ValueError(f"Filtro non riconosciuto: '{parte}'")
+        nome = trovata["colonna"]
+        if nome not in colonne:
+            raise ValueError(f"Colonna sconosciuta nel filtro: '{nome}'")
+        colonna = colonne[nome]
+        sql, valori = _condizione(nome, colonna, trovata["operatore"], trovata["valore"])
+        if colonna["lookup"]:
+            condizioni.append(colonna["lookup"].format(condizione=sql.format(espr="nome"), piu="" if indici_lookup else "+"))
+        else:
+            condizioni.append("(" + sql.format(espr=colonna["espressione"]) + ")")
+        params += valori
+    return condizioni, params
+
+
+def query_pagina(nome_tabella, filter_query=None, sort_by=None, righe=RIGHE_PER_PAGINA, cursore=None, offset=0):
+    """
+    Query di una pagina: filtro, ordinamento su una colonna (più la chiave come spareggio) e LIMIT.
+
+    Args:
+        nome_tabella (str): Chiave di TABELLE_ESPLORABILI
+        filter_query (str, optional): Filtro della DataTable
+        sort_by (list, optional): sort_by della DataTable; conta solo la prima colonna
+        righe (int): Righe per pagina
+        cursore (list, optional): [valore di ordinamento, chiave] dell'ultima riga della pagina precedente
+            (valore None se era NULL)
+        offset (int): Righe da saltare quando non c'è un cursore (salto a una pagina mai vista)
+
+    Returns:
+        tuple: (query, parametri). Le colonne _ordine e _chiave servono a costruire il cursore successivo.
+    """
+    tabella = TABELLE_ESPLORABILI[nome_tabella]
+    ordine_colonna = (sort_by or [{}])[0].get("column_id")
+    ordinata = ordine_colonna not in tabella["colonne"] or tabella["colonne"][ordine_colonna]["ordinata"]
+    nullabile = ordine_colonna in tabella["colonne"] and tabella["colonne"][ordine_colonna]["nullabile"]
+    espressione = tabella["colonne"][ordine_colonna]["espressione"] if ordine_colonna in tabella["colonne"] else tabella["chiave"]
+    # Con un indice nell'ordine richiesto la pagina si ferma dopo `righe` righe lette: meglio di un
+    # filtro indicizzato seguito dall'ordinamento di tutte le righe che lo soddisfano
+    condizioni, params = traduci_filtro(nome_tabella, filter_query, indici_lookup=not ordinata)
+    discendente = bool(sort_by) and sort_by[0].get("direction") == "desc"
+    chiave = tabella["chiave"]
+
+    if cursore is not None:
+        condizione, valori = _condizione_cursore(espressione, chiave, cursore, discendente, nullabile)
+        condizioni.append(condizione)
+        params += valori
+    select = ", ".join(f"{colonna['select']} AS {nome}" for nome, colonna in tabella["colonne"].items())
+    verso = "DESC" if discendente else "ASC"
+    query = (f"SELECT {select}, {espressione} AS _ordine, {chiave} AS _chiave FROM {tabella['da']}"
+             + (f" WHERE {' AND '.join(condizioni)}" if condizioni else "")
+             + f" ORDER BY {espressione} {verso}, {chiave} {verso} LIMIT ?"
+             + (" OFFSET ?" if cursore is None and offset else ""))
+    params.append(righe)
+    if cursore is None and offset: params.append(offset)
+    return query, tuple(params)
+
+
+def _condizione_cursore(espressione, chiave, cursore, discendente, nullabile):
+    """
+    Condizione "dopo il cursore" nell'ordine (espressione, chiave). Il confronto tra coppie è NULL per
+    le righe con espressione NULL: sulle colonne nullabili vanno aggiunte a parte, dopo i valori in
+    DESC e prima in ASC, e un cursore con valore None scorre solo tra di esse per chiave.
+    """
+    valore, ultima_chiave = cursore
+    confronto = "<" if discendente else ">"
+    if valore is None:
+        condizione = f"({espressione} IS NULL AND {chiave} {confronto} ?)"
+        return (condizione if discendente else f"({condizione} OR {espressione} IS NOT NULL)"), [ultima_chiave]
+    condizione = f"({espressione}, {chiave}) {confronto} (?, ?)"
+    return (f"({condizione} OR {espressione} IS NULL)" if discendente and nullabile else condizione), [valore, ultima_chiave]
+
+
+def cursore_fine(df):
+    """Cursore dopo l'ultima riga della pagina ([None, chiave] se il valore di ordinamento è NULL), None se la pagina è vuota."""
+    if df.empty:
+        return None
+    ordine = df["_ordine"].iloc[-1]
+    if pd.isna(ordine): ordine = None
+    return [ordine.item() if hasattr(ordine, "item") else ordine, int(df["_chiave"].iloc[-1])]
@@ -0,0 +1,327 @@
+# infrastruttura/archivio.py
+"""
+Archivio a colonne (Parquet) per lo storico freddo delle misurazioni.
+
+Le misurazioni più vecchie di ARCHIVIAZIONE_DOPO_GIORNI escono da SQLite e finiscono in file
+partizionati per giorno e sorgente:
+
+    archivio/misurazioni/giorno=2025-01-01/sorgente=Serra_1/parte-<id>.parquet
+
+Ogni file contiene ts_ms, tipo e valore ordinati per (tipo, ts_ms), così anche le statistiche dei
+row group permettono di saltare blocchi. manifest.json elenca i file con righe e, per tipo, minimo
+e massimo di tempo e valore: una query su un intervallo apre solo i file che lo intersecano.
+
+leggi_misurazioni() unisce in modo trasparente i dati caldi (SQLite) e quelli freddi (Parquet).
+Lo spostamento è sicuro rispetto ai crash: il manifest registra i nuovi file e la cancellazione
+"in sospeso" prima di eliminare le righe da SQLite; finché la cancellazione non è completa la
+lettura esclude dalla parte calda le righe già archiviate, quindi nessuna riga compare due volte.
+I file scritti prima di un crash ma mai entrati nel manifest non vengono letti da nessuno (le loro
+righe sono ancora in SQLite) e la passata successiva li elimina prima di riscriverli.
+"""
+
+import importlib.util
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from config.config import ARCHIVIAZIONE_DOPO_GIORNI
+from infrastruttura.database import (connessione_lettura, execute_query, query_misurazioni, ts_ms_da_iso,
+                                     QUERY_MISURAZIONI_INTERVALLO, QUERY_ULTIMO_ID_MISURAZIONI)
+from infrastruttura.logger import log_system_message
+
+# Senza pyarrow l'archiviazione resta spenta e si legge solo da SQLite. Con pyarrow installato il modulo
+# (~150 ms di import) viene caricato solo alla prima lettura o scrittura dell'archivio, non all'avvio
+PYARROW_INSTALLATO = importlib.util.find_spec("pyarrow") is not None
+
+def _pyarrow(messaggio):
+    if not PYARROW_INSTALLATO: raise ImportError(messaggio)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+ARCHIVIO_PERCORSO = "archivio"
+RIGHE_PER_ROW_GROUP = 65_536
+RIGHE_PER_BATCH_ELIMINAZIONE = 5000
+PAUSA_TRA_BATCH_SECONDI = 0.05
+_GIORNO_MS = 86_400_000
+_EPOCA = datetime(1970, 1, 1)  # ts_ms conta dall'epoca in ora locale naive, come ts_ms_da_iso
+_COLONNE = ["timestamp", "sorgente_id", "tipo", "valore"]
+
+_QUERY_PRIMA_DA_ARCHIVIARE = "SELECT MIN(ts_ms) FROM misurazioni_compatte WHERE ts_ms < ? AND id <= ?"
+_QUERY_GIORNO_DA_ARCHIVIARE = ("SELECT s.nome AS sorgente_id, t.nome AS tipo, m.ts_ms, m.valore "
+                               "FROM misurazioni_compatte m JOIN sorgenti s ON s.id = m.sorgente_id JOIN tipi_sensore t ON t.id = m.tipo_id "
+                               "WHERE m.ts_ms >= ? AND m.ts_ms < ? AND m.id <= ?")
+_QUERY_ELIMINA_ARCHIVIATE = ("DELETE FROM misurazioni_compatte WHERE id IN "
+                             "(SELECT id FROM misurazioni_compatte WHERE ts_ms < ? AND id <= ? ORDER BY ts_ms LIMIT ?)")
+
+
+def archivio_disponibile():
+    return PYARROW_INSTALLATO
+
+
+def _percorso_manifest(percorso):
+    return os.path.join(percorso, "misurazioni", "manifest.json")
+
+
+_manifest_cache = {}
+_manifest_lock = threading.Lock()
+
+def leggi_manifest(percorso=ARCHIVIO_PERCORSO):
+    """Manifest dell'archivio (vuoto se non esiste), riletto dal disco solo quando il file cambia."""
+    file = _percorso_manifest(percorso)
+    try:
+        firma = os.stat(file).st_mtime_ns
+    except FileNotFoundError:
+        return {"file": [], "in_sospeso": None}
+    with _manifest_lock:
+        voce = _manifest_cache.get(file)
+        if voce is None or voce[0] != firma:
+            with open(file, encoding="utf-8") as f:
+                voce = _manifest_cache[file] = (firma, json.load(f))
+        return voce[1]
+
+
+def _salva_manifest(percorso, manifest):
+    file = _percorso_manifest(percorso)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(file + ".tmp", file)  # Sostituzione atomica: chi legge vede il vecchio o il nuovo, mai metà
+
+
+def file_per_intervallo(manifest, inizio_ms, fine_ms, sorgente=None, tipo=None):
+    """
+    File dell'archivio che possono contenere righe nell'intervallo, scelti con le statistiche del manifest.
+
+    Args:
+        manifest (dict): Da leggi_manifest()
+        inizio_ms (int): Inizio in epoch ms (incluso)
+        fine_ms (int): Fine in epoch ms (inclusa)
+        sorgente (str, optional): Solo file di questa sorgente
+        tipo (str, optional): Solo file con questo tipo di sensore nell'intervallo
+
+    Returns:
+        list: Voci del manifest
+    """
+    scelti = []
+    for voce in manifest["file"]:
+        if sorgente is not None and voce["sorgente"] != sorgente: continue
+        if tipo is None: statistiche = voce["tipi"].values()
+        else: statistiche = [voce["tipi"][tipo]] if tipo in voce["tipi"] else []
+        if any(ts_min <= fine_ms and ts_max >= inizio_ms for ts_min, ts_max, _, _ in statistiche):
+            scelti.append(voce)
+    return scelti
+
+
+def leggi_archivio(filtro, valore_filtro, inizio_ms, fine_ms, percorso=ARCHIVIO_PERCORSO):
+    """
+    Misurazioni archiviate nell'intervallo, nello stesso formato di QUERY_MISURAZIONI_INTERVALLO.
+
+    Args:
+        filtro (str): 'tipo' o 'sorgente_id'
+        valore_filtro (str): Tipo di sensore o sorgente
+        inizio_ms (int): Inizio in epoch ms (incluso)
+        fine_ms (int): Fine in epoch ms (inclusa)
+        percorso (str): Cartella dell'archivio
+
+    Returns:
+        pd.DataFrame: Colonne timestamp (ISO), sorgente_id, tipo, valore
+    """
+    manifest = leggi_manifest(percorso)
+    sorgente, tipo = (valore_filtro, None) if filtro == "sorgente_id" else (None, valore_filtro)
+    scelti = file_per_intervallo(manifest, inizio_ms, fine_ms, sorgente, tipo)
+    if not scelti:
+        return pd.DataFrame(columns=_COLONNE)
+    _, pq = _pyarrow("L'archivio contiene dati Parquet: per leggerli serve pyarrow (pip install pyarrow)")
+    # Filtri spinti nel lettore Parquet: i row group fuori intervallo o di altri tipi non vengono decompressi
+    filtri = [("ts_ms", ">=", inizio_ms), ("ts_ms", "<=", fine_ms)] + ([("tipo", "=", tipo)] if tipo else [])
+    parti = []
+    for voce in scelti:
+        tabella = pq.read_table(os.path.join(percorso, voce["percorso"]), columns=["ts_ms", "tipo", "valore"], filters=filtri)
+        if tabella.num_rows:
+            parti.append(tabella.to_pandas().assign(sorgente_id=voce["sorgente"]))
+    if not parti:
+        return pd.DataFrame(columns=_COLONNE)
+    df = pd.concat(parti, ignore_index=True)
+    # Stesso testo prodotto da SQL_ISO_DA_MS per le righe calde
+    df["timestamp"] = pd.to_datetime(df["ts_ms"], unit="ms").dt.strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3]
+    return df[_COLONNE]
+
+
+def blocchi_archivio(inizio_ms=None, fine_ms=None, sorgente=None, tipo=None, righe_per_blocco=RIGHE_PER_ROW_GROUP, percorso=ARCHIVIO_PERCORSO):
+    """
+    Generatore delle misurazioni archiviate per l'esportazione, un giorno alla volta in ordine di tempo:
+    in memoria c'è al più un giorno filtrato, non l'intero intervallo.
+
+    Args:
+        inizio_ms (int, optional): Inizio in epoch ms (incluso)
+        fine_ms (int, optional): Fine in epoch ms (esclusa)
+        sorgente (str, optional): Solo questa sorgente
+        tipo (str, optional): Solo questo tipo di sensore
+        righe_per_blocco (int): Righe per blocco restituito
+        percorso (str): Cartella dell'archivio
+
+    Yields:
+        list: Tuple (timestamp ISO, sorgente_id, tipo, valore)
+    """
+    manifest = leggi_manifest(percorso)
+    scelti = file_per_intervallo(manifest, float("-inf") if inizio_ms is None else inizio_ms,
+                                 float("inf") if fine_ms is None else fine_ms - 1, sorgente, tipo)
+    if not scelti:
+        return
+    _, pq = _pyarrow("L'archivio contiene dati Parquet: per esportarli serve pyarrow (pip install pyarrow)")
+    filtri = (([("ts_ms", ">=", inizio_ms)] if inizio_ms is not None else []) + ([("ts_ms", "<", fine_ms)] if fine_ms is not None else [])
+              + ([("tipo", "=", tipo)] if tipo else []))
+    giorni = {}
+    for voce in scelti: giorni.setdefault(voce["giorno"], []).append(voce)
+    for giorno in sorted(giorni):
+        parti = [pq.read_table(os.path.join(percorso, voce["percorso"]), columns=["ts_ms", "tipo", "valore"], filters=filtri or None)
+                 .to_pandas().assign(sorgente_id=voce["sorgente"]) for voce in giorni[giorno]]
+        df = pd.concat(parti, ignore_index=True).sort_values("ts_ms", kind="stable", ignore_index=True)
+        df["timestamp"] = pd.to_datetime(df["ts_ms"], unit="ms").dt.strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3]
+        righe = list(df[_COLONNE].itertuples(index=False, name=None))
+        for i in range(0, len(righe), righe_per_blocco):
+            yield righe[i:i + righe_per_blocco]
+
+
+def leggi_misurazioni(filtro, valore_filtro, inizio, fine, percorso=ARCHIVIO_PERCORSO):
+    """
+    Misurazioni grezze tra inizio e fine (inclusi) da SQLite e dall'archivio, ordinate per tempo.
+
+    Args:
+        filtro (str): 'tipo' o 'sorgente_id'
+        valore_filtro (str): Tipo di sensore o sorgente
+        inizio: Datetime o stringa ISO
+        fine: Datetime o stringa ISO
+        percorso (str): Cartella dell'archivio
+
+    Returns:
+        pd.DataFrame: Colonne timestamp, sorgente_id, tipo, valore
+    """
+    inizio_ms, fine_ms = ts_ms_da_iso(inizio), ts_ms_da_iso(fine)
+    manifest = leggi_manifest(percorso)
+    # Righe già copiate nell'archivio ma non ancora eliminate da SQLite: vanno lette da una parte sola
+    sospeso = manifest["in_sospeso"] or {"taglio_ms": 0, "max_id": 0}
+    with connessione_lettura() as conn:
+        calde = pd.read_sql_query(query_misurazioni(QUERY_MISURAZIONI_INTERVALLO, filtro), conn,
+                                  params=(valore_filtro, inizio_ms, fine_ms, sospeso["taglio_ms"], sospeso["max_id"]))
+    fredde = leggi_archivio(filtro, valore_filtro, inizio_ms, fine_ms, percorso) if manifest["file"] else None
+    if fredde is None or fredde.empty:
+        return calde
+    return pd.concat([fredde, calde], ignore_index=True).sort_values("timestamp", kind="stable", ignore_index=True)
+
+
+def _scrivi_parte(percorso, giorno, sorgente, gruppo, nome_parte):
+    relativo = os.path.join("misurazioni", f"giorno={giorno}", f"sorgente={sorgente}", f"{nome_parte}.parquet")
+    file = os.path.join(percorso, relativo)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    gruppo = gruppo.sort_values(["tipo", "ts_ms"], kind="stable")
+    pa, pq = _pyarrow("L'archiviazione in Parquet richiede pyarrow: pip install pyarrow")
+    tabella = pa.Table.from_pandas(gruppo[["ts_ms", "tipo", "valore"]], preserve_index=False).cast(
+        pa.schema([("ts_ms", pa.int64()), ("tipo", pa.string()), ("valore", pa.float64())]))
+    pq.write_table(tabella, file + ".tmp", row_group_size=RIGHE_PER_ROW_GROUP, compression="zstd", use_dictionary=["tipo"])
+    os.replace(file + ".tmp", file)
+    statistiche = gruppo.groupby("tipo").agg(ts_min=("ts_ms", "min"), ts_max=("ts_ms", "max"), v_min=("valore", "min"), v_max=("valore", "max"))
+    return {"percorso": relativo, "giorno": giorno, "sorgente": sorgente, "righe": len(gruppo),
+            "tipi": {tipo: [int(r.ts_min), int(r.ts_max), float(r.v_min), float(r.v_max)] for tipo, r in statistiche.iterrows()}}
+
+
+def elimina_parti_orfane(percorso, manifest):
+    """Elimina i file Parquet (e i .tmp) dell'archivio che il manifest non elenca. Restituisce quanti."""
+    cartella, referenziati = os.path.join(percorso, "misurazioni"), {os.path.normpath(voce["percorso"]) for voce in manifest["file"]}
+    eliminati = 0
+    for radice, _, nomi in os.walk(cartella):
+        for nome in nomi:
+            if not nome.endswith((".parquet", ".parquet.tmp")): continue
+            file = os.path.join(radice, nome)
+            if os.path.normpath(os.path.relpath(file, percorso)) in referenziati: continue
+            os.remove(file); eliminati += 1
+    return eliminati
+
+
+class Archiviatore:
+    """
+    Sposta le misurazioni più vecchie di dopo_giorni da SQLite all'archivio Parquet, un giorno
+    alla volta (solo giorni conclusi), poi le elimina da SQLite a piccoli batch come il compattatore.
+    """
+    def __init__(self, percorso=ARCHIVIO_PERCORSO, dopo_giorni=ARCHIVIAZIONE_DOPO_GIORNI, righe_per_batch=RIGHE_PER_BATCH_ELIMINAZIONE):
+        if not PYARROW_INSTALLATO: raise ImportError("L'archiviazione in Parquet richiede pyarrow: pip install pyarrow")
+        self.percorso, self.dopo_giorni, self.righe_per_batch = percorso, dopo_giorni, righe_per_batch
+
+    def esegui_passata(self, adesso=None, stop=None):
+        """
+        Archivia i giorni conclusi oltre la soglia e completa le cancellazioni rimaste in sospeso.
+
+        Args:
+            adesso (datetime, optional): Istante di riferimento (default: ora)
+            stop (threading.Event, optional): Interrompe tra un giorno e l'altro
+
+        Returns:
+            tuple: (righe archiviate, file scritti, righe eliminate da SQLite)
+        """
+        manifest = leggi_manifest(self.percorso)
+        manifest = {"file": list(manifest["file"]), "in_sospeso": manifest["in_sospeso"]}
+        eliminate = self._completa_eliminazione(manifest, stop) if manifest["in_sospeso"] else 0
+        if manifest["in_sospeso"]:
+            return 0, 0, eliminate  # Interrotta durante la cancellazione: si riprende alla prossima passata
+        # Parti scritte da una passata interrotta prima di salvare il manifest: le righe sono ancora in SQLite
+        orfane = elimina_parti_orfane(self.percorso, manifest)
+        if orfane: log_system_message(f"[DB] Archivio: eliminati {orfane} file mai registrati nel manifest")
+
+        adesso = adesso or datetime.now()
+        taglio_ms = ts_ms_da_iso((adesso - timedelta(days=self.dopo_giorni)).isoformat()) // _GIORNO_MS * _GIORNO_MS
+        with connessione_lettura() as conn:
+            max_id = conn.execute(QUERY_ULTIMO_ID_MISURAZIONI).fetchone()[0]
+            primo_ms = conn.execute(_QUERY_PRIMA_DA_ARCHIVIARE, (taglio_ms, max_id)).fetchone()[0]
+        if primo_ms is None:
+            return 0, 0, eliminate
+
+        righe = scritti = 0
+        giorno_ms = primo_ms // _GIORNO_MS * _GIORNO_MS
+        while giorno_ms < taglio_ms and not (stop and stop.is_set()):
+            with connessione_lettura() as conn:
+                df = pd.read_sql_query(_QUERY_GIORNO_DA_ARCHIVIARE, conn, params=(giorno_ms, giorno_ms + _GIORNO_MS, max_id))
+            giorno = (_EPOCA + timedelta(milliseconds=giorno_ms)).strftime("%Y-%m-%d")
+            for sorgente, gruppo in df.groupby("sorgente_id", sort=True):
+                manifest["file"].append(_scrivi_parte(self.percorso, giorno, sorgente, gruppo, f"parte-{max_id}"))
+                scritti += 1
+            righe += len(df)
+            giorno_ms += _GIORNO_MS
+        if not righe:
+            return 0, 0, eliminate
+
+        # Prima il manifest (nuovi file + cancellazione in sospeso), poi la cancellazione da SQLite
+        manifest["in_sospeso"] = {"taglio_ms": giorno_ms, "max_id": max_id}
+        _salva_manifest(self.percorso, manifest)
+        eliminate += self._completa_eliminazione(manifest, stop)
+        return righe, scritti, eliminate
+
+    def _completa_eliminazione(self, manifest, stop=None):
+        sospeso, eliminate = manifest["in_sospeso"], 0
+        while not (stop and stop.is_set()):
+            righe = execute_query(_QUERY_ELIMINA_ARCHIVIATE, (sospeso["taglio_ms"], sospeso["max_id"], self.righe_per_batch))
+            eliminate += righe
+            if righe < self.righe_per_batch:
+                manifest["in_sospeso"] = None
+                _salva_manifest(self.percorso, manifest)
+                break
+            time.sleep(PAUSA_TRA_BATCH_SECONDI)  # Lascia spazio al writer tra un batch e l'altro
+        return eliminate
+
+
+if __name__ == "__main__":
+    # Passata singola manuale e riepilogo dell'archivio
+    from infrastruttura.database import setup_database, chiudi_database
+    setup_database()
+    try:
+        righe, scritti, eliminate = Archiviatore().esegui_passata()
+        print(f"[DB] Archiviazione: {righe} righe in {scritti} file, {eliminate} righe eliminate da SQLite")
+        manifest = leggi_manifest()
+        giorni = sorted({voce["giorno"] for voce in manifest["file"]})
+        if giorni:
+            print(f"[DB] Archivio: {len(manifest['file'])} file, {sum(voce['righe'] for voce in manifest['file'])} righe, dal {giorni[0]} al {giorni[-1]}")
+    finally:
+        chiudi_database()
@@ -0,0 +1,152 @@
+# infrastruttura/compattazione.py
+
+import threading
+import time
+from datetime import datetime, timedelta
+from config.config import RETENZIONE_GIORNI, ARCHIVIAZIONE_DOPO_GIORNI
+from infrastruttura.archivio import Archiviatore, archivio_disponibile
+from infrastruttura.database import execute_query, incremental_vacuum, ts_ms_da_iso
+from infrastruttura.logger import log_system_message
+
+INTERVALLO_COMPATTAZIONE_SECONDI = 600
+RIGHE_PER_BATCH = 5000
+PAUSA_TRA_BATCH_SECONDI = 0.05
+PAGINE_VACUUM_PER_PASSO = 2000
+
+# Ogni politica cancella a blocchi di `limite` righe: (query, funzione che dalla data di taglio ricava i parametri).
+# Le righe più vecchie hanno gli id più bassi, quindi la sottoquery ordinata per id si ferma subito.
+_RISOLUZIONI = {"rollup_1m": 60, "rollup_1h": 3600, "rollup_1d": 86400}
+_QUERY_ELIMINA_MISURAZIONI = "DELETE FROM misurazioni_compatte WHERE id IN (SELECT id FROM misurazioni_compatte WHERE ts_ms < ? ORDER BY id LIMIT ?)"
+_QUERY_ELIMINA_ALLARMI = "DELETE FROM storico_allarmi WHERE id IN (SELECT id FROM storico_allarmi WHERE timestamp < ? ORDER BY id LIMIT ?)"
+_QUERY_ELIMINA_ROLLUP = """
+    DELETE FROM rollup_misurazioni WHERE (risoluzione_s, sorgente_id, bucket_ms, tipo_id) IN (
+        SELECT risoluzione_s, sorgente_id, bucket_ms, tipo_id FROM rollup_misurazioni WHERE risoluzione_s = ? AND bucket_ms < ? LIMIT ?)
+"""
+
+def _politiche(retenzione):
+    politiche = []
+    for nome, giorni in retenzione.items():
+        if giorni is None: continue
+        if nome == "misurazioni":
+            politiche.append((nome, giorni, _QUERY_ELIMINA_MISURAZIONI, lambda taglio: (ts_ms_da_iso(taglio),)))
+        elif nome == "storico_allarmi":
+            politiche.append((nome, giorni, _QUERY_ELIMINA_ALLARMI, lambda taglio: (taglio,)))
+        elif nome in _RISOLUZIONI:
+            politiche.append((nome, giorni, _QUERY_ELIMINA_ROLLUP, lambda taglio, r=_RISOLUZIONI[nome]: (r, ts_ms_da_iso(taglio))))
+        else:
+            raise ValueError(f"Politica di retention sconosciuta: '{nome}'")
+    return politiche
+
+class Compattatore:
+    """
+    Applica la retention in background: misurazioni grezze, allarmi e rollup più fini oltre la
+    loro finestra vengono cancellati a piccoli batch, ciascuno in una transazione propria, così il
+    writer dell'ingestione non resta mai bloccato a lungo su _db_lock. Dopo le cancellazioni le
+    pagine libere vengono restituite al filesystem con PRAGMA incremental_vacuum.
+    Se pyarrow è installato, prima della retention le misurazioni oltre archivia_dopo_giorni
+    passano all'archivio Parquet (infrastruttura/archivio.py).
+    """
+    def __init__(self, retenzione=RETENZIONE_GIORNI, intervallo=INTERVALLO_COMPATTAZIONE_SECONDI, righe_per_batch=RIGHE_PER_BATCH,
+                 archivia_dopo_giorni=ARCHIVIAZIONE_DOPO_GIORNI):
+        self.intervallo, self.righe_per_batch = intervallo, righe_per_batch
+        self._politiche = _politiche(retenzione)
+        self._archiviatore = None
+        if archivia_dopo_giorni is not None:
+            if archivio_disponibile(): self._archiviatore = Archiviatore(dopo_giorni=archivia_dopo_giorni, righe_per_batch=righe_per_batch)
+            else: log_system_message("[COMPATTAZIONE] pyarrow non installato: archiviazione Parquet disattivata")
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"passate": 0, "righe_eliminate": {nome: 0 for nome, *_ in self._politiche}, "byte_recuperati": 0,
+                       "righe_archiviate": 0, "file_archiviati": 0, "errori": 0, "ultima_passata": None, "ultima_durata_ms": 0.0}
+
+    def avvia(self):
+        if self._thread is not None: return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._ciclo, name="compattatore", daemon=True)
+        self._thread.start()
+
+    def ferma(self, timeout=None):
+        """Interrompe il ciclo tra un batch e l'altro e attende il thread."""
+        if self._thread is None: return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def statistiche(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["righe_eliminate"] = dict(self._stats["righe_eliminate"])
+        return stats
+
+    def _ciclo(self):
+        while not self._stop.wait(self.intervallo):
+            try:
+                self.esegui_passata()
+            except Exception as e:
+                log_system_message(f"[ERRORE] Compattazione fallita: {e}")
+                with self._stats_lock:
+                    self._stats["errori"] += 1
+
+    def esegui_passata(self, adesso=None):
+        """Una passata completa su tutte le politiche. Restituisce (righe eliminate per politica, byte recuperati)."""
+        adesso, inizio = adesso or datetime.now(), time.perf_counter()
+        eliminate = {}
+        archiviate = file_archiviati = 0
+        if self._archiviatore is not None:
+            archiviate, file_archiviati, _ = self._archiviatore.esegui_passata(adesso, self._stop)
+        for nome, giorni, query, parametri in self._politiche:
+            params = parametri((adesso - timedelta(days=giorni)).isoformat())
+            eliminate[nome] = 0
+            while not self._stop.is_set():
+                righe = execute_query(query, params + (self.righe_per_batch,))
+                eliminate[nome] += righe
+                if righe < self.righe_per_batch: break
+                time.sleep(PAUSA_TRA_BATCH_SECONDI)  # Lascia spazio al writer tra un batch e l'altro
+        recuperati = 0
+        while not self._stop.is_set():
+            byte = incremental_vacuum(PAGINE_VACUUM_PER_PASSO)
+            recuperati += byte
+            if not byte: break
+            time.sleep(PAUSA_TRA_BATCH_SECONDI)
+        with self._stats_lock:
+            self._stats["passate"] += 1
+            for nome, righe in eliminate.items(): self._stats["righe_eliminate"][nome] += righe
+            self._stats["byte_recuperati"] += recuperati
+            self._stats["righe_archiviate"] += archiviate
+            self._stats["file_archiviati"] += file_archiviati
+            self._stats["ultima_passata"] = adesso.isoformat()
+            self._stats["ultima_durata_ms"] = (time.perf_counter() - inizio) * 1000
+        if archiviate:
+            log_system_message(f"[COMPATTAZIONE] Archiviate {archiviate} misurazioni in {file_archiviati} file Parquet")
+        if any(eliminate.values()) or recuperati:
+            log_system_message(f"[COMPATTAZIONE] Eliminate {eliminate}, recuperati {recuperati / 1024:.0f} KiB")
+        return eliminate, recuperati
+
+_compattatore_attivo = None
+
+def avvia_compattazione(**kwargs):
+    global _compattatore_attivo
+    if _compattatore_attivo is None:
+        _compattatore_attivo = Compattatore(**kwargs)
+        _compattatore_attivo.avvia()
+    return _compattatore_attivo
+
+def ferma_compattazione():
+    global _compattatore_attivo
+    if _compattatore_attivo is not None:
+        _compattatore_attivo.ferma()
+        _compattatore_attivo = None
+
+def statistiche_compattazione():
+    return _compattatore_attivo.statistiche() if _compattatore_attivo else {}
+
+if __name__ == "__main__":
+    # Passata singola manuale, es. dopo un backfill lungo
+    from infrastruttura.database import setup_database, chiudi_database
+    setup_database()
+    try:
+        eliminate, recuperati = Compattatore().esegui_passata()
+        print(f"[DB] Compattazione: eliminate {eliminate}, recuperati {recuperati / 1024:.0f} KiB")
+    finally:
+        chiudi_database()
@@ -0,0 +1,95 @@
+# infrastruttura/contatori.py
+"""
+Conteggio degli stati attuali dei sensori per sottosistema (serre, pesci, pannelli), mantenuto a ogni
+scrittura di stati_attuali invece di rileggere la tabella: l'efficienza dell'impianto costa O(1).
+All'avvio i contatori vengono ricostruiti dalla tabella (database.riconcilia_contatori_stati).
+"""
+
+import threading
+import numpy as np
+from config.classificatore import CODICI_STATI, NOMI_STATI, OK, UNKNOWN
+
+SOTTOSISTEMI = ("serre", "pesci", "pannelli", "altri")
+_SOTTOSISTEMA_PER_PREFISSO = {"Serra": 0, "Pesci": 1, "Pannello": 2}
+_ALTRI = len(SOTTOSISTEMI) - 1
+EFFICIENZA_PREDEFINITA = 0.5  # Nessuno stato noto (database vuoto)
+
+def sottosistema(sorgente_id):
+    """Indice in SOTTOSISTEMI della sorgente, dal prefisso del nome (Serra_1 -> serre)."""
+    return _SOTTOSISTEMA_PER_PREFISSO.get(sorgente_id.partition("_")[0], _ALTRI)
+
+def efficienza(conteggi, sottosistemi=None):
+    """
+    Quota di sensori in stato OK.
+
+    Args:
+        conteggi (np.ndarray): Matrice [sottosistema, stato] di ContatoriStati.conteggi
+        sottosistemi (iterable, optional): Nomi dei sottosistemi da considerare (default tutti)
+
+    Returns:
+        float: Sensori OK / sensori con uno stato, EFFICIENZA_PREDEFINITA se non ce ne sono
+    """
+    if sottosistemi is not None: conteggi = conteggi[[SOTTOSISTEMI.index(nome) for nome in sottosistemi]]
+    totale = int(conteggi.sum())
+    return int(conteggi[:, OK].sum()) / totale if totale else EFFICIENZA_PREDEFINITA
+
+def riepilogo(conteggi):
+    """Conteggi come dizionario {sottosistema: {stato: numero}}, senza i sottosistemi vuoti."""
+    return {nome: dict(zip(NOMI_STATI, riga.tolist())) for nome, riga in zip(SOTTOSISTEMI, conteggi) if riga.any()}
+
+
+class ContatoriStati:
+    """
+    Numero di sensori per sottosistema e stato, con l'ultimo stato di ogni sensore per sapere quale
+    contatore decrementare. I conteggi stanno in una matrice int64 [sottosistema, stato] che può
+    essere spostata in memoria condivisa (collega) perché la dashboard la legga da un altro processo.
+    """
+    def __init__(self):
+        self._stati = {}  # (sorgente_id, tipo) -> (sottosistema, codice di stato)
+        self.conteggi = np.zeros((len(SOTTOSISTEMI), len(NOMI_STATI)), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def _aggiorna(self, sensore, codice):
+        precedente = self._stati.get(sensore)
+        if precedente is None:
+            riga = sottosistema(sensore[0])
+        else:
+            riga, vecchio = precedente
+            if vecchio == codice: return
+            self.conteggi[riga, vecchio] -= 1
+        self.conteggi[riga, codice] += 1
+        self._stati[sensore] = (riga, codice)
+
+    def aggiorna(self, sorgente_id, tipo, stato):
+        """Registra lo stato attuale di un sensore; se non è cambiato non tocca i contatori."""
+        with self._lock: self._aggiorna((sorgente_id, tipo), CODICI_STATI.get(stato, UNKNOWN))
+
+    def aggiorna_molti(self, sensori, stati):
+        """Come aggiorna per una lista di (sorgente_id, tipo) e i rispettivi stati, con un solo lock."""
+        with self._lock:
+            for sensore, stato in zip(sensori, stati): self._aggiorna(sensore, CODICI_STATI.get(stato, UNKNOWN))
+
+    def ricostruisci(self, righe):
+        """Riparte da zero con le righe (sorgente_id, tipo, stato) di stati_attuali."""
+        with self._lock:
+            self._stati.clear()
+            self.conteggi[:] = 0
+            for sorgente_id, tipo, stato in righe: self._aggiorna((sorgente_id, tipo), CODICI_STATI.get(stato, UNKNOWN))
+
+    def collega(self, conteggi):
+        """Sposta i conteggi nell'array dato (es. una vista in memoria condivisa), copiandoli."""
+        with self._lock:
+            conteggi[:] = self.conteggi
+            self.conteggi = conteggi
+
+    def scollega(self):
+        """Riporta i conteggi in memoria privata, prima che l'array collegato venga liberato."""
+        with self._lock: self.conteggi = self.conteggi.copy()
+
+    def efficienza(self, sottosistemi=None):
+        return efficienza(self.conteggi, sottosistemi)
+
+_contatori = ContatoriStati()
+
+def contatori_stati():
+    return _contatori
@@ -1,44 +1,274 @@
 # infrastruttura/database.py
 
+import re
 import sqlite3
 import threading
+import queue
+from contextlib import contextmanager
+from datetime import datetime
+from infrastruttura.migrazioni import applica_migrazioni, SQL_ISO_DA_MS, RISOLUZIONI_ROLLUP
+from infrastruttura.contatori import contatori_stati
 
 DB_PATH = "hydrofusion.db"
+DB_SYNCHRONOUS = "NORMAL"  # OFF | NORMAL | FULL. In WAL, NORMAL non esegue fsync a ogni commit ma solo ai checkpoint
+DB_READ_POOL_SIZE = 4
+DB_CACHED_STATEMENTS = 128  # Statement preparati tenuti in cache da ogni connessione
+
 _db_lock = threading.Lock()
+_writer = None
+_read_pool = queue.LifoQueue()
+_read_pool_lock = threading.Lock()
+_read_connessioni_aperte = 0
+_ids_dizionario = {"sorgenti": {}, "tipi_sensore": {}}
+_EPOCA = datetime(1970, 1, 1)
+
+# Query eseguite periodicamente dalla dashboard. Quelle sulle misurazioni lavorano sulla tabella
+# compatta (filtro e ordinamento su interi indicizzati) e vanno formattate con query_misurazioni().
+_SELECT_MISURAZIONI = (f"SELECT {SQL_ISO_DA_MS.format(colonna='m.ts_ms')} AS timestamp, s.nome AS sorgente_id, t.nome AS tipo, m.valore "
+                       "FROM misurazioni_compatte m JOIN sorgenti s ON s.id = m.sorgente_id JOIN tipi_sensore t ON t.id = m.tipo_id ")
+QUERY_MISURAZIONI_RECENTI = _SELECT_MISURAZIONI + "WHERE m.{colonna} = (SELECT id FROM {dizionario} WHERE nome = ?) ORDER BY m.ts_ms DESC LIMIT ?"
+# Coda delle misurazioni per id (chiave primaria): usata dal flusso live della dashboard
+QUERY_MISURAZIONI_DOPO_ID = "SELECT m.id, " + _SELECT_MISURAZIONI[len("SELECT "):] + "WHERE m.id > ? ORDER BY m.id LIMIT ?"
+QUERY_ULTIMO_ID_MISURAZIONI = "SELECT COALESCE(MAX(id), 0) FROM misurazioni_compatte"
+# Gli ultimi due parametri escludono le righe già copiate nell'archivio Parquet e non ancora eliminate (ts_ms < taglio e id <= max_id)
+QUERY_MISURAZIONI_INTERVALLO = (_SELECT_MISURAZIONI + "WHERE m.{colonna} = (SELECT id FROM {dizionario} WHERE nome = ?) AND m.ts_ms BETWEEN ? AND ? "
+                                "AND NOT (m.ts_ms < ? AND m.id <= ?) ORDER BY m.ts_ms ASC")
+QUERY_ROLLUP_INTERVALLO = (f"SELECT {SQL_ISO_DA_MS.format(colonna='r.bucket_ms')} AS timestamp, s.nome AS sorgente_id, t.nome AS tipo, "
+                           "r.somma / r.conteggio AS valore, r.minimo, r.massimo, r.conteggio "
+                           "FROM rollup_misurazioni r JOIN sorgenti s ON s.id = r.sorgente_id JOIN tipi_sensore t ON t.id = r.tipo_id "
+                           "WHERE r.risoluzione_s = ? AND r.{colonna} = (SELECT id FROM {dizionario} WHERE nome = ?) AND r.bucket_ms BETWEEN ? AND ? "
+                           "ORDER BY r.bucket_ms")
+FILTRI_MISURAZIONI = {"tipo": {"colonna": "tipo_id", "dizionario": "tipi_sensore"}, "sorgente_id": {"colonna": "sorgente_id", "dizionario": "sorgenti"}}
+QUERY_STATI_ATTUALI = "SELECT sorgente_id, tipo, stato FROM stati_attuali"
+QUERY_ALLARMI_RECENTI = "SELECT timestamp, sorgente_id, tipo, evento, stato, azioni FROM storico_allarmi ORDER BY timestamp DESC LIMIT ?"
+QUERY_ULTIMO_ALLARME = "SELECT id, sorgente_id, tipo, stato, evento FROM storico_allarmi WHERE id > ? ORDER BY id DESC LIMIT 1"
+QUERY_ALLARMI_APERTI = "SELECT sorgente_id, tipo, stato, azioni, aperto_il FROM allarmi_aperti"
+QUERY_PRODUZIONE_RECENTE = "SELECT timestamp, biomassa_pesci_kg, raccolto_pronto_kg FROM dati_produzione ORDER BY timestamp DESC LIMIT ?"
+QUERY_FINANZIARI_RECENTI = "SELECT timestamp, ricavi, costi, profitto_cumulativo FROM dati_finanziari ORDER BY timestamp DESC LIMIT ?"
+QUERY_VERSIONI_DATI = "SELECT tabella, versione FROM versioni_dati"
+
+def query_misurazioni(query, filtro):
+    """Adatta una QUERY_MISURAZIONI_* al filtro scelto ('tipo' o 'sorgente_id'); altri valori sollevano KeyError."""
+    return query.format(**FILTRI_MISURAZIONI[filtro])
+
+def ts_ms_da_iso(timestamp):
+    """Timestamp ISO naive -> epoch millisecondi, come salvati in misurazioni_compatte.ts_ms."""
+    return round((datetime.fromisoformat(str(timestamp)) - _EPOCA).total_seconds() * 1000)
 
 def get_db_connection():
     return sqlite3.connect(DB_PATH, timeout=10)
 
+def _apri_connessione(sola_lettura=False):
+    conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+    conn.execute("PRAGMA busy_timeout = 10000")
+    if sola_lettura:
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    return conn
+
+def _get_writer():
+    """Restituisce la connessione di scrittura condivisa. Va usata solo tenendo _db_lock."""
+    global _writer
+    if _writer is None:
+        _writer = _apri_connessione()
+    return _writer
+
+@contextmanager
+def connessione_lettura():
+    """
+    Presta una connessione in sola lettura dal pool condiviso (usato dalle pagine della dashboard).
+    In WAL i lettori non bloccano il writer e non vengono bloccati da lui.
+    """
+    global _read_connessioni_aperte
+    try:
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        with _read_pool_lock:
+            crea_nuova = _read_connessioni_aperte < DB_READ_POOL_SIZE
+            if crea_nuova: _read_connessioni_aperte += 1
+        if crea_nuova:
+            try: conn = _apri_connessione(sola_lettura=True)
+            except Exception:
+                with _read_pool_lock: _read_connessioni_aperte -= 1
+                raise
+        else:
+            conn = _read_pool.get()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction: conn.rollback()
+        _read_pool.put(conn)
+
+def chiudi_database():
+    """Chiude writer e pool di lettura; le connessioni vengono riaperte al primo utilizzo successivo."""
+    global _writer, _read_connessioni_aperte
+    with _db_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        for ids in _ids_dizionario.values(): ids.clear()
+    with _read_pool_lock:
+        while True:
+            try: _read_pool.get_nowait().close()
+            except queue.Empty: break
+        _read_connessioni_aperte = 0
+
 def setup_database():
     with _db_lock:
-        conn = get_db_connection()
+        versione = applica_migrazioni(_get_writer())
+        print(f"[DB] Database impostato correttamente (schema versione {versione}).")
+    riconcilia_contatori_stati()
+
+def riconcilia_contatori_stati():
+    """Ricostruisce i contatori degli stati per sottosistema da stati_attuali (all'avvio, o se si sospetta una deriva)."""
+    with connessione_lettura() as conn:
+        contatori_stati().ricostruisci(conn.execute(QUERY_STATI_ATTUALI))
+
+# La vista misurazioni scrive (via trigger) sulla tabella compatta
+_ALIAS_TABELLE = {"misurazioni": "misurazioni_compatte"}
+_TABELLE_SCRITTE = {}
+_RE_TABELLA_SCRITTA = re.compile(r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)", re.IGNORECASE)
+
+def tabella_scritta(query):
+    """Nome della tabella modificata da un'istruzione INSERT/UPDATE/DELETE (None se non riconosciuta)."""
+    if query not in _TABELLE_SCRITTE:
+        trovata = _RE_TABELLA_SCRITTA.match(query)
+        tabella = trovata.group(1).lower() if trovata else None
+        _TABELLE_SCRITTE[query] = _ALIAS_TABELLE.get(tabella, tabella)
+    return _TABELLE_SCRITTE[query]
+
+def _incrementa_versioni(conn, tabelle):
+    conn.executemany(QUERY_INCREMENTA_VERSIONE, [(tabella,) for tabella in tabelle if tabella])
+
+def execute_query(query, params=()):
+    """Esegue una singola istruzione di scrittura e la conferma. Restituisce il numero di righe modificate."""
+    with _db_lock:
+        conn = _get_writer()
         try:
-            cursor = conn.cursor()
-            cursor.execute("CREATE TABLE IF NOT EXISTS misurazioni (id INTEGER PRIMARY KEY, sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, valore REAL NOT NULL, timestamp TEXT NOT NULL)")
-            cursor.execute("CREATE TABLE IF NOT EXISTS stati_attuali (sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, stato TEXT NOT NULL, timestamp TEXT NOT NULL, PRIMARY KEY (sorgente_id, tipo))")
-            cursor.execute("CREATE TABLE IF NOT EXISTS storico_allarmi (id INTEGER PRIMARY KEY, sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, stato TEXT NOT NULL, azioni TEXT, timestamp TEXT NOT NULL)")
-            cursor.execute("CREATE TABLE IF NOT EXISTS dati_finanziari (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, ricavi REAL NOT NULL, costi REAL NOT NULL, profitto_parziale REAL NOT NULL, profitto_cumulativo REAL NOT NULL, descrizione TEXT)")
-            cursor.execute("CREATE TABLE IF NOT EXISTS dati_produzione (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, biomassa_pesci_kg REAL, raccolto_pronto_kg REAL, descrizione TEXT)")
+            righe = conn.execute(query, params).rowcount
+            if righe: _incrementa_versioni(conn, [tabella_scritta(query)])
             conn.commit()
-            print("[DB] Database impostato correttamente.")
-        finally:
-            conn.close()
+            return righe
+        except Exception:
+            conn.rollback()
+            raise
 
-def execute_query(query, params=()):
+def incremental_vacuum(pagine=None):
+    """Restituisce al filesystem fino a `pagine` pagine libere (tutte se None). Restituisce i byte recuperati."""
     with _db_lock:
-        conn = get_db_connection()
+        conn = _get_writer()
+        dimensione_pagina = conn.execute("PRAGMA page_size").fetchone()[0]
+        prima = conn.execute("PRAGMA page_count").fetchone()[0]
+        # executescript esegue la PRAGMA fino in fondo: con execute() verrebbe liberata una sola pagina
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pagine) if pagine else 0});")
+        dopo = conn.execute("PRAGMA page_count").fetchone()[0]
+        return (prima - dopo) * dimensione_pagina
+
+def esegui_batch(gruppi):
+    """
+    Esegue piu' executemany in un'unica transazione (un solo commit per tutto il batch).
+    gruppi: iterabile di coppie (query, lista_di_parametri) o terne (query, lista_di_parametri, rollup).
+    Le misurazioni inserite aggiornano nella stessa transazione i rollup a 1 min / 1 h / 1 giorno:
+    `rollup` sono le righe già pre-aggregate con righe_rollup (es. negli shard), se None li calcola qui.
+    Ogni tabella toccata incrementa il suo contatore in versioni_dati.
+    """
+    with _db_lock:
+        conn = _get_writer()
         try:
-            conn.execute(query, params)
+            tabelle = set()
+            for query, lista_params, *rollup in gruppi:
+                conn.executemany(query, lista_params)
+                tabelle.add(tabella_scritta(query))
+                if query == QUERY_INSERT_MISURAZIONE:
+                    rollup = rollup[0] if rollup and rollup[0] is not None else righe_rollup(lista_params)
+                    conn.executemany(QUERY_UPSERT_ROLLUP, rollup)
+                    tabelle.add("rollup_misurazioni")
+            _incrementa_versioni(conn, tabelle)
             conn.commit()
-        finally:
-            conn.close()
+        except Exception:
+            conn.rollback()
+            raise
+
+QUERY_INSERT_MISURAZIONE = "INSERT INTO misurazioni_compatte (sorgente_id, tipo_id, valore, ts_ms) VALUES (?, ?, ?, ?)"
+QUERY_AGGIORNA_STATO = "INSERT OR REPLACE INTO stati_attuali (sorgente_id, tipo, stato, timestamp) VALUES (?, ?, ?, ?)"
+# storico_allarmi registra solo le transizioni; allarmi_aperti ha una riga per sensore con allarme in corso
+QUERY_INSERT_ALLARME = "INSERT INTO storico_allarmi (sorgente_id, tipo, evento, stato, azioni, timestamp) VALUES (?, ?, ?, ?, ?, ?)"
+QUERY_APRI_ALLARME = ("INSERT INTO allarmi_aperti (sorgente_id, tipo, stato, azioni, aperto_il) VALUES (?, ?, ?, ?, ?) "
+                      "ON CONFLICT (sorgente_id, tipo) DO UPDATE SET stato = excluded.stato, azioni = excluded.azioni")
+QUERY_CHIUDI_ALLARME = "DELETE FROM allarmi_aperti WHERE sorgente_id = ? AND tipo = ?"
+APERTURA, AGGIORNAMENTO, CHIUSURA = "APERTURA", "AGGIORNAMENTO", "CHIUSURA"
+QUERY_INCREMENTA_VERSIONE = "INSERT INTO versioni_dati (tabella, versione) VALUES (?, 1) ON CONFLICT (tabella) DO UPDATE SET versione = versione + 1"
+QUERY_UPSERT_ROLLUP = ("INSERT INTO rollup_misurazioni (risoluzione_s, sorgente_id, tipo_id, bucket_ms, minimo, massimo, somma, conteggio, ultimo, ultimo_ts_ms) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (risoluzione_s, sorgente_id, tipo_id, bucket_ms) DO UPDATE SET "
+                       "minimo = min(minimo, excluded.minimo), massimo = max(massimo, excluded.massimo), "
+                       "somma = somma + excluded.somma, conteggio = conteggio + excluded.conteggio, "
+                       "ultimo = CASE WHEN excluded.ultimo_ts_ms >= ultimo_ts_ms THEN excluded.ultimo ELSE ultimo END, "
+                       "ultimo_ts_ms = max(ultimo_ts_ms, excluded.ultimo_ts_ms)")
+
+def righe_rollup(righe):
+    """Pre-aggrega in memoria righe compatte (sorgente_id, tipo_id, valore, ts_ms): un upsert per bucket invece che per riga."""
+    aggregati = {}
+    for sorgente_id, tipo_id, valore, ts_ms in righe:
+        for risoluzione_s in RISOLUZIONI_ROLLUP:
+            chiave = (risoluzione_s, sorgente_id, tipo_id, ts_ms - ts_ms % (risoluzione_s * 1000))
+            a = aggregati.get(chiave)
+            if a is None:
+                aggregati[chiave] = [valore, valore, valore, 1, valore, ts_ms]
+            else:
+                if valore < a[0]: a[0] = valore
+                if valore > a[1]: a[1] = valore
+                a[2] += valore; a[3] += 1
+                if ts_ms >= a[5]: a[4], a[5] = valore, ts_ms
+    return [(*chiave, *a) for chiave, a in aggregati.items()]
+
+def _id_dizionario(tabella, nome):
+    ids = _ids_dizionario[tabella]
+    id_ = ids.get(nome)
+    if id_ is None:
+        # Nome mai visto (succede una volta per sorgente/tipo): lo registra subito con un commit a parte
+        with _db_lock:
+            conn = _get_writer()
+            conn.execute(f"INSERT OR IGNORE INTO {tabella} (nome) VALUES (?)", (nome,))
+            conn.commit()
+            id_ = ids[nome] = conn.execute(f"SELECT id FROM {tabella} WHERE nome = ?", (nome,)).fetchone()[0]
+    return id_
+
+def riga_misurazione(sorgente_id, tipo, valore, timestamp):
+    """Parametri per QUERY_INSERT_MISURAZIONE a partire dai valori leggibili. Da non chiamare tenendo _db_lock."""
+    return (_id_dizionario("sorgenti", sorgente_id), _id_dizionario("tipi_sensore", tipo), valore, ts_ms_da_iso(timestamp))
+
+def ids_sensori(sensori):
+    """Coppie (id sorgente, id tipo) per una lista di (sorgente_id, tipo), registrando i nomi mai visti."""
+    return [(_id_dizionario("sorgenti", sorgente_id), _id_dizionario("tipi_sensore", tipo)) for sorgente_id, tipo in sensori]
+
+def righe_misurazioni(sensori, valori, timestamp):
+    """Come riga_misurazione per molte letture con lo stesso timestamp; sensori è una lista di (sorgente_id, tipo)."""
+    ts_ms = ts_ms_da_iso(timestamp)
+    return [(_id_dizionario("sorgenti", sorgente_id), _id_dizionario("tipi_sensore", tipo), valore, ts_ms) for (sorgente_id, tipo), valore in zip(sensori, valori)]
 
 def insert_misurazione(sorgente_id, tipo, valore, timestamp):
-    execute_query("INSERT INTO misurazioni (sorgente_id, tipo, valore, timestamp) VALUES (?, ?, ?, ?)", (sorgente_id, tipo, valore, timestamp))
+    esegui_batch([(QUERY_INSERT_MISURAZIONE, [riga_misurazione(sorgente_id, tipo, valore, timestamp)])])
 
 def aggiorna_stato_attuale(sorgente_id, tipo, stato, timestamp):
-    execute_query("INSERT OR REPLACE INTO stati_attuali (sorgente_id, tipo, stato, timestamp) VALUES (?, ?, ?, ?)", (sorgente_id, tipo, stato, timestamp))
+    contatori_stati().aggiorna(sorgente_id, tipo, stato)
+    execute_query(QUERY_AGGIORNA_STATO, (sorgente_id, tipo, stato, timestamp))
+
+def gruppi_transizioni_allarmi(transizioni):
+    """
+    Istruzioni per registrare transizioni (sorgente_id, tipo, evento, stato, azioni_json, timestamp):
+    una riga di storico per ciascuna, più l'apertura/aggiornamento o la chiusura in allarmi_aperti.
+    Aperture e chiusure restano nell'ordine delle transizioni (un allarme può chiudersi e riaprirsi nello stesso blocco).
+    """
+    if not transizioni: return []
+    gruppi = [(QUERY_INSERT_ALLARME, list(transizioni))]
+    for s, t, evento, stato, azioni, ts in transizioni:
+        query, riga = (QUERY_CHIUDI_ALLARME, (s, t)) if evento == CHIUSURA else (QUERY_APRI_ALLARME, (s, t, stato, azioni, ts))
+        if gruppi[-1][0] == query: gruppi[-1][1].append(riga)
+        else: gruppi.append((query, [riga]))
+    return gruppi
 
-def insert_allarme(sorgente_id, tipo, stato, azioni_json, timestamp):
-    if stato in ["WARNING", "CRITICAL"]:
-        execute_query("INSERT INTO storico_allarmi (sorgente_id, tipo, stato, azioni, timestamp) VALUES (?, ?, ?, ?, ?)", (sorgente_id, tipo, stato, azioni_json, timestamp))
\ No newline at end of file
+def registra_transizioni_allarmi(transizioni):
+    gruppi = gruppi_transizioni_allarmi(transizioni)
+    if gruppi: esegui_batch(gruppi)
\ No newline at end of file
@@ -0,0 +1,298 @@
+# infrastruttura/export.py
+"""
+Esportazione in streaming di tabelle e intervalli di misurazioni in CSV o Parquet.
+
+Le righe arrivano dal cursore SQLite a blocchi (fetchmany) e vengono scritte man mano, quindi
+la memoria resta costante qualunque sia il numero di righe. Ogni RIGHE_PER_TRANSAZIONE righe la
+lettura riparte dall'ultima chiave vista con una query nuova: lo snapshot di lettura non resta
+aperto per tutta l'esportazione e il writer può continuare a fare checkpoint del WAL.
+
+Le misurazioni più vecchie possono trovarsi nell'archivio Parquet (infrastruttura/archivio.py):
+l'esportazione scorre prima i file del manifest che intersecano l'intervallo, poi le righe di SQLite
+escluse quelle già archiviate e non ancora eliminate, quindi ogni riga compare una sola volta.
+
+Uso da riga di comando:
+    python -m infrastruttura.export --table misurazioni --from 2025-01-01 --to 2025-02-01 --format parquet -o gennaio.parquet
+"""
+
+import argparse
+import csv
+import importlib.util
+import io
+import sys
+import time
+from infrastruttura.archivio import ARCHIVIO_PERCORSO, blocchi_archivio, leggi_manifest
+from infrastruttura.database import connessione_lettura, ts_ms_da_iso
+from infrastruttura.migrazioni import SQL_ISO_DA_MS
+
+# Parquet è opzionale: il CSV non ha dipendenze. pyarrow (~150 ms di import) si carica solo alla prima esportazione Parquet
+PYARROW_INSTALLATO = importlib.util.find_spec("pyarrow") is not None
+_MESSAGGIO_PYARROW = "L'esportazione in Parquet richiede pyarrow: pip install pyarrow"
+
+def _pyarrow():
+    if not PYARROW_INSTALLATO: raise ImportError(_MESSAGGIO_PYARROW)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+RIGHE_PER_BLOCCO = 50_000
+RIGHE_PER_TRANSAZIONE = 1_000_000
+FORMATI = ("csv", "parquet")
+
+# Per ogni tabella: colonne esportate con il loro tipo, FROM, espressioni di filtro e chiave di
+# ordinamento. Le misurazioni scorrono sull'indice (ts_ms, id) in ordine di tempo, le altre per id.
+TABELLE_EXPORT = {
+    "misurazioni": {
+        "colonne": [("timestamp", "timestamp"), ("sorgente_id", "string"), ("tipo", "string"), ("valore", "float64")],
+        "select": f"{SQL_ISO_DA_MS.format(colonna='m.ts_ms')}, s.nome, t.nome, m.valore",
+        "da": "misurazioni_compatte m JOIN sorgenti s ON s.id = m.sorgente_id JOIN tipi_sensore t ON t.id = m.tipo_id",
+        "chiave": ("m.ts_ms", "m.id"),
+        "tempo": "m.ts_ms",
+        "sorgente": "m.sorgente_id = (SELECT id FROM sorgenti WHERE nome = ?)",
+        "tipo": "m.tipo_id = (SELECT id FROM tipi_sensore WHERE nome = ?)",
+        # Righe copiate nell'archivio ma non ancora eliminate da SQLite (taglio_ms, max_id di "in_sospeso")
+        "archiviate": "NOT (m.ts_ms < ? AND m.id <= ?)",
+    },
+    "stati_attuali": {
+        "colonne": [("sorgente_id", "string"), ("tipo", "string"), ("stato", "string"), ("timestamp", "timestamp")],
+        "select": "sorgente_id, tipo, stato, timestamp",
+        "da": "stati_attuali",
+        "chiave": ("rowid",),
+        "tempo": "timestamp",
+        "sorgente": "sorgente_id = ?",
+        "tipo": "tipo = ?",
+    },
+    "storico_allarmi": {
+        "colonne": [("id", "int64"), ("timestamp", "timestamp"), ("sorgente_id", "string"), ("tipo", "string"), ("evento", "string"), ("stato", "string"), ("azioni", "string")],
+        "select": "id, timestamp, sorgente_id, tipo, evento, stato, azioni",
+        "da": "storico_allarmi",
+        "chiave": ("id",),
+        "tempo": "timestamp",
+        "sorgente": "sorgente_id = ?",
+        "tipo": "tipo = ?",
+    },
+    "dati_produzione": {
+        "colonne": [("id", "int64"), ("timestamp", "timestamp"), ("biomassa_pesci_kg", "float64"), ("raccolto_pronto_kg", "float64"), ("descrizione", "string")],
+        "select": "id, timestamp, biomassa_pesci_kg, raccolto_pronto_kg, descrizione",
+        "da": "dati_produzione",
+        "chiave": ("id",),
+        "tempo": "timestamp",
+    },
+    "dati_finanziari": {
+        "colonne": [("id", "int64"), ("timestamp", "timestamp"), ("ricavi", "float64"), ("costi", "float64"),
+                    ("profitto_parziale", "float64"), ("profitto_cumulativo", "float64"), ("descrizione", "string")],
+        "select": "id, timestamp, ricavi, costi, profitto_parziale, profitto_cumulativo, descrizione",
+        "da": "dati_finanziari",
+        "chiave": ("id",),
+        "tempo": "timestamp",
+    },
+}
+
+
+def _query_export(tabella, inizio=None, fine=None, sorgente=None, tipo=None, in_sospeso=None):
+    """Query con filtri e la condizione sulla chiave, più i parametri dei filtri (in_sospeso: dal manifest dell'archivio)."""
+    if tabella not in TABELLE_EXPORT:
+        raise ValueError(f"Tabella non esportabile: '{tabella}' (disponibili: {', '.join(TABELLE_EXPORT)})")
+    definizione = TABELLE_EXPORT[tabella]
+    condizioni, params = [], []
+    # Estremi: inizio incluso, fine esclusa. Le misurazioni confrontano i millisecondi, le altre tabelle il testo ISO
+    converti = ts_ms_da_iso if definizione["tempo"].endswith("ts_ms") else (lambda valore: valore)
+    if inizio: condizioni.append(f"{definizione['tempo']} >= ?"); params.append(converti(inizio))
+    if fine: condizioni.append(f"{definizione['tempo']} < ?"); params.append(converti(fine))
+    for filtro, valore in (("sorgente", sorgente), ("tipo", tipo)):
+        if valore is None: continue
+        if filtro not in definizione: raise ValueError(f"La tabella '{tabella}' non ha il filtro per {filtro}")
+        condizioni.append(definizione[filtro]); params.append(valore)
+    if "archiviate" in definizione:
+        sospeso = in_sospeso or {"taglio_ms": 0, "max_id": 0}
+        condizioni.append(definizione["archiviate"]); params += [sospeso["taglio_ms"], sospeso["max_id"]]
+    chiave = definizione["chiave"]
+    dopo_chiave = f"({', '.join(chiave)}) > ({', '.join('?' * len(chiave))})"
+    query = (f"SELECT {definizione['select']}, {', '.join(chiave)} FROM {definizione['da']} WHERE "
+             + " AND ".join(condizioni + [dopo_chiave])
+             + f" ORDER BY {', '.join(chiave)} LIMIT ?")
+    return query, params
+
+
+def blocchi_export(tabella, inizio=None, fine=None, sorgente=None, tipo=None, righe_per_blocco=RIGHE_PER_BLOCCO, archivio=ARCHIVIO_PERCORSO):
+    """
+    Generatore delle righe da esportare, a blocchi di al più righe_per_blocco tuple. Per le misurazioni
+    vengono prima quelle dell'archivio Parquet, poi quelle di SQLite.
+
+    Args:
+        tabella (str): Chiave di TABELLE_EXPORT
+        inizio (str, optional): Timestamp ISO di inizio (incluso)
+        fine (str, optional): Timestamp ISO di fine (esclusa)
+        sorgente (str, optional): Solo questa sorgente
+        tipo (str, optional): Solo questo tipo di sensore
+        righe_per_blocco (int): Righe lette con ogni fetchmany
+        archivio (str): Cartella dell'archivio Parquet delle misurazioni
+
+    Yields:
+        list: Tuple con i valori delle colonne di TABELLE_EXPORT[tabella]["colonne"]
+
+    Raises:
+        ImportError: L'intervallo tocca file dell'archivio ma pyarrow non è installato
+    """
+    in_sospeso = None
+    if tabella == "misurazioni":
+        # Manifest letto una volta sola: le righe calde escludono le stesse già archiviate dei file letti
+        manifest = leggi_manifest(archivio)
+        in_sospeso = manifest["in_sospeso"]
+        if manifest["file"]:
+            yield from blocchi_archivio(inizio and ts_ms_da_iso(inizio), fine and ts_ms_da_iso(fine), sorgente, tipo, righe_per_blocco, archivio)
+    query, params = _query_export(tabella, inizio, fine, sorgente, tipo, in_sospeso)
+    colonne_chiave = len(TABELLE_EXPORT[tabella]["chiave"])
+    colonne = len(TABELLE_EXPORT[tabella]["colonne"])
+    ultima_chiave = (float("-inf"),) * colonne_chiave
+    while True:
+        lette = 0
+        with connessione_lettura() as conn:
+            cursore = conn.execute(query, (*params, *ultima_chiave, RIGHE_PER_TRANSAZIONE))
+            try:
+                while True:
+                    righe = cursore.fetchmany(righe_per_blocco)
+                    if not righe: break
+                    lette += len(righe)
+                    ultima_chiave = righe[-1][colonne:]
+                    yield [riga[:colonne] for riga in righe]
+            finally:
+                cursore.close()  # Chiude lo statement anche se chi consuma si ferma a metà
+        if lette < RIGHE_PER_TRANSAZIONE: return
+
+
+def scrivi_csv(blocchi, tabella, destinazione):
+    """Scrive i blocchi come CSV con intestazione su un file di testo già aperto. Restituisce le righe scritte."""
+    writer = csv.writer(destinazione)
+    writer.writerow([nome for nome, _ in TABELLE_EXPORT[tabella]["colonne"]])
+    righe = 0
+    for blocco in blocchi:
+        writer.writerows(blocco)
+        righe += len(blocco)
+    return righe
+
+
+def _schema_parquet(tabella):
+    pa, _ = _pyarrow()
+    tipi = {"timestamp": pa.timestamp("us"), "string": pa.string(), "float64": pa.float64(), "int64": pa.int64()}
+    return pa.schema([(nome, tipi[tipo]) for nome, tipo in TABELLE_EXPORT[tabella]["colonne"]])
+
+
+def _tabella_arrow(blocco, schema):
+    # Un blocco diventa un row group: le colonne sono costruite direttamente dalle tuple trasposte
+    pa, _ = _pyarrow()
+    colonne = []
+    for campo, valori in zip(schema, zip(*blocco)):
+        if pa.types.is_timestamp(campo.type):
+            colonne.append(pa.array(valori, type=pa.string()).cast(campo.type))  # Testo ISO -> timestamp
+        else:
+            colonne.append(pa.array(valori, type=campo.type))
+    return pa.Table.from_arrays(colonne, schema=schema)
+
+
+def scrivi_parquet(blocchi, tabella, destinazione):
+    """
+    Scrive i blocchi in Parquet, un row group per blocco. Richiede pyarrow.
+
+    Args:
+        blocchi: Generatore restituito da blocchi_export
+        tabella (str): Chiave di TABELLE_EXPORT (per lo schema)
+        destinazione: Percorso o file binario aperto
+
+    Returns:
+        int: Righe scritte
+    """
+    _, pq = _pyarrow()
+    schema = _schema_parquet(tabella)
+    righe = 0
+    with pq.ParquetWriter(destinazione, schema, compression="zstd") as writer:
+        for blocco in blocchi:
+            writer.write_table(_tabella_arrow(blocco, schema))
+            righe += len(blocco)
+    return righe
+
+
+class _CodaByte(io.RawIOBase):
+    """File binario di sola scrittura i cui byte vengono ritirati a pezzi da chi fa lo streaming HTTP."""
+    def __init__(self):
+        self._pezzi, self._posizione = [], 0
+    def writable(self): return True
+    def write(self, dati):
+        self._pezzi.append(bytes(dati)); self._posizione += len(dati)
+        return len(dati)
+    def tell(self): return self._posizione
+    def ritira(self):
+        dati, self._pezzi = b"".join(self._pezzi), []
+        return dati
+
+
+def flusso_export(tabella, formato="csv", **filtri):
+    """
+    Generatore di byte del file esportato, per una risposta HTTP in streaming.
+
+    Args:
+        tabella (str): Chiave di TABELLE_EXPORT
+        formato (str): 'csv' o 'parquet'
+        **filtri: inizio, fine, sorgente, tipo come in blocchi_export
+
+    Yields:
+        bytes: Pezzi consecutivi del file
+    """
+    if formato not in FORMATI: raise ValueError(f"Formato non valido: '{formato}' (usa {' o '.join(FORMATI)})")
+    if formato == "parquet" and not PYARROW_INSTALLATO: raise ImportError(_MESSAGGIO_PYARROW)
+    _query_export(tabella, **filtri)  # Errori di parametri prima di iniziare la risposta
+    blocchi = blocchi_export(tabella, **filtri)
+    if formato == "csv":
+        testo = io.StringIO()
+        writer = csv.writer(testo)
+        writer.writerow([nome for nome, _ in TABELLE_EXPORT[tabella]["colonne"]])
+        for blocco in blocchi:
+            writer.writerows(blocco)
+            yield testo.getvalue().encode("utf-8")
+            testo.seek(0); testo.truncate()
+        yield testo.getvalue().encode("utf-8")
+        return
+    _, pq = _pyarrow()
+    coda = _CodaByte()
+    schema = _schema_parquet(tabella)
+    with pq.ParquetWriter(coda, schema, compression="zstd") as writer:
+        for blocco in blocchi:
+            writer.write_table(_tabella_arrow(blocco, schema))
+            yield coda.ritira()
+    yield coda.ritira()  # Footer scritto alla chiusura
+
+
+def esporta(tabella, formato, destinazione, **filtri):
+    """Esporta su file (percorso) o su stdout ('-', solo CSV). Restituisce le righe scritte."""
+    blocchi = blocchi_export(tabella, **filtri)
+    if formato == "parquet":
+        if destinazione == "-": raise ValueError("Il Parquet va scritto su file: usa --output")
+        return scrivi_parquet(blocchi, tabella, destinazione)
+    if destinazione == "-":
+        return scrivi_csv(blocchi, tabella, sys.stdout)
+    with open(destinazione, "w", newline="", encoding="utf-8") as file:
+        return scrivi_csv(blocchi, tabella, file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Esportazione dati HydroFusion in CSV o Parquet")
+    parser.add_argument("--table", choices=list(TABELLE_EXPORT), default="misurazioni", help="Tabella da esportare")
+    parser.add_argument("--from", dest="inizio", help="Timestamp ISO di inizio, incluso (es. 2025-01-01 o 2025-01-01T12:00)")
+    parser.add_argument("--to", dest="fine", help="Timestamp ISO di fine, esclusa")
+    parser.add_argument("--source", dest="sorgente", help="Solo questa sorgente (es. Serra_1)")
+    parser.add_argument("--type", dest="tipo", help="Solo questo tipo di sensore (es. pH)")
+    parser.add_argument("--format", choices=FORMATI, default="csv")
+    parser.add_argument("-o", "--output", default="-", help="File di destinazione ('-' = stdout, solo CSV)")
+    args = parser.parse_args(argv)
+
+    inizio_esportazione = time.perf_counter()
+    try:
+        righe = esporta(args.table, args.format, args.output, inizio=args.inizio, fine=args.fine, sorgente=args.sorgente, tipo=args.tipo)
+    except (ValueError, ImportError) as e:
+        parser.error(str(e))
+    durata = time.perf_counter() - inizio_esportazione
+    print(f"[DB] Esportate {righe} righe di {args.table} in {durata:.1f} s ({righe / max(durata, 1e-9):,.0f} righe/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# infrastruttura/ingestione.py
+
+import queue
+import threading
+import time
+from infrastruttura.database import (execute_query, esegui_batch, insert_misurazione, riga_misurazione, aggiorna_stato_attuale,
+                                     registra_transizioni_allarmi, gruppi_transizioni_allarmi, QUERY_INSERT_MISURAZIONE, QUERY_AGGIORNA_STATO)
+from infrastruttura.contatori import contatori_stati
+from infrastruttura.logger import log_system_message
+
+DIMENSIONE_MASSIMA_CODA = 20000
+SOGLIA_RIGHE_FLUSH = 500
+INTERVALLO_FLUSH_SECONDI = 0.2
+
+_STOP = object()
+
+class CodaIngestione:
+    """
+    Coda limitata in memoria svuotata da un unico thread writer.
+    Le righe vengono scritte con executemany in una sola transazione quando si raggiungono
+    soglia_righe oppure intervallo_flush secondi dal primo elemento in attesa.
+    Ogni elemento della coda è un blocco (query, lista di parametri, rollup): accoda() mette una riga,
+    accoda_blocco() molte righe insieme (caricamenti massivi), con i rollup pre-aggregati se chi accoda
+    misurazioni li ha già calcolati: righe e rollup finiscono nella stessa transazione. La capacità si misura in blocchi.
+    Quando la coda è piena i produttori si bloccano: rallentano invece di perdere dati (backpressure).
+    """
+    def __init__(self, dimensione_massima=DIMENSIONE_MASSIMA_CODA, soglia_righe=SOGLIA_RIGHE_FLUSH, intervallo_flush=INTERVALLO_FLUSH_SECONDI):
+        self.soglia_righe, self.intervallo_flush = soglia_righe, intervallo_flush
+        self._coda = queue.Queue(maxsize=dimensione_massima)
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"righe_accodate": 0, "righe_scritte": 0, "righe_perse": 0, "batch_scritti": 0, "errori": 0,
+                       "attese_coda_piena": 0, "secondi_attesa_coda_piena": 0.0, "profondita_massima": 0,
+                       "ultimo_batch_righe": 0, "ultimo_flush_ms": 0.0}
+
+    def avvia(self):
+        if self._thread is not None: return
+        self._thread = threading.Thread(target=self._ciclo_writer, name="ingestione-writer", daemon=True)
+        self._thread.start()
+
+    def ferma(self, timeout=None):
+        """Svuota la coda, scrive le righe rimaste e termina il thread writer."""
+        if self._thread is None: return
+        self._coda.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def accoda(self, query, params):
+        self.accoda_blocco(query, [params])
+
+    def accoda_blocco(self, query, lista_params, rollup=None):
+        if not lista_params: return
+        try:
+            self._coda.put_nowait((query, lista_params, rollup))
+        except queue.Full:
+            inizio = time.perf_counter()
+            self._coda.put((query, lista_params, rollup))
+            with self._stats_lock:
+                self._stats["attese_coda_piena"] += 1
+                self._stats["secondi_attesa_coda_piena"] += time.perf_counter() - inizio
+        with self._stats_lock:
+            self._stats["righe_accodate"] += len(lista_params)
+            self._stats["profondita_massima"] = max(self._stats["profondita_massima"], self._coda.qsize())
+
+    def statistiche(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["profondita_attuale"] = self._coda.qsize()
+        stats["capacita"] = self._coda.maxsize
+        return stats
+
+    def _ciclo_writer(self):
+        in_esecuzione = True
+        while in_esecuzione:
+            elemento = self._coda.get()
+            if elemento is _STOP: break
+            batch, righe, scadenza = [elemento], len(elemento[1]), time.monotonic() + self.intervallo_flush
+            while righe < self.soglia_righe:
+                attesa = scadenza - time.monotonic()
+                try:
+                    elemento = self._coda.get(timeout=attesa) if attesa > 0 else self._coda.get_nowait()
+                except queue.Empty:
+                    break
+                if elemento is _STOP:
+                    in_esecuzione = False; break
+                batch.append(elemento); righe += len(elemento[1])
+            self._flush(batch)
+        # Flush finale: tutto cio' che e' stato accodato prima dello stop viene scritto
+        rimanenti = []
+        while True:
+            try: elemento = self._coda.get_nowait()
+            except queue.Empty: break
+            if elemento is not _STOP: rimanenti.append(elemento)
+        if rimanenti: self._flush(rimanenti)
+
+    def _flush(self, batch):
+        # Unisce solo blocchi consecutivi con la stessa query: l'ordine di arrivo tra query diverse resta
+        # quello dei produttori (es. apertura, chiusura e riapertura dello stesso allarme). I rollup
+        # pre-aggregati si concatenano: l'upsert somma i parziali dello stesso bucket
+        gruppi = []
+        for query, lista_params, rollup in batch:
+            ultimo = gruppi[-1] if gruppi else None
+            if ultimo and ultimo[0] == query and (ultimo[2] is None) == (rollup is None):
+                ultimo[1].extend(lista_params)
+                if rollup is not None: ultimo[2].extend(rollup)
+            else: gruppi.append((query, list(lista_params), None if rollup is None else list(rollup)))
+        righe = sum(len(lista_params) for _, lista_params, _ in gruppi)
+        inizio = time.perf_counter()
+        try:
+            esegui_batch(gruppi)
+        except Exception as e:
+            log_system_message(f"[ERRORE] Flush ingestione fallito ({righe} righe): {e}")
+            with self._stats_lock:
+                self._stats["errori"] += 1
+                self._stats["righe_perse"] += righe
+            return
+        with self._stats_lock:
+            self._stats["righe_scritte"] += righe
+            self._stats["batch_scritti"] += 1
+            self._stats["ultimo_batch_righe"] = righe
+            self._stats["ultimo_flush_ms"] = (time.perf_counter() - inizio) * 1000
+
+_coda_attiva = None
+
+def avvia_ingestione(**kwargs):
+    global _coda_attiva
+    if _coda_attiva is None:
+        _coda_attiva = CodaIngestione(**kwargs)
+        _coda_attiva.avvia()
+    return _coda_attiva
+
+def ferma_ingestione():
+    global _coda_attiva
+    if _coda_attiva is not None:
+        _coda_attiva.ferma()
+        log_system_message(f"[INGESTIONE] Coda svuotata: {_coda_attiva.statistiche()}")
+        _coda_attiva = None
+
+def statistiche_ingestione():
+    return _coda_attiva.statistiche() if _coda_attiva else {}
+
+# Se la coda non e' attiva (es. script o test) si ripiega sulla scrittura sincrona
+def accoda_query(query, params=()):
+    if _coda_attiva: _coda_attiva.accoda(query, params)
+    else: execute_query(query, params)
+
+def accoda_blocco(query, lista_params, rollup=None):
+    """Molte righe di `query`; per QUERY_INSERT_MISURAZIONE `rollup` sono quelli già pre-aggregati con righe_rollup."""
+    if _coda_attiva: _coda_attiva.accoda_blocco(query, lista_params, rollup)
+    elif lista_params: esegui_batch([(query, lista_params, rollup)])
+
+def accoda_misurazione(sorgente_id, tipo, valore, timestamp):
+    if _coda_attiva: _coda_attiva.accoda(QUERY_INSERT_MISURAZIONE, riga_misurazione(sorgente_id, tipo, valore, timestamp))
+    else: insert_misurazione(sorgente_id, tipo, valore, timestamp)
+
+def accoda_stato_attuale(sorgente_id, tipo, stato, timestamp):
+    if _coda_attiva:
+        contatori_stati().aggiorna(sorgente_id, tipo, stato)  # Subito, senza aspettare che la coda scriva la riga
+        _coda_attiva.accoda(QUERY_AGGIORNA_STATO, (sorgente_id, tipo, stato, timestamp))
+    else: aggiorna_stato_attuale(sorgente_id, tipo, stato, timestamp)
+
+def accoda_transizioni_allarmi(transizioni):
+    if not _coda_attiva: return registra_transizioni_allarmi(transizioni)
+    for query, righe in gruppi_transizioni_allarmi(transizioni): _coda_attiva.accoda_blocco(query, righe)
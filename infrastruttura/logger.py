@@ -1,42 +1,164 @@
 # infrastruttura/logger.py
+"""
+Log del simulatore. Chi chiama log_misurazione / log_system_message mette solo il record in una coda
+limitata (senza formattare); un QueueListener in background formatta e scrive su console ed eventualmente
+su un file JSON Lines. Con la coda piena una riga per lettura viene persa e contata, senza attendere; un
+messaggio di sistema attende un posto per poco e, se non si libera, viene scritto subito dal chiamante.
+Le righe per lettura sono campionate e limitate al secondo già nel chiamante (CampionatoreMisurazioni),
+così quelle scartate non costano nemmeno la creazione del record.
+"""
 
+import atexit
+import json
 import logging
-import threading
+import queue
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from config.config import LOG_CAMPIONAMENTO_MISURAZIONI, LOG_MISURAZIONI_AL_SECONDO, LOG_FILE_JSONL
 
-_header_lock = threading.Lock()
-_header_printed = False
+DIMENSIONE_CODA_LOG = 10000
+ATTESA_CODA_PIENA_SECONDI = 0.2  # Solo per i messaggi di sistema, che non vanno mai persi
+
+_listener = None
+_coda_handler = None
+_campionatore = None
+
+def _is_misurazione(record):
+    return isinstance(record.msg, dict) and "sorgente_id" in record.msg
+
+def _timestamp(record):
+    # Il timestamp della lettura se il chiamante l'ha passato, altrimenti l'ora del record
+    timestamp = record.msg.get("timestamp")
+    return timestamp[:19].replace("T", " ") if timestamp else datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+
+def intestazione():
+    header = f"| {'Timestamp':<19} | {'Sorgente ID':<15} | {'Tipo Sensore':<15} | {'Valore':<10} | {'Stato':<10} |"
+    separator = "-" * len(header)
+    return f"{separator}\n{header}\n{separator}"
 
 class TabularFormatter(logging.Formatter):
+    """Righe di tabella per le letture (precedute una volta dall'intestazione), [SYSTEM] per il resto."""
+    def __init__(self):
+        super().__init__()
+        self._intestazione_stampata = False  # Usato solo dal thread di scrittura: nessun lock
+
     def format(self, record):
         log_data = record.msg
-        if isinstance(log_data, dict) and "sorgente_id" in log_data:
+        if _is_misurazione(record):
             valore_str = f"{log_data.get('valore', 0.0):.2f}"
             stato_str = log_data.get('stato', 'N/D')
-            return f"| {log_data.get('timestamp', ''):<19} | {log_data.get('sorgente_id', ''):<15} | {log_data.get('tipo', ''):<15} | {valore_str:<10} | {stato_str:<10} |"
+            riga = f"| {_timestamp(record):<19} | {log_data.get('sorgente_id', ''):<15} | {log_data.get('tipo', ''):<15} | {valore_str:<10} | {stato_str:<10} |"
+            if self._intestazione_stampata: return riga
+            self._intestazione_stampata = True
+            return f"{intestazione()}\n{riga}"
         else:
             return f"[SYSTEM] {log_data}"
 
-def print_header():
-    header = f"| {'Timestamp':<19} | {'Sorgente ID':<15} | {'Tipo Sensore':<15} | {'Valore':<10} | {'Stato':<10} |"
-    separator = "-" * len(header)
-    print(separator); print(header); print(separator)
+class FormatterJSONL(logging.Formatter):
+    """Una riga JSON compatta per record: i campi della lettura, oppure timestamp e messaggio."""
+    def format(self, record):
+        if _is_misurazione(record):
+            riga = {**record.msg, "timestamp": record.msg.get("timestamp") or datetime.fromtimestamp(record.created).isoformat()}
+        else:
+            riga = {"timestamp": datetime.fromtimestamp(record.created).isoformat(), "messaggio": str(record.msg)}
+        return json.dumps(riga, ensure_ascii=False, separators=(",", ":"))
 
-def setup_logging():
+class CampionatoreMisurazioni:
+    """
+    Ammette una riga per lettura ogni `campionamento` e al più `al_secondo` righe al secondo
+    (None = nessun limite). La prima lettura di ogni sensore e ogni cambio di stato passano sempre.
+    Senza lock: con più thread i conteggi possono sbagliare di qualche riga, il limite resta indicativo.
+    """
+    def __init__(self, campionamento=1, al_secondo=None):
+        self.campionamento, self.al_secondo = max(1, campionamento), al_secondo
+        self._ultimo_stato, self._lette, self._secondo, self._nel_secondo = {}, 0, None, 0
+        self.scartate = 0
+
+    def ammetti(self, sorgente_id, tipo, stato):
+        sensore = (sorgente_id, tipo)
+        if self._ultimo_stato.get(sensore) != stato:
+            self._ultimo_stato[sensore] = stato
+            return True
+        self._lette += 1
+        if self._lette % self.campionamento:
+            self.scartate += 1; return False
+        if self.al_secondo is not None:
+            secondo = int(time.monotonic())
+            if secondo != self._secondo: self._secondo, self._nel_secondo = secondo, 0
+            if self._nel_secondo >= self.al_secondo:
+                self.scartate += 1; return False
+            self._nel_secondo += 1
+        return True
+
+class CodaLogNonBloccante(QueueHandler):
+    """
+    QueueHandler che non formatta nel thread chiamante. Con la coda piena le righe per lettura vanno perse;
+    i messaggi di sistema attendono al più ATTESA_CODA_PIENA_SECONDI, poi passano direttamente ai `gestori`.
+    """
+    def __init__(self, coda, gestori=()):
+        super().__init__(coda)
+        self.gestori = gestori
+        self.perse = self.sincrone = 0
+
+    def prepare(self, record):
+        return record  # La formattazione avviene nel thread di scrittura
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if _is_misurazione(record):
+                self.perse += 1; return
+        try:
+            self.queue.put(record, timeout=ATTESA_CODA_PIENA_SECONDI)
+        except queue.Full:
+            # Scritto fuori ordine rispetto alle righe ancora in coda, ma non perso (i gestori hanno il loro lock)
+            self.sincrone += 1
+            for gestore in self.gestori:
+                if record.levelno >= gestore.level: gestore.handle(record)
+
+def setup_logging(campionamento=LOG_CAMPIONAMENTO_MISURAZIONI, al_secondo=LOG_MISURAZIONI_AL_SECONDO, file_jsonl=LOG_FILE_JSONL):
+    global _listener, _coda_handler, _campionatore
+    ferma_logging()
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
     if logger.hasHandlers(): logger.handlers.clear()
-    handler = logging.StreamHandler()
-    handler.setFormatter(TabularFormatter())
-    logger.addHandler(handler)
-
-def log_misurazione(sorgente_id, tipo, valore, stato):
-    global _header_printed
-    with _header_lock:
-        if not _header_printed:
-            print_header()
-            _header_printed = True
-    logging.info({"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "sorgente_id": sorgente_id, "tipo": tipo, "valore": valore, "stato": stato})
+    console = logging.StreamHandler()
+    console.setFormatter(TabularFormatter())
+    _campionatore = CampionatoreMisurazioni(campionamento, al_secondo)
+    gestori = [console]
+    if file_jsonl:
+        jsonl = logging.FileHandler(file_jsonl, encoding="utf-8")
+        jsonl.setFormatter(FormatterJSONL())
+        gestori.append(jsonl)
+    coda = queue.Queue(DIMENSIONE_CODA_LOG)
+    _coda_handler = CodaLogNonBloccante(coda, gestori)
+    logger.addHandler(_coda_handler)
+    _listener = QueueListener(coda, *gestori, respect_handler_level=True)
+    _listener.start()
+
+def ferma_logging():
+    """Svuota la coda e ferma il thread di scrittura; i messaggi successivi vengono scritti in modo sincrono."""
+    global _listener, _coda_handler
+    if _listener is None: return
+    _listener.stop()
+    logger = logging.getLogger()
+    logger.removeHandler(_coda_handler)
+    for gestore in _listener.handlers: logger.addHandler(gestore)
+    _listener = _coda_handler = None
+
+atexit.register(ferma_logging)
+
+def statistiche_log():
+    if _coda_handler is None: return {}
+    return {"in_coda": _coda_handler.queue.qsize(), "perse_coda_piena": _coda_handler.perse, "scritte_sincrone": _coda_handler.sincrone, "scartate": _campionatore.scartate}
+
+def log_misurazione(sorgente_id, tipo, valore, stato, timestamp=None):
+    """Riga di tabella per una lettura; `timestamp` è quello ISO della lettura (default: l'ora di scrittura)."""
+    if _campionatore is not None and not _campionatore.ammetti(sorgente_id, tipo, stato): return
+    logging.info({"timestamp": timestamp, "sorgente_id": sorgente_id, "tipo": tipo, "valore": valore, "stato": stato})
 
 def log_system_message(message):
-    logging.info(message)
\ No newline at end of file
+    logging.info(message)
@@ -0,0 +1,137 @@
+# infrastruttura/migrazioni.py
+
+# Lo schema è versionato con PRAGMA user_version: ogni migrazione porta il database dalla
+# versione N-1 alla N in un'unica transazione. Per modificare lo schema si aggiunge una
+# nuova voce in fondo a MIGRAZIONI, senza mai modificare quelle già rilasciate.
+
+# Timestamp in epoch millisecondi dell'ora locale "così com'è" (senza fuso), per coerenza
+# con i timestamp ISO naive scritti dal simulatore.
+SQL_ISO_DA_MS = "strftime('%Y-%m-%dT%H:%M:%f', {colonna} / 1000.0, 'unixepoch')"
+SQL_MS_DA_ISO = "CAST(ROUND((julianday({colonna}) - 2440587.5) * 86400000) AS INTEGER)"
+
+_SCHEMA_INIZIALE = [
+    "CREATE TABLE IF NOT EXISTS misurazioni (id INTEGER PRIMARY KEY, sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, valore REAL NOT NULL, timestamp TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS stati_attuali (sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, stato TEXT NOT NULL, timestamp TEXT NOT NULL, PRIMARY KEY (sorgente_id, tipo))",
+    "CREATE TABLE IF NOT EXISTS storico_allarmi (id INTEGER PRIMARY KEY, sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, stato TEXT NOT NULL, azioni TEXT, timestamp TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS dati_finanziari (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, ricavi REAL NOT NULL, costi REAL NOT NULL, profitto_parziale REAL NOT NULL, profitto_cumulativo REAL NOT NULL, descrizione TEXT)",
+    "CREATE TABLE IF NOT EXISTS dati_produzione (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, biomassa_pesci_kg REAL, raccolto_pronto_kg REAL, descrizione TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_misurazioni_tipo_ts ON misurazioni (tipo, timestamp, sorgente_id, valore)",
+    "CREATE INDEX IF NOT EXISTS idx_misurazioni_sorgente_ts ON misurazioni (sorgente_id, timestamp, tipo, valore)",
+    "CREATE INDEX IF NOT EXISTS idx_allarmi_ts ON storico_allarmi (timestamp, sorgente_id, tipo, stato, azioni)",
+    "CREATE INDEX IF NOT EXISTS idx_finanziari_ts ON dati_finanziari (timestamp, ricavi, costi, profitto_cumulativo)",
+    "CREATE INDEX IF NOT EXISTS idx_produzione_ts ON dati_produzione (timestamp, biomassa_pesci_kg, raccolto_pronto_kg)",
+]
+
+# Le misurazioni passano a righe compatte: sorgente e tipo diventano interi che puntano a
+# tabelle dizionario, il timestamp un intero in millisecondi. La vista `misurazioni`
+# (con trigger INSTEAD OF INSERT) mantiene funzionanti le query e gli insert esistenti.
+_MISURAZIONI_COMPATTE = [
+    "CREATE TABLE sorgenti (id INTEGER PRIMARY KEY, nome TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE tipi_sensore (id INTEGER PRIMARY KEY, nome TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE misurazioni_compatte (id INTEGER PRIMARY KEY, sorgente_id INTEGER NOT NULL REFERENCES sorgenti (id), tipo_id INTEGER NOT NULL REFERENCES tipi_sensore (id), valore REAL NOT NULL, ts_ms INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO sorgenti (nome) SELECT DISTINCT sorgente_id FROM misurazioni",
+    "INSERT OR IGNORE INTO tipi_sensore (nome) SELECT DISTINCT tipo FROM misurazioni",
+    "INSERT INTO misurazioni_compatte (id, sorgente_id, tipo_id, valore, ts_ms) "
+    f"SELECT m.id, s.id, t.id, m.valore, {SQL_MS_DA_ISO.format(colonna='m.timestamp')} "
+    "FROM misurazioni m JOIN sorgenti s ON s.nome = m.sorgente_id JOIN tipi_sensore t ON t.nome = m.tipo",
+    "DROP TABLE misurazioni",
+    "CREATE INDEX idx_misurazioni_compatte_tipo_ts ON misurazioni_compatte (tipo_id, ts_ms, sorgente_id, valore)",
+    "CREATE INDEX idx_misurazioni_compatte_sorgente_ts ON misurazioni_compatte (sorgente_id, ts_ms, tipo_id, valore)",
+    "CREATE VIEW misurazioni AS "
+    f"SELECT m.id, s.nome AS sorgente_id, t.nome AS tipo, m.valore, {SQL_ISO_DA_MS.format(colonna='m.ts_ms')} AS timestamp "
+    "FROM misurazioni_compatte m JOIN sorgenti s ON s.id = m.sorgente_id JOIN tipi_sensore t ON t.id = m.tipo_id",
+    "CREATE TRIGGER misurazioni_insert INSTEAD OF INSERT ON misurazioni BEGIN "
+    "INSERT OR IGNORE INTO sorgenti (nome) VALUES (NEW.sorgente_id); "
+    "INSERT OR IGNORE INTO tipi_sensore (nome) VALUES (NEW.tipo); "
+    "INSERT INTO misurazioni_compatte (sorgente_id, tipo_id, valore, ts_ms) VALUES ("
+    "(SELECT id FROM sorgenti WHERE nome = NEW.sorgente_id), (SELECT id FROM tipi_sensore WHERE nome = NEW.tipo), "
+    f"NEW.valore, {SQL_MS_DA_ISO.format(colonna='NEW.timestamp')}); END",
+]
+
+# Rollup incrementali per (risoluzione, sorgente, tipo, bucket): min/max/somma/conteggio/ultimo.
+# Le righe esistenti vengono aggregate qui; quelle nuove dal writer (database.righe_rollup).
+RISOLUZIONI_ROLLUP = (60, 3600, 86400)
+
+def _rollup_storico(risoluzione_s):
+    bucket = f"m.ts_ms - (m.ts_ms % {risoluzione_s * 1000})"
+    return (f"INSERT INTO rollup_misurazioni (risoluzione_s, sorgente_id, tipo_id, bucket_ms, minimo, massimo, somma, conteggio, ultimo_ts_ms) "
+            f"SELECT {risoluzione_s}, m.sorgente_id, m.tipo_id, {bucket}, min(m.valore), max(m.valore), sum(m.valore), count(*), max(m.ts_ms) "
+            f"FROM misurazioni_compatte m GROUP BY m.sorgente_id, m.tipo_id, {bucket}")
+
+_ROLLUP = [
+    "CREATE TABLE rollup_misurazioni (risoluzione_s INTEGER NOT NULL, sorgente_id INTEGER NOT NULL, tipo_id INTEGER NOT NULL, bucket_ms INTEGER NOT NULL, "
+    "minimo REAL NOT NULL, massimo REAL NOT NULL, somma REAL NOT NULL, conteggio INTEGER NOT NULL, ultimo REAL, ultimo_ts_ms INTEGER NOT NULL, "
+    "PRIMARY KEY (risoluzione_s, sorgente_id, bucket_ms, tipo_id)) WITHOUT ROWID",
+    "CREATE INDEX idx_rollup_tipo ON rollup_misurazioni (risoluzione_s, tipo_id, bucket_ms)",
+    *[_rollup_storico(risoluzione_s) for risoluzione_s in RISOLUZIONI_ROLLUP],
+    "UPDATE rollup_misurazioni SET ultimo = (SELECT m.valore FROM misurazioni_compatte m WHERE m.sorgente_id = rollup_misurazioni.sorgente_id "
+    "AND m.ts_ms = rollup_misurazioni.ultimo_ts_ms AND m.tipo_id = rollup_misurazioni.tipo_id LIMIT 1)",
+]
+
+# auto_vacuum incrementale: il compattatore restituisce al filesystem le pagine liberate dalle
+# cancellazioni. Su un database esistente il cambio ha effetto solo dopo un VACUUM completo,
+# che non può girare dentro una transazione.
+_AUTO_VACUUM_INCREMENTALE = [
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "VACUUM",
+]
+
+# Un contatore per tabella, incrementato dal writer nella stessa transazione di ogni scrittura:
+# chi legge (la cache della dashboard, anche da un altro processo) sa se i suoi risultati sono ancora validi.
+_VERSIONI_DATI = [
+    "CREATE TABLE versioni_dati (tabella TEXT PRIMARY KEY, versione INTEGER NOT NULL) WITHOUT ROWID",
+]
+
+# Ordinamento per tempo nella pagina Esplora Dati senza filtri: (ts_ms, id) in ordine di indice,
+# così ogni pagina con paginazione a chiave legge solo le sue righe
+_INDICE_TEMPO_MISURAZIONI = [
+    "CREATE INDEX idx_misurazioni_compatte_ts ON misurazioni_compatte (ts_ms)",
+]
+
+# Allarmi per transizioni: lo storico registra aperture, cambi di livello e chiusure (colonna evento;
+# le righe esistenti erano tutte aperture), allarmi_aperti dice cosa è attivo adesso senza leggere lo storico.
+# Gli allarmi aperti iniziali sono i sensori fuori soglia secondo stati_attuali.
+_ALLARMI_PER_TRANSIZIONI = [
+    "ALTER TABLE storico_allarmi ADD COLUMN evento TEXT NOT NULL DEFAULT 'APERTURA'",
+    "CREATE TABLE allarmi_aperti (sorgente_id TEXT NOT NULL, tipo TEXT NOT NULL, stato TEXT NOT NULL, azioni TEXT, aperto_il TEXT NOT NULL, "
+    "PRIMARY KEY (sorgente_id, tipo)) WITHOUT ROWID",
+    "INSERT INTO allarmi_aperti (sorgente_id, tipo, stato, azioni, aperto_il) "
+    "SELECT sorgente_id, tipo, stato, '[]', timestamp FROM stati_attuali WHERE stato IN ('WARNING', 'CRITICAL')",
+]
+# (versione, descrizione, istruzioni, transazionale)
+MIGRAZIONI = [
+    (1, "Schema iniziale con indici per la dashboard", _SCHEMA_INIZIALE, True),
+    (2, "Misurazioni compatte con dizionari e timestamp in millisecondi", _MISURAZIONI_COMPATTE, True),
+    (3, "Rollup incrementali a 1 minuto, 1 ora e 1 giorno", _ROLLUP, True),
+    (4, "auto_vacuum incrementale per la compattazione", _AUTO_VACUUM_INCREMENTALE, False),
+    (5, "Contatori di versione per tabella", _VERSIONI_DATI, True),
+    (6, "Indice per tempo sulle misurazioni compatte", _INDICE_TEMPO_MISURAZIONI, True),
+    (7, "Allarmi registrati per transizioni e tabella degli allarmi aperti", _ALLARMI_PER_TRANSIZIONI, True),
+]
+
+def versione_schema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def applica_migrazioni(conn, migrazioni=MIGRAZIONI):
+    """Applica in ordine le migrazioni con versione maggiore di quella del database. Restituisce la versione finale."""
+    versione = versione_schema(conn)
+    for numero, descrizione, istruzioni, transazionale in migrazioni:
+        if numero <= versione: continue
+        if not transazionale:
+            # Istruzioni come VACUUM: eseguite una alla volta, la versione è registrata solo alla fine
+            for istruzione in istruzioni:
+                conn.execute(istruzione)
+            conn.execute(f"PRAGMA user_version = {numero}")
+        else:
+            try:
+                conn.execute("BEGIN")
+                for istruzione in istruzioni:
+                    conn.execute(istruzione)
+                conn.execute(f"PRAGMA user_version = {numero}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        print(f"[DB] Migrazione {numero} applicata: {descrizione}")
+        versione = numero
+    return versione
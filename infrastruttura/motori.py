@@ -0,0 +1,455 @@
+# infrastruttura/motori.py
+"""
+Motori di archiviazione intercambiabili per misurazioni, stati e allarmi.
+
+Simulatore e dashboard scrivono e leggono attraverso un MotoreDati invece di chiamare
+direttamente le funzioni di database.py:
+
+- MotoreSQLite: il database di sempre, scritto tramite la coda di ingestione. È il motore durevole.
+- MotoreMemoria: per ogni sensore un ring buffer NumPy con le ultime N letture. Il simulatore lo
+  crea in memoria condivisa (multiprocessing.shared_memory) e la dashboard, che gira in un altro
+  processo, lo legge senza lock: ogni sensore ha un solo scrittore e il lettore convalida la copia
+  rileggendo il contatore delle scritture (come un seqlock).
+- MotoreCombinato: scrive su tutti i motori e legge dal primo che sa rispondere, così le viste live
+  arrivano dalla memoria e il resto (o la memoria assente) da SQLite.
+- MotoreCanale: negli shard del simulatore spedisce le scritture a blocchi, su una pipe, al processo
+  che possiede il database.
+
+I metodi di lettura restituiscono None quando il motore non può rispondere, anche quando avrebbe
+solo una parte della risposta (es. sensori rimasti fuori da un ring buffer pieno).
+"""
+
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pandas as pd
+from config.classificatore import classifica_stati, azioni_correttive_to_json, CODICI_STATI, NOMI_STATI, OK
+from infrastruttura.database import (connessione_lettura, query_misurazioni, righe_misurazioni, righe_rollup, ts_ms_da_iso, APERTURA, CHIUSURA,
+                                     QUERY_INSERT_MISURAZIONE, QUERY_MISURAZIONI_RECENTI, QUERY_STATI_ATTUALI, QUERY_ALLARMI_APERTI)
+from infrastruttura.contatori import ContatoriStati, SOTTOSISTEMI, contatori_stati
+from infrastruttura.ingestione import accoda_misurazione, accoda_stato_attuale, accoda_transizioni_allarmi, accoda_blocco
+from infrastruttura.logger import log_system_message
+
+NOME_MEMORIA_CONDIVISA = "hydrofusion_live"
+SENSORI_MASSIMI = 256
+LETTURE_PER_SENSORE = 2048
+MAX_SILENZIO_SECONDI = 30  # Oltre questo tempo senza scritture la memoria è considerata abbandonata
+INTERVALLO_RICOLLEGAMENTO_SECONDI = 5
+LUNGHEZZA_NOME = 64
+RIGHE_PER_INVIO = 20000
+
+_VERSIONE_LAYOUT = 3
+# Celle della testata (int64). _ESCLUSI: sensori che non hanno trovato uno slot libero (solo su SQLite)
+_VERSIONE, _SENSORI_MASSIMI, _CAPACITA, _SENSORI, _BATTITO_MS, _CHIUSO, _ESCLUSI = range(7)
+_CELLE_TESTATA = 8
+_COLONNE_MISURAZIONI = ["timestamp", "sorgente_id", "tipo", "valore"]
+_COLONNE_ALLARMI_APERTI = ["sorgente_id", "tipo", "stato", "azioni", "aperto_il"]
+_COLONNA_NOMI = {"sorgente_id": 0, "tipo": 1}
+
+
+def _leggi_sql(query, params=(), **kwargs):
+    with connessione_lettura() as conn:
+        return pd.read_sql_query(query, conn, params=params, **kwargs)
+
+
+class MotoreDati:
+    """Interfaccia comune dei motori. Le scritture non supportate vengono ignorate, le letture restituiscono None."""
+    durevole = False
+
+    def scrivi_misurazione(self, sorgente_id, tipo, valore, timestamp): pass
+    def scrivi_misurazioni(self, sensori, valori, timestamp): pass
+    def scrivi_stato(self, sorgente_id, tipo, stato, timestamp): pass
+    def scrivi_transizioni_allarmi(self, transizioni):
+        """Transizioni (sorgente_id, tipo, evento, stato, azioni_json, timestamp) prodotte da simulazione.allarmi."""
+
+    def ultime_misurazioni(self, filtro, valore, limite):
+        """Ultime `limite` misurazioni per tipo o sorgente (colonne timestamp, sorgente_id, tipo, valore), dalla più recente."""
+        return None
+
+    def stati_attuali(self):
+        """Dizionario {(sorgente_id, tipo): stato} dell'ultima lettura di ogni sensore."""
+        return None
+
+    def allarmi_aperti(self):
+        """Allarmi in corso come DataFrame (sorgente_id, tipo, stato, azioni, aperto_il)."""
+        return None
+
+    def contatori_stati(self):
+        """Numero di sensori per sottosistema e stato, come matrice int64 [SOTTOSISTEMI, NOMI_STATI] (vedi infrastruttura.contatori)."""
+        return None
+
+    def interroga(self, query, params=(), **kwargs):
+        """Query SQL libera sulle tabelle storiche, come DataFrame."""
+        return None
+
+    def chiudi(self): pass
+
+
+class MotoreSQLite(MotoreDati):
+    """
+    Il database SQLite: scritture accodate all'ingestione (o sincrone se la coda non è attiva).
+
+    Args:
+        interroga (callable, optional): Funzione (query, params, **kwargs) -> DataFrame usata per le
+            letture; la dashboard passa query_in_cache. Di default una connessione del pool di lettura.
+    """
+    durevole = True
+
+    def __init__(self, interroga=None):
+        self._interroga = interroga or _leggi_sql
+
+    def scrivi_misurazione(self, sorgente_id, tipo, valore, timestamp): accoda_misurazione(sorgente_id, tipo, valore, timestamp)
+    def scrivi_misurazioni(self, sensori, valori, timestamp): accoda_blocco(QUERY_INSERT_MISURAZIONE, righe_misurazioni(sensori, valori, timestamp))
+    def scrivi_stato(self, sorgente_id, tipo, stato, timestamp): accoda_stato_attuale(sorgente_id, tipo, stato, timestamp)
+    def scrivi_transizioni_allarmi(self, transizioni): accoda_transizioni_allarmi(transizioni)
+
+    def ultime_misurazioni(self, filtro, valore, limite):
+        return self._interroga(query_misurazioni(QUERY_MISURAZIONI_RECENTI, filtro), (valore, limite))
+
+    def stati_attuali(self):
+        return self._interroga(QUERY_STATI_ATTUALI, index_col=['sorgente_id', 'tipo'])['stato'].to_dict()
+
+    def allarmi_aperti(self):
+        return self._interroga(QUERY_ALLARMI_APERTI)
+
+    def contatori_stati(self):
+        contatori = ContatoriStati()
+        contatori.ricostruisci(self._interroga(QUERY_STATI_ATTUALI).itertuples(index=False))
+        return contatori.conteggi
+
+    def interroga(self, query, params=(), **kwargs):
+        return self._interroga(query, params, **kwargs)
+
+
+class MotoreMemoria(MotoreDati):
+    """
+    Ring buffer per sensore delle ultime letture (ts_ms, valore), in un unico blocco di memoria.
+
+    Layout: testata int64, contatori degli stati per sottosistema, nomi (sorgente, tipo) per slot, contatore delle scritture per slot, allarme
+    aperto per slot (livello, apertura in ms) e le due matrici [slot, lettura]. La lettura k di uno slot sta in posizione k % capacità; il contatore
+    è incrementato dopo aver scritto i dati, quindi un lettore che lo legge prima (c1) e dopo (c2)
+    la copia sa che sono valide le letture in [max(c1, c2 + 1) - capacità, c1): le altre
+    potrebbero essere state sovrascritte mentre copiava.
+
+    Usare i costruttori crea() (processo che scrive) e in_lettura() (altri processi).
+    """
+
+    def __init__(self, nome, scrittura, sensori_massimi=SENSORI_MASSIMI, capacita=LETTURE_PER_SENSORE):
+        self.nome, self.scrittura = nome, scrittura
+        self._shm, self._viste, self._slot, self._nomi = None, None, {}, []
+        self._lock_registrazione, self._lock_collegamento = threading.Lock(), threading.Lock()
+        self._ultimo_tentativo, self._pieno_segnalato = 0.0, False
+        self._contatori_pubblicati = None
+        if scrittura: self._crea(sensori_massimi, capacita)
+
+    @classmethod
+    def crea(cls, nome=NOME_MEMORIA_CONDIVISA, sensori_massimi=SENSORI_MASSIMI, capacita=LETTURE_PER_SENSORE):
+        """Ring buffer scrivibile; con nome=None resta privato del processo (script, benchmark)."""
+        return cls(nome, True, sensori_massimi, capacita)
+
+    @classmethod
+    def in_lettura(cls, nome=NOME_MEMORIA_CONDIVISA):
+        """Lettore della memoria creata dal simulatore: si collega (e ricollega dopo un riavvio) da solo."""
+        return cls(nome, False)
+
+    @staticmethod
+    def _dimensione(sensori_massimi, capacita):
+        return 8 * (_CELLE_TESTATA + len(SOTTOSISTEMI) * len(NOMI_STATI)) + sensori_massimi * (2 * LUNGHEZZA_NOME + 24 + 16 * capacita)
+
+    def _crea(self, sensori_massimi, capacita):
+        dimensione = self._dimensione(sensori_massimi, capacita)
+        if self.nome is None:
+            buffer = bytearray(dimensione)
+        else:
+            try:  # Residuo di un'esecuzione interrotta senza chiudi()
+                vecchia = shared_memory.SharedMemory(name=self.nome)
+                vecchia.close(); vecchia.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = shared_memory.SharedMemory(name=self.nome, create=True, size=dimensione)
+            buffer = self._shm.buf
+        testata = np.ndarray(_CELLE_TESTATA, np.int64, buffer)
+        testata[:] = 0
+        testata[_VERSIONE], testata[_SENSORI_MASSIMI], testata[_CAPACITA] = _VERSIONE_LAYOUT, sensori_massimi, capacita
+        self._mappa(buffer)
+
+    def _mappa(self, buffer):
+        self._testata = np.ndarray(_CELLE_TESTATA, np.int64, buffer)
+        sensori_massimi, capacita = int(self._testata[_SENSORI_MASSIMI]), int(self._testata[_CAPACITA])
+        offset = 8 * _CELLE_TESTATA
+        self._contatori = np.ndarray((len(SOTTOSISTEMI), len(NOMI_STATI)), np.int64, buffer, offset)
+        offset += self._contatori.nbytes
+        self._nomi_slot = np.ndarray((sensori_massimi, 2), f"S{LUNGHEZZA_NOME}", buffer, offset)
+        offset += sensori_massimi * 2 * LUNGHEZZA_NOME
+        self._scritte = np.ndarray(sensori_massimi, np.int64, buffer, offset)
+        offset += sensori_massimi * 8
+        self._allarmi = np.ndarray((sensori_massimi, 2), np.int64, buffer, offset)
+        offset += sensori_massimi * 16
+        self._ts = np.ndarray((sensori_massimi, capacita), np.int64, buffer, offset)
+        offset += sensori_massimi * capacita * 8
+        self._valori = np.ndarray((sensori_massimi, capacita), np.float64, buffer, offset)
+        self.capacita, self.sensori_massimi = capacita, sensori_massimi
+        # I lettori usano una copia locale delle viste: un altro thread può scollegare nel frattempo
+        self._viste = (self._testata, self._nomi_slot, self._scritte, self._ts, self._valori, self._allarmi, self._contatori)
+
+    def _scollega(self):
+        shm, self._shm, self._viste, self._slot, self._nomi = self._shm, None, None, {}, []
+        self._testata = self._nomi_slot = self._scritte = self._ts = self._valori = self._allarmi = self._contatori = None
+        try:
+            shm.close()
+        except BufferError:
+            pass  # Una lettura in corso usa ancora le viste: la mappatura si chiude quando le rilascia
+        return shm
+
+    def _collega(self):
+        try:
+            shm = shared_memory.SharedMemory(name=self.nome)
+        except FileNotFoundError:
+            return False
+        # Solo il creatore deve eliminare il blocco: il resource tracker del lettore lo farebbe all'uscita
+        resource_tracker.unregister(shm._name, "shared_memory")
+        if np.ndarray(1, np.int64, shm.buf)[0] != _VERSIONE_LAYOUT:
+            shm.close(); return False
+        self._shm = shm
+        self._mappa(shm.buf)
+        return True
+
+    def _silenzioso(self, testata):
+        return testata[_CHIUSO] or time.time() * 1000 - testata[_BATTITO_MS] > MAX_SILENZIO_SECONDI * 1000
+
+    def viste(self):
+        """
+        Array del ring buffer se ci sono scritture recenti, altrimenti None.
+        Il lettore si collega alla prima chiamata e si ricollega dopo un riavvio del simulatore.
+        """
+        if self.scrittura: return self._viste
+        viste = self._viste
+        if viste is not None and not self._silenzioso(viste[0]): return viste
+        with self._lock_collegamento:
+            if self._viste is not None and self._silenzioso(self._viste[0]):
+                self._scollega()  # Simulatore fermo o riavviato con un nuovo blocco
+            if self._viste is None:
+                if time.monotonic() - self._ultimo_tentativo < INTERVALLO_RICOLLEGAMENTO_SECONDI: return None
+                self._ultimo_tentativo = time.monotonic()
+                if not self._collega(): return None
+            return None if self._silenzioso(self._viste[0]) else self._viste
+
+    # --- Scrittura (un solo processo, un solo scrittore per sensore) ---
+
+    def _registra(self, sorgente_id, tipo):
+        with self._lock_registrazione:
+            slot = self._slot.get((sorgente_id, tipo))
+            if slot is not None: return slot
+            slot = int(self._testata[_SENSORI])
+            if slot >= self.sensori_massimi:
+                self._testata[_ESCLUSI] = 1  # Da qui in poi le viste della memoria sono incomplete
+                if not self._pieno_segnalato:
+                    log_system_message(f"[MEMORIA] Ring buffer pieno ({self.sensori_massimi} sensori): {sorgente_id}/{tipo} solo su SQLite")
+                    self._pieno_segnalato = True
+                return None
+            self._nomi_slot[slot] = (sorgente_id.encode(), tipo.encode())
+            self._testata[_SENSORI] = slot + 1  # Dopo i nomi: i lettori vedono solo slot completi
+            self._slot[(sorgente_id, tipo)] = slot
+            return slot
+
+    def scrivi_misurazione(self, sorgente_id, tipo, valore, timestamp):
+        slot = self._slot.get((sorgente_id, tipo))
+        if slot is None and (slot := self._registra(sorgente_id, tipo)) is None: return
+        scritte = int(self._scritte[slot])
+        posizione = scritte % self.capacita
+        self._ts[slot, posizione], self._valori[slot, posizione] = ts_ms_da_iso(timestamp), valore
+        self._scritte[slot] = scritte + 1
+        self._testata[_BATTITO_MS] = int(time.time() * 1000)
+
+    def scrivi_misurazioni(self, sensori, valori, timestamp):
+        """Una lettura per ciascun sensore (tutti diversi), con lo stesso timestamp."""
+        slot = [self._slot.get(sensore) for sensore in sensori]
+        slot = np.array([s if s is not None else self._registra(*sensore) for s, sensore in zip(slot, sensori)], dtype=float)
+        validi = ~np.isnan(slot)
+        slot, valori = slot[validi].astype(np.int64), np.asarray(valori, dtype=float)[validi]
+        posizioni = self._scritte[slot] % self.capacita
+        self._ts[slot, posizioni], self._valori[slot, posizioni] = ts_ms_da_iso(timestamp), valori
+        self._scritte[slot] += 1
+        self._testata[_BATTITO_MS] = int(time.time() * 1000)
+
+    def scrivi_transizioni_allarmi(self, transizioni):
+        for sorgente_id, tipo, evento, stato, _, timestamp in transizioni:
+            slot = self._slot.get((sorgente_id, tipo))
+            if slot is None and (slot := self._registra(sorgente_id, tipo)) is None: continue
+            if evento == APERTURA: self._allarmi[slot, 1] = ts_ms_da_iso(timestamp)
+            self._allarmi[slot, 0] = OK if evento == CHIUSURA else CODICI_STATI[stato]  # Il livello per ultimo: i lettori guardano quello
+
+    def pubblica_contatori(self, contatori):
+        """Sposta i ContatoriStati del processo nella memoria condivisa: da qui in poi ogni aggiornamento è visibile ai lettori."""
+        contatori.collega(self._contatori)
+        self._contatori_pubblicati = contatori
+
+    def precarica(self, df):
+        """Riempie i ring buffer con misurazioni già salvate (colonne come ultime_misurazioni), in ordine di tempo."""
+        df = df.assign(ts_ms=pd.to_datetime(df['timestamp']).to_numpy().astype("datetime64[ms]").astype(np.int64))
+        for (sorgente_id, tipo), serie in df.sort_values('ts_ms').groupby(['sorgente_id', 'tipo'], sort=False):
+            if (slot := self._registra(sorgente_id, tipo)) is None: continue
+            serie = serie.tail(self.capacita)
+            scritte = int(self._scritte[slot])
+            posizioni = (scritte + np.arange(len(serie))) % self.capacita
+            self._ts[slot, posizioni], self._valori[slot, posizioni] = serie['ts_ms'].to_numpy(), serie['valore'].to_numpy(dtype=float)
+            self._scritte[slot] = scritte + len(serie)
+
+    def chiudi(self):
+        if self._shm is None: return
+        if self.scrittura: self._testata[_CHIUSO] = 1  # I lettori collegati si staccano al prossimo accesso
+        if self._contatori_pubblicati is not None: self._contatori_pubblicati.scollega()
+        shm = self._scollega()
+        if self.scrittura: shm.unlink()
+
+    # --- Lettura (qualsiasi processo, senza lock) ---
+
+    def _aggiorna_nomi(self, testata, nomi_slot):
+        sensori, nomi = int(testata[_SENSORI]), self._nomi
+        if sensori > len(nomi):
+            nomi.extend((s.decode(), t.decode()) for s, t in nomi_slot[len(nomi):sensori])
+        return nomi[:sensori]
+
+    def _copia_slot(self, viste, slot, quante):
+        scritte, ts, valori = viste[2:5]
+        prima = int(scritte[slot])
+        inizio = max(0, prima - min(quante, self.capacita))
+        posizioni = np.arange(inizio, prima) % self.capacita
+        copia_ts, copia_valori = ts[slot, posizioni], valori[slot, posizioni]
+        dopo = int(scritte[slot])
+        # Le posizioni delle letture < dopo - capacità + 1 possono essere state riscritte durante la copia
+        scarto = max(0, dopo - self.capacita + 1 - inizio)
+        return copia_ts[scarto:], copia_valori[scarto:]
+
+    def _completa(self):
+        """Viste del ring buffer se contiene tutti i sensori, altrimenti None (chi legge ripiega su SQLite)."""
+        viste = self.viste()
+        return None if viste is None or viste[0][_ESCLUSI] else viste
+
+    def ultime_misurazioni(self, filtro, valore, limite):
+        colonna = _COLONNA_NOMI[filtro]
+        if (viste := self._completa()) is None: return None
+        parti = [(*self._copia_slot(viste, slot, limite), nomi) for slot, nomi in enumerate(self._aggiorna_nomi(*viste[:2])) if nomi[colonna] == valore]
+        ts, lunghezze = np.concatenate([p[0] for p in parti] or [[]]), [len(p[0]) for p in parti]
+        # Meno di `limite` letture: le più vecchie possono essere solo su SQLite (capacità del ring buffer, riavvio)
+        if len(ts) < limite: return None
+        ordine = np.argsort(ts, kind="stable")[::-1][:limite]
+        return pd.DataFrame({
+            "timestamp": np.datetime_as_string(ts[ordine].astype("datetime64[ms]"), unit="ms"),
+            "sorgente_id": np.repeat([p[2][0] for p in parti], lunghezze)[ordine],
+            "tipo": np.repeat([p[2][1] for p in parti], lunghezze)[ordine],
+            "valore": np.concatenate([p[1] for p in parti])[ordine],
+        }, columns=_COLONNE_MISURAZIONI)
+
+    def stati_attuali(self):
+        if (viste := self._completa()) is None: return None
+        ultimi = {nomi: self._copia_slot(viste, slot, 1)[1] for slot, nomi in enumerate(self._aggiorna_nomi(*viste[:2]))}
+        ultimi = {nomi: valori[-1] for nomi, valori in ultimi.items() if len(valori)}
+        if not ultimi: return None
+        stati = classifica_stati([tipo for _, tipo in ultimi], list(ultimi.values()))
+        return dict(zip(ultimi, stati))
+
+    def allarmi_aperti(self):
+        if (viste := self._completa()) is None: return None
+        nomi = self._aggiorna_nomi(*viste[:2])
+        allarmi = viste[5][:len(nomi)].copy()
+        righe = []
+        for slot in np.flatnonzero(allarmi[:, 0] != OK).tolist():
+            (sorgente_id, tipo), stato = nomi[slot], NOMI_STATI[allarmi[slot, 0]]
+            aperto_il = str(np.datetime64(int(allarmi[slot, 1]), "ms"))
+            righe.append((sorgente_id, tipo, stato, azioni_correttive_to_json(tipo, stato), aperto_il))
+        return pd.DataFrame(righe, columns=_COLONNE_ALLARMI_APERTI)
+
+    def contatori_stati(self):
+        # Un decremento e il relativo incremento non sono atomici: una lettura può sbagliare di uno per un istante
+        if (viste := self.viste()) is None: return None
+        return viste[6].copy()
+
+
+class MotoreCombinato(MotoreDati):
+    """Scrive su tutti i motori; ogni lettura va al primo, nell'ordine dato, che non restituisce None."""
+
+    def __init__(self, *motori):
+        self.motori = motori
+        self.durevole = any(motore.durevole for motore in motori)
+
+    def _leggi(self, metodo, *args, **kwargs):
+        for motore in self.motori:
+            risultato = getattr(motore, metodo)(*args, **kwargs)
+            if risultato is not None: return risultato
+        return None
+
+    def scrivi_misurazione(self, *args):
+        for motore in self.motori: motore.scrivi_misurazione(*args)
+
+    def scrivi_misurazioni(self, *args):
+        for motore in self.motori: motore.scrivi_misurazioni(*args)
+
+    def scrivi_stato(self, *args):
+        for motore in self.motori: motore.scrivi_stato(*args)
+
+    def scrivi_transizioni_allarmi(self, transizioni):
+        for motore in self.motori: motore.scrivi_transizioni_allarmi(transizioni)
+
+    def ultime_misurazioni(self, filtro, valore, limite): return self._leggi("ultime_misurazioni", filtro, valore, limite)
+    def stati_attuali(self): return self._leggi("stati_attuali")
+    def allarmi_aperti(self): return self._leggi("allarmi_aperti")
+    def contatori_stati(self): return self._leggi("contatori_stati")
+    def interroga(self, query, params=(), **kwargs): return self._leggi("interroga", query, params, **kwargs)
+
+    def chiudi(self):
+        for motore in self.motori: motore.chiudi()
+
+
+class MotoreCanale(MotoreDati):
+    """
+    Motore degli shard del simulatore (simulazione/shard.py): non apre il database ma accumula le scritture
+    e le spedisce a blocchi su una multiprocessing.Connection al processo che possiede il writer.
+    Le misurazioni partono già nel formato compatto, con gli id dei dizionari risolti dal processo principale
+    (`ids`: {(sorgente_id, tipo): (id sorgente, id tipo)}), e con i rollup pre-aggregati: il lavoro per riga
+    resta negli shard e al writer unico restano gli INSERT. Ogni blocco porta anche l'ultimo timestamp
+    scritto e i contatori degli stati del processo, che il principale usa per il modello di produzione.
+    """
+    durevole = True
+
+    def __init__(self, connessione, ids, righe_per_invio=RIGHE_PER_INVIO):
+        self._connessione, self._ids, self.righe_per_invio = connessione, ids, righe_per_invio
+        self._righe, self._stati, self._transizioni, self._ultimo_timestamp = [], [], [], None
+        self.righe_inviate = 0
+
+    def scrivi_misurazione(self, sorgente_id, tipo, valore, timestamp):
+        self.scrivi_misurazioni([(sorgente_id, tipo)], [valore], timestamp)
+
+    def scrivi_misurazioni(self, sensori, valori, timestamp):
+        ts_ms, ids = ts_ms_da_iso(timestamp), self._ids
+        self._righe.extend([(*ids[sensore], valore, ts_ms) for sensore, valore in zip(sensori, valori)])
+        self._ultimo_timestamp = timestamp
+        if len(self._righe) >= self.righe_per_invio: self.invia()
+
+    def scrivi_stato(self, sorgente_id, tipo, stato, timestamp): self._stati.append((sorgente_id, tipo, stato, timestamp))
+    def scrivi_transizioni_allarmi(self, transizioni): self._transizioni.extend(transizioni)
+
+    def invia(self):
+        """Spedisce quanto accumulato: messaggio ("blocco", righe, rollup, stati, transizioni, ultimo timestamp, contatori)."""
+        righe = self._righe
+        self._connessione.send(("blocco", righe, righe_rollup(righe), self._stati, self._transizioni, self._ultimo_timestamp, contatori_stati().conteggi.copy()))
+        self.righe_inviate += len(righe)
+        self._righe, self._stati, self._transizioni = [], [], []
+
+    def chiudi(self):
+        self.invia()
+
+
+# Motore usato dal simulatore: SQLite finché main non ne imposta un altro (es. script e backfill)
+_motore_attivo = None
+
+def motore_dati():
+    global _motore_attivo
+    if _motore_attivo is None: _motore_attivo = MotoreSQLite()
+    return _motore_attivo
+
+def imposta_motore_dati(motore):
+    global _motore_attivo
+    _motore_attivo = motore
+    return motore
@@ -0,0 +1,51 @@
+# infrastruttura/piani_query.py
+
+import sys
+from infrastruttura import database
+from infrastruttura.database import connessione_lettura
+
+# Tabelle piccole per costruzione (una riga per sensore): la scansione completa è voluta
+TABELLE_SCANSIONE_AMMESSA = {"stati_attuali", "versioni_dati"}
+
+QUERY_DASHBOARD = {
+    "monitoraggio: recenti per tipo": (database.query_misurazioni(database.QUERY_MISURAZIONI_RECENTI, "tipo"), ("pH", 1000)),
+    "monitoraggio: recenti per sorgente": (database.query_misurazioni(database.QUERY_MISURAZIONI_RECENTI, "sorgente_id"), ("Serra_1", 1000)),
+    "monitoraggio: flusso dopo id": (database.QUERY_MISURAZIONI_DOPO_ID, (0, 5000)),
+    "monitoraggio: ultimo id": (database.QUERY_ULTIMO_ID_MISURAZIONI, ()),
+    "monitoraggio: intervallo per tipo": (database.query_misurazioni(database.QUERY_MISURAZIONI_INTERVALLO, "tipo"), ("pH", 0, 1, 0, 0)),
+    "monitoraggio: rollup per tipo": (database.query_misurazioni(database.QUERY_ROLLUP_INTERVALLO, "tipo"), (60, "pH", 0, 1)),
+    "monitoraggio: rollup per sorgente": (database.query_misurazioni(database.QUERY_ROLLUP_INTERVALLO, "sorgente_id"), (60, "Serra_1", 0, 1)),
+    "monitoraggio: stati attuali": (database.QUERY_STATI_ATTUALI, ()),
+    "allarmi: storico recente": (database.QUERY_ALLARMI_RECENTI, (50,)),
+    "app: ultimo allarme": (database.QUERY_ULTIMO_ALLARME, (0,)),
+    "performance: produzione": (database.QUERY_PRODUZIONE_RECENTE, (300,)),
+    "performance: finanziari": (database.QUERY_FINANZIARI_RECENTI, (300,)),
+    "cache: versioni dati": (database.QUERY_VERSIONI_DATI, ()),
+}
+
+def problemi_piano(righe_piano):
+    """Dalle righe di EXPLAIN QUERY PLAN estrae scansioni complete di tabella e ordinamenti in B-tree temporanei."""
+    problemi = []
+    for *_, dettaglio in righe_piano:
+        if dettaglio.startswith("SCAN ") and " USING " not in dettaglio and dettaglio.split()[1] not in TABELLE_SCANSIONE_AMMESSA:
+            problemi.append(dettaglio)
+        elif dettaglio.startswith("USE TEMP B-TREE"):
+            problemi.append(dettaglio)
+    return problemi
+
+def verifica_piani_query(query=QUERY_DASHBOARD):
+    """Restituisce {nome_query: [problemi]} per le query il cui piano non usa un indice."""
+    risultati = {}
+    with connessione_lettura() as conn:
+        for nome, (sql, params) in query.items():
+            problemi = problemi_piano(conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall())
+            if problemi: risultati[nome] = problemi
+    return risultati
+
+if __name__ == "__main__":
+    database.setup_database()
+    problemi = verifica_piani_query()
+    for nome, dettagli in problemi.items():
+        print(f"[PIANO] {nome}: {'; '.join(dettagli)}")
+    print("[PIANO] Nessuna scansione completa nelle query della dashboard." if not problemi else f"[PIANO] {len(problemi)} query senza indice.")
+    sys.exit(1 if problemi else 0)
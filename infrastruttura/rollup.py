@@ -0,0 +1,34 @@
+# infrastruttura/rollup.py
+
+import pandas as pd
+from infrastruttura.database import connessione_lettura, query_misurazioni, ts_ms_da_iso, QUERY_ROLLUP_INTERVALLO, RISOLUZIONI_ROLLUP
+from infrastruttura.archivio import leggi_misurazioni
+
+PUNTI_MASSIMI_PER_SERIE = 500
+INTERVALLO_GREZZO_SECONDI = 5  # Il sensore più frequente scrive ogni 5 s
+
+def scegli_risoluzione(inizio_ms, fine_ms, punti_massimi=PUNTI_MASSIMI_PER_SERIE):
+    """0 = dati grezzi, altrimenti la risoluzione di rollup (in secondi) più fine che resta sotto punti_massimi per serie."""
+    durata_s = max(0, fine_ms - inizio_ms) / 1000
+    if durata_s / INTERVALLO_GREZZO_SECONDI <= punti_massimi: return 0
+    for risoluzione_s in RISOLUZIONI_ROLLUP:
+        if durata_s / risoluzione_s <= punti_massimi: return risoluzione_s
+    return RISOLUZIONI_ROLLUP[-1]
+
+def carica_serie(filtro, valore_filtro, inizio, fine, punti_massimi=PUNTI_MASSIMI_PER_SERIE):
+    """
+    Serie temporali tra inizio e fine (datetime o stringhe ISO) per un tipo o una sorgente.
+    La risoluzione è scelta in base all'ampiezza dell'intervallo: grezzi per finestre brevi,
+    altrimenti rollup con valore = media del bucket, più minimo, massimo e conteggio.
+    """
+    inizio_ms, fine_ms = ts_ms_da_iso(inizio), ts_ms_da_iso(fine)
+    risoluzione_s = scegli_risoluzione(inizio_ms, fine_ms, punti_massimi)
+    if risoluzione_s == 0:
+        # Dati grezzi: SQLite per i giorni recenti, archivio Parquet per quelli più vecchi
+        df = leggi_misurazioni(filtro, valore_filtro, inizio, fine)
+    else:
+        inizio_bucket = inizio_ms - inizio_ms % (risoluzione_s * 1000)
+        with connessione_lettura() as conn:
+            df = pd.read_sql_query(query_misurazioni(QUERY_ROLLUP_INTERVALLO, filtro), conn, params=(risoluzione_s, valore_filtro, inizio_bucket, fine_ms))
+    df["risoluzione_s"] = risoluzione_s
+    return df
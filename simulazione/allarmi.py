@@ -0,0 +1,103 @@
+# simulazione/allarmi.py
+
+import threading
+import numpy as np
+from config.classificatore import classificatore, azioni_correttive_to_json, CODICI_STATI, NOMI_STATI, OK, UNKNOWN
+from infrastruttura.database import APERTURA, AGGIORNAMENTO, CHIUSURA
+
+class MacchinaAllarmi:
+    """
+    Livello di allarme (OK / WARNING / CRITICAL) di ogni sensore, con isteresi e debounce per tipo
+    (chiavi "isteresi" e "debounce" di SENSOR_CONFIG). Un cambio di livello diventa una transizione
+    solo dopo `debounce` letture consecutive che lo spostano nella stessa direzione (in su o in giù,
+    anche alternando WARNING e CRITICAL): il nuovo livello è quello, tra le letture della serie, più
+    vicino al livello attuale. Per scendere di livello il valore deve rientrare oltre l'isteresi. aggiorna() restituisce solo le transizioni, da registrare nello storico:
+    un'escursione di 5 minuti produce un'apertura e una chiusura invece di una riga per lettura.
+
+    Lo stato è in array indicizzati per sensore; ogni sensore deve essere aggiornato da un solo thread
+    alla volta (come fa il pianificatore), la registrazione di sensori nuovi è protetta da un lock.
+    """
+    def __init__(self, capacita=256):
+        self._indice, self._sensori, self._aperto_il = {}, [], []
+        self._livello = np.zeros(capacita, dtype=np.int8)      # Livello confermato
+        self._candidato = np.zeros(capacita, dtype=np.int8)    # Livello in attesa di conferma (il più vicino a quello attuale nella serie)
+        self._conferme = np.zeros(capacita, dtype=np.int32)    # Letture consecutive nella direzione del candidato
+        self._lock = threading.Lock()
+
+    def _indici(self, sensori):
+        indici = [self._indice.get(sensore) for sensore in sensori]
+        if None in indici:
+            with self._lock:
+                for sensore in sensori:
+                    if sensore in self._indice: continue
+                    self._indice[sensore] = len(self._sensori)
+                    self._sensori.append(sensore); self._aperto_il.append(None)
+                if len(self._sensori) > len(self._livello):
+                    # Raro (capacità raddoppiata): gli array vengono sostituiti, mai ridimensionati sul posto
+                    aggiunta = max(len(self._livello), len(self._sensori) - len(self._livello))
+                    self._livello, self._candidato, self._conferme = (np.concatenate([a, np.zeros(aggiunta, a.dtype)]) for a in (self._livello, self._candidato, self._conferme))
+            indici = [self._indice[sensore] for sensore in sensori]
+        return np.array(indici, dtype=np.intp)
+
+    def aggiorna(self, sensori, valori, timestamp, stati=None):
+        """
+        Fa avanzare la macchina con una lettura per ciascun sensore (lista di (sorgente_id, tipo), tutti diversi).
+
+        Args:
+            sensori (list): Coppie (sorgente_id, tipo)
+            valori (list | np.ndarray): Valori letti, nello stesso ordine
+            timestamp (str): Timestamp ISO delle letture
+            stati (np.ndarray, optional): Codici di stato già calcolati con classifica_codici
+
+        Returns:
+            list: Transizioni (sorgente_id, tipo, evento, stato, azioni_json, timestamp)
+        """
+        indici = self._indici(sensori)
+        compilato = classificatore()
+        codici_tipi = compilato.codici_tipi([tipo for _, tipo in sensori])
+        livello = self._livello[indici]
+        candidato = compilato.classifica_con_isteresi(codici_tipi, valori, livello, stati).astype(np.int8)
+        sconosciuti = candidato == UNKNOWN
+        candidato[sconosciuti] = livello[sconosciuti]  # Tipo senza soglie: nessun allarme
+        direzione = np.sign(candidato - livello)
+        precedente = self._candidato[indici]
+        prosegue = (direzione != 0) & (self._conferme[indici] > 0) & (np.sign(precedente - livello) == direzione)
+        conferme = np.where(direzione != 0, np.where(prosegue, self._conferme[indici] + 1, 1), 0)
+        # Salendo vale il livello meno grave della serie, scendendo il più grave: quello confermato da tutte le letture
+        candidato = np.where(prosegue, np.where(direzione > 0, np.minimum(candidato, precedente), np.maximum(candidato, precedente)), candidato)
+        scatta = (direzione != 0) & (conferme >= compilato.debounce[codici_tipi])
+        self._candidato[indici] = candidato
+        self._conferme[indici] = np.where(scatta, 0, conferme)
+        if not scatta.any(): return []
+        self._livello[indici[scatta]] = candidato[scatta]
+
+        transizioni = []
+        for i in np.flatnonzero(scatta).tolist():
+            (sorgente_id, tipo), nuovo, vecchio = sensori[i], int(candidato[i]), int(livello[i])
+            if nuovo == OK:
+                evento, self._aperto_il[indici[i]] = CHIUSURA, None
+            elif vecchio == OK:
+                evento, self._aperto_il[indici[i]] = APERTURA, timestamp
+            else:
+                evento = AGGIORNAMENTO
+            stato = NOMI_STATI[nuovo]
+            transizioni.append((sorgente_id, tipo, evento, stato, azioni_correttive_to_json(tipo, stato), timestamp))
+        return transizioni
+
+    def ripristina(self, aperti):
+        """Riprende gli allarmi già aperti (DataFrame di allarmi_aperti), per non riaprirli dopo un riavvio."""
+        if aperti is None or aperti.empty: return
+        sensori = list(zip(aperti['sorgente_id'], aperti['tipo']))
+        indici = self._indici(sensori)
+        livelli = np.array([CODICI_STATI[stato] for stato in aperti['stato']], dtype=np.int8)
+        self._livello[indici] = self._candidato[indici] = livelli
+        for indice, aperto_il in zip(indici.tolist(), aperti['aperto_il']): self._aperto_il[indice] = aperto_il
+
+    def aperti(self):
+        """Dizionario {(sorgente_id, tipo): (stato, aperto_il)} degli allarmi in corso."""
+        return {self._sensori[i]: (NOMI_STATI[self._livello[i]], self._aperto_il[i]) for i in np.flatnonzero(self._livello[:len(self._sensori)] != OK).tolist()}
+
+_macchina = MacchinaAllarmi()
+
+def macchina_allarmi():
+    return _macchina
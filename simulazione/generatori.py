@@ -34,4 +34,75 @@ class GeneratoreSensore:
         fluttuazione = np.random.normal(loc=target_mu, scale=self.sigma)
         nuovo_valore = (self.valore_attuale * self.inerzia) + (fluttuazione * (1 - self.inerzia))
         self.valore_attuale = np.clip(nuovo_valore, self.limite_minimo, self.limite_massimo)
-        return round(self.valore_attuale, 2)
\ No newline at end of file
+        return round(self.valore_attuale, 2)
+
+def crea_generatore(tipo_sensore):
+    """GeneratoreSensore con inerzia, probabilità di anomalia e media leggermente diverse per ogni sensore."""
+    generatore = GeneratoreSensore(tipo_sensore, inerzia=random.uniform(0.92, 0.98), prob_anomalia=random.uniform(0.01, 0.04))
+    generatore.mu += random.uniform(-generatore.sigma * 0.2, generatore.sigma * 0.2)
+    return generatore
+
+class GeneratoreFlotta:
+    """
+    Versione vettoriale di GeneratoreSensore per N sensori: inerzia, mu, sigma, fase di anomalia,
+    contatore di fase e limiti di clipping sono array NumPy, e genera() fa avanzare tutti i
+    sensori con estrazioni casuali a blocchi. Semantica delle anomalie e clipping sono le stesse
+    del generatore scalare, quindi le statistiche delle serie coincidono.
+    """
+    def __init__(self, tipi_sensore, inerzia=0.95, prob_anomalia=0.02, durata_media_anomalia=5, seed=None):
+        self.tipi = list(tipi_sensore)
+        for tipo in set(self.tipi):
+            if tipo not in CONFIGURAZIONI: raise ValueError(f"Tipo sensore '{tipo}' non trovato.")
+        n, config = len(self.tipi), [CONFIGURAZIONI[tipo] for tipo in self.tipi]
+        self.rng = np.random.default_rng(seed)
+        self.mu = np.array([c['mu'] for c in config], dtype=float)
+        self.sigma = np.array([c['sigma'] for c in config], dtype=float)
+        self.ok_min = np.array([c['ok'][0] for c in config], dtype=float)
+        self.ok_max = np.array([c['ok'][1] for c in config], dtype=float)
+        self.limite_minimo = np.array([c['warning'][0] for c in config], dtype=float) - (self.sigma * 2)
+        self.limite_massimo = np.array([c['warning'][1] for c in config], dtype=float) + (self.sigma * 2)
+        self.inerzia = np.full(n, inerzia, dtype=float)
+        self.prob_anomalia = np.full(n, prob_anomalia, dtype=float)
+        self.durata_media_anomalia = np.full(n, durata_media_anomalia, dtype=float)
+        self.valore_attuale = self.mu.copy()
+        self.in_anomalia = np.zeros(n, dtype=bool)
+        self.contatore_fase = np.zeros(n, dtype=np.int64)
+        self.durata_anomalia_corrente = np.zeros(n, dtype=np.int64)
+
+    @classmethod
+    def da_generatori(cls, generatori, seed=None):
+        """Costruisce una flotta copiando parametri e stato da una lista di GeneratoreSensore."""
+        flotta = cls([g.tipo for g in generatori], seed=seed)
+        flotta.mu = np.array([g.mu for g in generatori], dtype=float)
+        flotta.inerzia = np.array([g.inerzia for g in generatori], dtype=float)
+        flotta.prob_anomalia = np.array([g.prob_anomalia for g in generatori], dtype=float)
+        flotta.durata_media_anomalia = np.array([g.durata_media_anomalia for g in generatori], dtype=float)
+        flotta.valore_attuale = np.array([g.valore_attuale for g in generatori], dtype=float)
+        flotta.in_anomalia = np.array([g.fase == "anomalia" for g in generatori], dtype=bool)
+        flotta.contatore_fase = np.array([g.contatore_fase for g in generatori], dtype=np.int64)
+        flotta.durata_anomalia_corrente = np.array([g.durata_anomalia_corrente for g in generatori], dtype=np.int64)
+        return flotta
+
+    def __len__(self):
+        return len(self.tipi)
+
+    def genera(self):
+        n = len(self.tipi)
+        inizia = ~self.in_anomalia & (self.rng.random(n) < self.prob_anomalia)
+        termina = self.in_anomalia & (self.contatore_fase >= self.durata_anomalia_corrente)
+        if inizia.any():
+            durate = self.durata_media_anomalia[inizia] + self.rng.standard_normal(int(inizia.sum()))
+            self.durata_anomalia_corrente[inizia] = np.maximum(1, np.trunc(durate).astype(np.int64))
+        self.in_anomalia = (self.in_anomalia & ~termina) | inizia
+        self.contatore_fase[inizia | termina] = 0
+        self.contatore_fase += self.in_anomalia
+
+        target_mu = self.mu
+        if self.in_anomalia.any():
+            sopra = self.rng.random(n) < 0.5
+            target_mu = np.where(self.in_anomalia, np.where(sopra, self.ok_max + self.sigma, self.ok_min - self.sigma), self.mu)
+
+        fluttuazione = target_mu + self.sigma * self.rng.standard_normal(n)
+        nuovo_valore = (self.valore_attuale * self.inerzia) + (fluttuazione * (1 - self.inerzia))
+        np.clip(nuovo_valore, self.limite_minimo, self.limite_massimo, out=self.valore_attuale)
+        return np.round(self.valore_attuale, 2)
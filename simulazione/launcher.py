@@ -1,37 +1,99 @@
 # simulazione/launcher.py
+"""
+Avvio integrato: simulatore e dashboard in due processi. La dashboard parte appena il simulatore
+segnala di essere pronto (database migrato, ingestione e ring buffer attivi) scrivendo il file indicato
+in HYDROFUSION_FILE_PRONTO, invece di attendere un tempo fisso. Solo libreria standard: il launcher
+deve importarsi in pochi millisecondi.
+"""
 
+import os
+import signal
 import subprocess
-import threading
-import time
 import sys
-import os
-
-def avvia_modulo(nome, modulo):
-    print(f"🟢 Avvio {nome} ({modulo})")
-    subprocess.Popen([sys.executable, "-m", modulo], cwd=ROOT)
+import tempfile
+import time
 
 # Root assoluta del progetto
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
-if __name__ == "__main__":
-    print("🎛️ Avvio integrato HydroFusion: Simulazione + Dashboard\n")
+VARIABILE_FILE_PRONTO = "HYDROFUSION_FILE_PRONTO"
+TIMEOUT_PRONTO_SECONDI = 30
+INTERVALLO_ATTESA_SECONDI = 0.05
 
-    threading.Thread(
-        target=avvia_modulo,
-        args=("Simulazione Sensori", "simulazione.main"),
-        daemon=True
-    ).start()
+def segnala_pronto():
+    """Chiamata dal simulatore: crea il file di prontezza, se il launcher ne ha indicato uno."""
+    percorso = os.environ.get(VARIABILE_FILE_PRONTO)
+    if not percorso: return
+    with open(percorso + ".tmp", "w") as f: f.write(str(os.getpid()))
+    os.replace(percorso + ".tmp", percorso)  # Il launcher non vede mai un file scritto a metà
 
-    time.sleep(2)
+def avvia_modulo(nome, modulo, cartella=ROOT, output=None, **ambiente):
+    print(f"🟢 Avvio {nome} ({modulo})")
+    # PYTHONPATH alla root: con una cartella di lavoro diversa (es. per il database) i moduli si trovano comunque
+    env = {**os.environ, **ambiente, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+    return subprocess.Popen([sys.executable, "-m", modulo], cwd=cartella, env=env, stdout=output, stderr=output and subprocess.STDOUT)
 
-    threading.Thread(
-        target=avvia_modulo,
-        args=("Dashboard", "dashboard.app"),
-        daemon=True
-    ).start()
+def _attendi(condizione, processo, descrizione, timeout):
+    scadenza = time.monotonic() + timeout
+    while not condizione():
+        if processo.poll() is not None: raise RuntimeError(f"{descrizione}: il processo è terminato (codice {processo.returncode})")
+        if time.monotonic() > scadenza: raise TimeoutError(f"{descrizione}: nessuna risposta entro {timeout} s")
+        time.sleep(INTERVALLO_ATTESA_SECONDI)
 
+def _pagina_servita(url):
+    import urllib.request  # ~30 ms (http, email, ssl): solo nel launcher, non nel simulatore che importa segnala_pronto
+    try:
+        with urllib.request.urlopen(url, timeout=1) as risposta: return risposta.status == 200
+    except OSError:
+        return False
+
+def avvia_sistema(cartella=ROOT, porta=8050, timeout=TIMEOUT_PRONTO_SECONDI, output=None):
+    """
+    Avvia simulatore e dashboard e attende che la prima pagina sia servita; con `output` (un file aperto)
+    l'output dei due processi finisce lì invece che sul terminale.
+
+    Returns:
+        tuple: (processi, tempi) con i Popen avviati e i secondi dall'avvio a
+               simulatore pronto ("simulatore_pronto_s") e prima pagina servita ("prima_pagina_s")
+    """
+    inizio = time.perf_counter()
+    file_pronto = os.path.join(tempfile.mkdtemp(prefix="hydrofusion-"), "simulatore.pronto")
+    processi = [avvia_modulo("Simulazione Sensori", "simulazione.main", cartella, output, **{VARIABILE_FILE_PRONTO: file_pronto})]
+    try:
+        _attendi(lambda: os.path.exists(file_pronto), processi[0], "Simulatore", timeout)
+        tempi = {"simulatore_pronto_s": time.perf_counter() - inizio}
+        # Senza reloader: con debug=True Dash ricaricherebbe l'intera app in un secondo processo
+        processi.append(avvia_modulo("Dashboard", "dashboard.app", cartella, output, HYDROFUSION_PORTA_DASHBOARD=str(porta), HYDROFUSION_RELOADER="0"))
+        _attendi(lambda: _pagina_servita(f"http://127.0.0.1:{porta}/"), processi[1], "Dashboard", timeout)
+        tempi["prima_pagina_s"] = time.perf_counter() - inizio
+    except BaseException:
+        ferma_sistema(processi)
+        raise
+    finally:
+        if os.path.exists(file_pronto): os.remove(file_pronto)
+        os.rmdir(os.path.dirname(file_pronto))
+    return processi, tempi
+
+def ferma_sistema(processi, timeout=10):
+    """Ferma i processi come un Ctrl+C (il simulatore chiude database e ingestione), poi li termina se non escono."""
+    for processo in processi:
+        if processo.poll() is not None: continue
+        if os.name == "nt": processo.terminate()
+        else: processo.send_signal(signal.SIGINT)
+    for processo in processi:
+        try:
+            processo.wait(timeout)
+        except subprocess.TimeoutExpired:
+            processo.kill(); processo.wait()
+
+if __name__ == "__main__":
+    print("🎛️ Avvio integrato HydroFusion: Simulazione + Dashboard\n")
+    processi, tempi = avvia_sistema()
+    print(f"\n✅ Simulatore pronto in {tempi['simulatore_pronto_s']:.2f} s, dashboard su http://127.0.0.1:8050/ in {tempi['prima_pagina_s']:.2f} s")
     try:
-        while True:
+        while all(processo.poll() is None for processo in processi):
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\n⛔ Interruzione avvio integrato.")
\ No newline at end of file
+        print("\n⛔ Interruzione avvio integrato.")
+    finally:
+        ferma_sistema(processi)
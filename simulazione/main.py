@@ -1,49 +1,176 @@
 # simulazione/main.py
 
-import time, threading, random
-from config.config import NUM_SERRE, SENSORI_PER_SERRA, NUM_PESCINE, SENSORI_PER_PESCI, NUM_PANNELLI
-from simulazione.motore import esegui_ciclo_sensore
-from simulazione.generatori import GeneratoreSensore
-from simulazione.produzione import avvia_thread_produzione
-from infrastruttura.database import setup_database
-from infrastruttura.logger import setup_logging, log_system_message
-
-def avvia_thread_sensore(sorgente_id, tipo_sensore, intervallo_secondi):
+import argparse, re, signal, time
+from datetime import datetime, timedelta
+from functools import partial
+from config.classificatore import controlla_soglie, INTERVALLO_CONTROLLO_SOGLIE_SECONDI
+from config.config import LOG_FILE_JSONL, NUM_SERRE, SENSORI_PER_SERRA, NUM_PESCINE, SENSORI_PER_PESCI, NUM_PANNELLI
+from simulazione.motore import esegui_ciclo_sensore, esegui_ciclo_flotta
+from simulazione.generatori import GeneratoreFlotta, crea_generatore
+from simulazione.pianificatore import Pianificatore, PianificatoreVirtuale
+from simulazione.produzione import simula_ciclo_produzione
+from simulazione.shard import esegui_backfill_parallelo
+from infrastruttura import database
+from infrastruttura.database import setup_database, chiudi_database, QUERY_AGGIORNA_STATO, APERTURA
+from infrastruttura.ingestione import avvia_ingestione, ferma_ingestione, statistiche_ingestione, accoda_blocco
+from infrastruttura.contatori import contatori_stati
+from infrastruttura.motori import MotoreSQLite, MotoreMemoria, MotoreCombinato, imposta_motore_dati
+from infrastruttura.compattazione import avvia_compattazione, ferma_compattazione, statistiche_compattazione
+from infrastruttura.logger import setup_logging, ferma_logging, statistiche_log, log_system_message
+from simulazione.allarmi import macchina_allarmi
+from simulazione.launcher import segnala_pronto
+
+INTERVALLO_PRODUZIONE_SECONDI = 15
+INTERVALLO_STATISTICHE_SECONDI = 60
+UNITA_DURATA = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def elenco_sensori():
+    sensori = []
+    for i in range(1, NUM_SERRE + 1): sensori.extend([(f"Serra_{i}", tipo, 5) for tipo in SENSORI_PER_SERRA])
+    for i in range(1, NUM_PESCINE + 1): sensori.extend([(f"Pesci_{i}", tipo, 7) for tipo in SENSORI_PER_PESCI])
+    for i in range(1, NUM_PANNELLI + 1): sensori.append((f"Pannello_{i}", "Produzione", 10))
+    return sensori
+
+def ripristina_allarmi(sqlite, memoria=None):
+    """Riprende gli allarmi aperti da allarmi_aperti: dopo un riavvio non vengono riaperti (né duplicati nello storico)."""
+    aperti = sqlite.allarmi_aperti()
+    macchina_allarmi().ripristina(aperti)
+    if memoria is not None:
+        memoria.scrivi_transizioni_allarmi([(s, t, APERTURA, stato, azioni, aperto_il) for s, t, stato, azioni, aperto_il in aperti.itertuples(index=False)])
+
+def avvia_motore_live():
+    """
+    SQLite resta il motore durevole; accanto c'è il ring buffer in memoria condivisa da cui la dashboard
+    legge le viste live. Al riavvio il ring buffer riparte dalle ultime letture già salvate.
+    """
+    sqlite, memoria = MotoreSQLite(), MotoreMemoria.crea()
+    tipi_per_sorgente = {}
+    for sorgente, _, _ in elenco_sensori(): tipi_per_sorgente[sorgente] = tipi_per_sorgente.get(sorgente, 0) + 1
     try:
-        generatore = GeneratoreSensore(tipo_sensore, inerzia=random.uniform(0.92, 0.98), prob_anomalia=random.uniform(0.01, 0.04))
-        generatore.mu += random.uniform(-generatore.sigma * 0.2, generatore.sigma * 0.2)
-        log_system_message(f"Thread avviato per: {sorgente_id} - {tipo_sensore}")
-    except ValueError as e:
-        log_system_message(f"[ERRORE] Creazione generatore fallita per {tipo_sensore}: {e}"); return
-    while True:
-        try: esegui_ciclo_sensore(sorgente_id, tipo_sensore, generatore); time.sleep(intervallo_secondi)
-        except Exception as e: log_system_message(f"[ERRORE] Thread {sorgente_id}-{tipo_sensore}: {e}"); time.sleep(60)
-
-def main():
-    setup_logging()
+        for sorgente, tipi in tipi_per_sorgente.items():
+            df = sqlite.ultime_misurazioni("sorgente_id", sorgente, memoria.capacita * tipi)
+            if not df.empty: memoria.precarica(df)
+    except Exception as e:
+        log_system_message(f"[MEMORIA] Precaricamento del ring buffer fallito, riparte vuoto: {e}")
+    ripristina_allarmi(sqlite, memoria)
+    memoria.pubblica_contatori(contatori_stati())
+    return imposta_motore_dati(MotoreCombinato(memoria, sqlite))
+
+def log_statistiche(pianificatore):
+    stats = pianificatore.statistiche()
+    log_system_message(f"[SCHEDULER] lag medio {stats['ritardo_medio_ms']:.1f} ms, max {stats['ritardo_massimo_ms']:.1f} ms, jitter {stats['jitter_ms']:.1f} ms, cicli saltati {stats['saltate']}")
+    ingestione = statistiche_ingestione()
+    if ingestione: log_system_message(f"[INGESTIONE] scritte {ingestione['righe_scritte']} righe, coda {ingestione['profondita_attuale']}/{ingestione['capacita']}, attese per coda piena {ingestione['attese_coda_piena']}")
+    compattazione = statistiche_compattazione()
+    if compattazione.get("passate"): log_system_message(f"[COMPATTAZIONE] {compattazione['passate']} passate, righe eliminate {compattazione['righe_eliminate']}, recuperati {compattazione['byte_recuperati'] / 1024:.0f} KiB")
+    log = statistiche_log()
+    if log.get("scartate") or log.get("perse_coda_piena"): log_system_message(f"[LOG] righe per lettura scartate dal campionamento {log['scartate']}, perse per coda piena {log['perse_coda_piena']}")
+
+def durata_da_testo(testo):
+    """Converte durate come '90d', '12h', '30m' o '45s' in un timedelta."""
+    corrispondenza = re.fullmatch(r"(\d+)([smhd])", testo.strip())
+    if not corrispondenza: raise argparse.ArgumentTypeError(f"Durata non valida: '{testo}' (es. 90d, 12h, 30m)")
+    return timedelta(seconds=int(corrispondenza.group(1)) * UNITA_DURATA[corrispondenza.group(2)])
+
+def velocita_da_testo(testo):
+    if testo == "max": return None
+    try: return float(testo)
+    except ValueError: raise argparse.ArgumentTypeError(f"Velocità non valida: '{testo}' (usa 'max' o un moltiplicatore, es. 60)")
+
+def esegui_backfill(durata, velocita=None):
+    """
+    Genera lo storico degli ultimi `durata` su un orologio virtuale e lo carica a blocchi.
+    I sensori con lo stesso intervallo avanzano insieme in una GeneratoreFlotta; l'efficienza
+    per il modello di produzione viene dai contatori degli stati, aggiornati a ogni ciclo di flotta.
+    """
+    fine = datetime.now()
+    pianificatore = PianificatoreVirtuale(fine - durata, fine, velocita)
+    ultimi_stati, gruppi = {}, {}
+    for sorgente, tipo, intervallo in elenco_sensori():
+        gruppi.setdefault(intervallo, []).append((sorgente, tipo))
+
+    def ciclo_gruppo(sensori, flotta):
+        esegui_ciclo_flotta(sensori, flotta, pianificatore.datetime_corrente().isoformat(), ultimi_stati)
+
+    def ciclo_produzione():
+        simula_ciclo_produzione(pianificatore.datetime_corrente().isoformat(), silenzioso=True)
+
+    for intervallo, sensori in gruppi.items():
+        flotta = GeneratoreFlotta.da_generatori([crea_generatore(tipo) for _, tipo in sensori])
+        pianificatore.aggiungi(f"flotta-{intervallo}s", partial(ciclo_gruppo, sensori, flotta), intervallo)
+    pianificatore.aggiungi("produzione", ciclo_produzione, INTERVALLO_PRODUZIONE_SECONDI)
+
+    def _interrompi(signum, frame): pianificatore.ferma()
+    signal.signal(signal.SIGINT, _interrompi)
+
+    log_system_message(f"[BACKFILL] Generazione da {pianificatore.inizio:%Y-%m-%d %H:%M} a {fine:%Y-%m-%d %H:%M} (velocità {'max' if velocita is None else f'{velocita:g}x'})")
+    inizio_reale = time.perf_counter()
+    pianificatore.esegui()
+    accoda_blocco(QUERY_AGGIORNA_STATO, [(sorgente, tipo, stato, ts) for (sorgente, tipo), (stato, ts) in ultimi_stati.items()])
+    return time.perf_counter() - inizio_reale
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulatore HydroFusion")
+    parser.add_argument("--worker", type=int, default=0, help="Thread del pool per eseguire i cicli (0 = tutto nel ciclo dello scheduler)")
+    parser.add_argument("--backfill", type=durata_da_testo, help="Genera lo storico degli ultimi N giorni/ore/minuti su orologio virtuale (es. 90d) e termina")
+    parser.add_argument("--log-jsonl", metavar="FILE", help="Scrive le righe di log anche in un file JSON Lines")
+    parser.add_argument("--shard", type=int, metavar="N", help="Backfill su N processi, ognuno con una parte delle sorgenti (0 = uno per core)")
+    parser.add_argument("--speed", type=velocita_da_testo, default=None, help="Velocità del backfill: 'max' (default) o moltiplicatore del tempo reale")
+    args = parser.parse_args(argv)
+
+    if args.backfill:
+        setup_logging(file_jsonl=args.log_jsonl or LOG_FILE_JSONL)
+        database.DB_SYNCHRONOUS = "OFF"  # Caricamento massivo: niente fsync, il file si può rigenerare
+        setup_database()
+        ripristina_allarmi(MotoreSQLite())
+        avvia_ingestione(dimensione_massima=1000, soglia_righe=50000, intervallo_flush=1.0)
+        try:
+            if args.shard is None: durata = esegui_backfill(args.backfill, args.speed)
+            else: durata = esegui_backfill_parallelo(elenco_sensori(), args.backfill, args.shard, args.speed, INTERVALLO_PRODUZIONE_SECONDI)
+        finally:
+            righe = statistiche_ingestione().get("righe_accodate", 0)
+            ferma_ingestione()
+            chiudi_database()
+        log_system_message(f"[BACKFILL] Completato: {righe} righe in {durata:.1f} s ({righe / max(durata, 1e-9):,.0f} righe/s)")
+        return
+
+    setup_logging(file_jsonl=args.log_jsonl or LOG_FILE_JSONL)
     log_system_message("==========================================")
     log_system_message("  Avvio del Simulatore HydroFusion      ")
     log_system_message("==========================================")
     setup_database()
+    avvia_ingestione()
+    avvia_compattazione()
+    motore = avvia_motore_live()
+    segnala_pronto()  # Il launcher può avviare la dashboard: schema migrato e ring buffer già pubblicato
+
+    pianificatore = Pianificatore(num_worker=args.worker)
+    for i, (sorgente, tipo, intervallo) in enumerate(elenco_sensori()):
+        try:
+            generatore = crea_generatore(tipo)
+        except ValueError as e:
+            log_system_message(f"[ERRORE] Creazione generatore fallita per {tipo}: {e}"); continue
+        # Sfalsa gli avvii come faceva il vecchio avvio dei thread, per non concentrare le scritture
+        pianificatore.aggiungi(f"{sorgente}-{tipo}", partial(esegui_ciclo_sensore, sorgente, tipo, generatore), intervallo, ritardo_iniziale=i * 0.1)
+    pianificatore.aggiungi("produzione", simula_ciclo_produzione, INTERVALLO_PRODUZIONE_SECONDI)
+    pianificatore.aggiungi("soglie", controlla_soglie, INTERVALLO_CONTROLLO_SOGLIE_SECONDI)
+    pianificatore.aggiungi("statistiche", partial(log_statistiche, pianificatore), INTERVALLO_STATISTICHE_SECONDI, ritardo_iniziale=INTERVALLO_STATISTICHE_SECONDI)
+
+    def _interrompi(signum, frame): pianificatore.ferma()
+    signal.signal(signal.SIGINT, _interrompi)
+    signal.signal(signal.SIGTERM, _interrompi)
 
-    threads, sensori_da_simulare = [], []
-    for i in range(1, NUM_SERRE + 1): sensori_da_simulare.extend([(f"Serra_{i}", tipo, 5) for tipo in SENSORI_PER_SERRA])
-    for i in range(1, NUM_PESCINE + 1): sensori_da_simulare.extend([(f"Pesci_{i}", tipo, 7) for tipo in SENSORI_PER_PESCI])
-    for i in range(1, NUM_PANNELLI + 1): sensori_da_simulare.append((f"Pannello_{i}", "Produzione", 10))
-    
-    for sorgente, tipo, intervallo in sensori_da_simulare:
-        thread = threading.Thread(target=avvia_thread_sensore, args=(sorgente, tipo, intervallo), daemon=True)
-        threads.append(thread)
-    
-    threads.append(threading.Thread(target=avvia_thread_produzione, args=(15,), daemon=True))
-    
-    for t in threads: t.start(); time.sleep(0.1)
-    
-    log_system_message(f"Simulazione avviata. {len(threads)} thread attivi. Premi Ctrl+C per terminare.")
+    log_system_message(f"Simulazione avviata. {pianificatore.statistiche()['attivita']} attività pianificate. Premi Ctrl+C per terminare.")
     try:
-        while True: time.sleep(3600)
-    except KeyboardInterrupt:
-        log_system_message("\nSimulazione terminata.")
+        pianificatore.esegui()
+    finally:
+        log_statistiche(pianificatore)
+        ferma_compattazione()
+        ferma_ingestione()
+        motore.chiudi()
+        chiudi_database()
+        log_system_message("Simulazione terminata.")
+        ferma_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,20 +1,48 @@
 # simulazione/motore.py
 
 from datetime import datetime
-from config.classificatore import classifica_stato, get_azioni_correttive, azioni_correttive_to_json
-from infrastruttura.database import insert_misurazione, aggiorna_stato_attuale, insert_allarme
+from config.classificatore import classifica_stato, classificatore, nomi_stati, get_azioni_correttive
+from infrastruttura.contatori import contatori_stati
+from infrastruttura.database import CHIUSURA
+from infrastruttura.motori import motore_dati
 from infrastruttura.logger import log_misurazione, log_system_message
+from simulazione.allarmi import macchina_allarmi
 
-def esegui_ciclo_sensore(sorgente_id, tipo_sensore, generatore):
+def registra_transizioni(motore, transizioni):
+    """Scrive le transizioni di allarme e le annuncia nel log: una riga per apertura, cambio di livello o chiusura."""
+    if not transizioni: return
+    for sorgente_id, tipo_sensore, evento, stato, _, _ in transizioni:
+        if evento == CHIUSURA:
+            log_system_message(f"[ALLARME] {sorgente_id} | {tipo_sensore} rientrato in OK")
+        else:
+            log_system_message(f"[AZIONE] {sorgente_id} | {tipo_sensore} in {stato}. Suggerimenti: {'; '.join(get_azioni_correttive(tipo_sensore, stato))}")
+    motore.scrivi_transizioni_allarmi(transizioni)
+
+def esegui_ciclo_sensore(sorgente_id, tipo_sensore, generatore, timestamp=None):
     valore = generatore.genera()
     stato = classifica_stato(tipo_sensore, valore)
-    timestamp = datetime.now().isoformat()
-    log_misurazione(sorgente_id, tipo_sensore, valore, stato)
-    insert_misurazione(sorgente_id, tipo_sensore, valore, timestamp)
-    aggiorna_stato_attuale(sorgente_id, tipo_sensore, stato, timestamp)
-    if stato != "OK":
-        azioni = get_azioni_correttive(tipo_sensore, stato)
-        if azioni:
-            log_system_message(f"[AZIONE] {sorgente_id} | {tipo_sensore} in {stato}. Suggerimenti: {'; '.join(azioni)}")
-            azioni_json = azioni_correttive_to_json(tipo_sensore, stato)
-            insert_allarme(sorgente_id, tipo_sensore, stato, azioni_json, timestamp)
\ No newline at end of file
+    timestamp = timestamp or datetime.now().isoformat()
+    log_misurazione(sorgente_id, tipo_sensore, valore, stato, timestamp)
+    motore = motore_dati()
+    motore.scrivi_misurazione(sorgente_id, tipo_sensore, valore, timestamp)
+    motore.scrivi_stato(sorgente_id, tipo_sensore, stato, timestamp)
+    # Lo storico riceve solo i cambi di livello confermati, non una riga per ogni lettura fuori soglia
+    registra_transizioni(motore, macchina_allarmi().aggiorna([(sorgente_id, tipo_sensore)], [valore], timestamp))
+
+def esegui_ciclo_flotta(sensori, flotta, timestamp, ultimi_stati):
+    """
+    Variante massiva usata dal backfill: fa avanzare insieme tutti i sensori di una GeneratoreFlotta
+    (sensori è la lista (sorgente_id, tipo) nello stesso ordine) e accoda misurazioni e transizioni di allarme a blocchi.
+    Niente log per lettura; lo stato di ogni sensore finisce in ultimi_stati e chi chiama
+    scrive stati_attuali una volta sola a fine caricamento.
+    """
+    valori = flotta.genera()
+    # Un solo passaggio vettoriale per tutta la flotta, riusato dalla macchina degli allarmi
+    codici_stati = classificatore().classifica_batch([tipo for _, tipo in sensori], valori)
+    stati = nomi_stati(codici_stati).tolist()
+    for sensore, stato in zip(sensori, stati): ultimi_stati[sensore] = (stato, timestamp)
+    contatori_stati().aggiorna_molti(sensori, stati)
+    transizioni = macchina_allarmi().aggiorna(sensori, valori, timestamp, codici_stati)
+    motore = motore_dati()
+    motore.scrivi_misurazioni(sensori, valori.tolist(), timestamp)
+    if transizioni: motore.scrivi_transizioni_allarmi(transizioni)
@@ -0,0 +1,135 @@
+# simulazione/pianificatore.py
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from infrastruttura.logger import log_system_message
+
+RITARDO_DOPO_ERRORE_SECONDI = 60
+
+class _Attivita:
+    __slots__ = ("nome", "funzione", "intervallo", "in_corso", "esecuzioni", "saltate")
+
+    def __init__(self, nome, funzione, intervallo):
+        self.nome, self.funzione, self.intervallo = nome, funzione, intervallo
+        self.in_corso, self.esecuzioni, self.saltate = False, 0, 0
+
+class Pianificatore:
+    """
+    Scheduler a scadenze su un unico thread: le attività periodiche stanno in un min-heap ordinato
+    per scadenza e il ciclo dorme solo fino alla prossima. La scadenza successiva è calcolata dalla
+    precedente (non da "adesso"), quindi gli intervalli non accumulano deriva.
+    Con num_worker > 0 le attività vengono eseguite su un pool di thread (utile se fanno I/O);
+    altrimenti direttamente nel ciclo.
+    """
+    def __init__(self, num_worker=0):
+        self._heap, self._sequenza = [], itertools.count()
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=num_worker, thread_name_prefix="pianificatore") if num_worker else None
+        self._stats_lock = threading.Lock()
+        self._campioni, self._media_ritardo, self._m2_ritardo, self._ritardo_massimo = 0, 0.0, 0.0, 0.0
+
+    def adesso(self):
+        return time.monotonic()
+
+    def attendi(self, secondi):
+        """Attende fino a `secondi`; restituisce True se nel frattempo è stato chiesto lo stop."""
+        return self._stop.wait(secondi)
+
+    def datetime_corrente(self):
+        """Data e ora da usare come timestamp delle misurazioni."""
+        return datetime.now()
+
+    def aggiungi(self, nome, funzione, intervallo_secondi, ritardo_iniziale=0.0):
+        attivita = _Attivita(nome, funzione, intervallo_secondi)
+        heapq.heappush(self._heap, (self.adesso() + ritardo_iniziale, next(self._sequenza), attivita))
+
+    def ferma(self):
+        self._stop.set()
+
+    def in_esecuzione(self):
+        return not self._stop.is_set()
+
+    def esegui(self):
+        """Esegue le attività finché non viene chiamato ferma(); poi attende i worker e ritorna."""
+        try:
+            while self._heap and not self._stop.is_set():
+                scadenza, _, attivita = self._heap[0]
+                attesa = scadenza - self.adesso()
+                if attesa > 0 and self.attendi(attesa): break
+                heapq.heappop(self._heap)
+                self._registra_ritardo(self.adesso() - scadenza)
+                prossima = scadenza + attivita.intervallo
+                if attivita.in_corso:
+                    attivita.saltate += 1  # L'esecuzione precedente (su un worker) non è ancora finita
+                elif self._pool:
+                    attivita.in_corso = True
+                    self._pool.submit(self._esegui_attivita, attivita)
+                elif not self._esegui_attivita(attivita):
+                    prossima = self.adesso() + RITARDO_DOPO_ERRORE_SECONDI
+                if prossima < self.adesso() - attivita.intervallo:
+                    prossima = self.adesso() + attivita.intervallo  # Troppo indietro: si riallinea invece di recuperare a raffica
+                heapq.heappush(self._heap, (prossima, next(self._sequenza), attivita))
+        finally:
+            if self._pool: self._pool.shutdown(wait=True)
+
+    def _esegui_attivita(self, attivita):
+        try:
+            attivita.funzione()
+            attivita.esecuzioni += 1
+            return True
+        except Exception as e:
+            log_system_message(f"[ERRORE] Attività {attivita.nome}: {e}")
+            return False
+        finally:
+            attivita.in_corso = False
+
+    def _registra_ritardo(self, ritardo):
+        ritardo = max(0.0, ritardo)
+        with self._stats_lock:
+            self._campioni += 1
+            delta = ritardo - self._media_ritardo
+            self._media_ritardo += delta / self._campioni
+            self._m2_ritardo += delta * (ritardo - self._media_ritardo)
+            self._ritardo_massimo = max(self._ritardo_massimo, ritardo)
+
+    def statistiche(self):
+        """Ritardo medio/massimo rispetto alle scadenze (lag) e sua deviazione standard (jitter), in ms."""
+        with self._stats_lock:
+            jitter = math.sqrt(self._m2_ritardo / self._campioni) if self._campioni > 1 else 0.0
+            stats = {"esecuzioni": self._campioni, "ritardo_medio_ms": self._media_ritardo * 1000,
+                     "ritardo_massimo_ms": self._ritardo_massimo * 1000, "jitter_ms": jitter * 1000}
+        stats["attivita"] = len(self._heap)
+        stats["saltate"] = sum(attivita.saltate for _, _, attivita in self._heap)
+        return stats
+
+
+class PianificatoreVirtuale(Pianificatore):
+    """
+    Pianificatore su orologio simulato, usato per il backfill dello storico.
+    Il tempo parte da `inizio` e salta direttamente alla scadenza successiva: con velocita=None
+    non dorme mai (massima velocità), altrimenti ogni secondo simulato dura 1/velocita secondi reali.
+    Si ferma da solo quando l'orologio raggiunge `fine`. Le attività girano sempre nel ciclo
+    (niente pool), altrimenti i timestamp non seguirebbero l'orologio virtuale.
+    """
+    def __init__(self, inizio, fine, velocita=None):
+        super().__init__(num_worker=0)
+        self.inizio, self.velocita = inizio, velocita
+        self._durata, self._secondi_simulati = (fine - inizio).total_seconds(), 0.0
+
+    def adesso(self):
+        return self._secondi_simulati
+
+    def attendi(self, secondi):
+        if self._secondi_simulati + secondi > self._durata:
+            self._stop.set(); return True
+        if self.velocita and self._stop.wait(secondi / self.velocita): return True
+        self._secondi_simulati += secondi
+        return self._stop.is_set()
+
+    def datetime_corrente(self):
+        return self.inizio + timedelta(seconds=self._secondi_simulati)
@@ -0,0 +1,149 @@
+# simulazione/shard.py
+"""
+Backfill su più processi, per usare tutti i core invece di uno solo (GIL).
+
+Le sorgenti dell'impianto (Serra_*, Pesci_*, Pannello_*) sono divise tra N processi shard; ognuno ha il
+proprio orologio virtuale, le proprie GeneratoreFlotta e la propria macchina degli allarmi (ogni sensore
+appartiene a un solo shard). Gli shard non aprono SQLite: scrivono su un MotoreCanale, che spedisce al
+processo principale blocchi di righe compatte con i rollup già pre-aggregati, e il principale li accoda
+all'unica coda di ingestione. Il modello di produzione gira nel principale, seguendo lo shard più
+indietro e con i contatori degli stati sommati su tutti gli shard.
+"""
+
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from datetime import datetime, timedelta
+from functools import partial
+from multiprocessing.connection import wait
+import numpy as np
+from infrastruttura.contatori import efficienza, EFFICIENZA_PREDEFINITA
+from infrastruttura.database import ids_sensori, QUERY_INSERT_MISURAZIONE, QUERY_AGGIORNA_STATO
+from infrastruttura.ingestione import accoda_blocco, accoda_transizioni_allarmi
+from infrastruttura.logger import log_system_message
+from infrastruttura.motori import MotoreCanale, MotoreSQLite, imposta_motore_dati
+from simulazione.allarmi import macchina_allarmi
+from simulazione.generatori import GeneratoreFlotta, crea_generatore
+from simulazione.motore import esegui_ciclo_flotta
+from simulazione.pianificatore import PianificatoreVirtuale
+from simulazione.produzione import simula_ciclo_produzione
+
+TIMEOUT_CHIUSURA_SHARD_SECONDI = 10
+
+def partiziona_sorgenti(sensori, num_shard):
+    """
+    Divide i sensori (sorgente_id, tipo, intervallo) in al più num_shard gruppi senza separare le sorgenti,
+    bilanciando le letture al secondo: ogni sorgente, dalla più pesante, va allo shard più scarico.
+    """
+    per_sorgente = {}
+    for sensore in sensori: per_sorgente.setdefault(sensore[0], []).append(sensore)
+    letture_al_secondo = lambda gruppo: sum(1 / intervallo for _, _, intervallo in gruppo)
+    shard, carichi = [[] for _ in range(min(num_shard, len(per_sorgente)))], [0.0] * min(num_shard, len(per_sorgente))
+    for gruppo in sorted(per_sorgente.values(), key=letture_al_secondo, reverse=True):
+        i = carichi.index(min(carichi))
+        shard[i].extend(gruppo); carichi[i] += letture_al_secondo(gruppo)
+    return shard
+
+def esegui_shard(sensori, ids, inizio, fine, velocita, aperti, connessione):
+    """Corpo di un processo shard: genera lo storico dei suoi sensori, lo spedisce sulla pipe e chiude con le statistiche."""
+    try:
+        motore = imposta_motore_dati(MotoreCanale(connessione, ids))
+        macchina_allarmi().ripristina(aperti)
+        pianificatore = PianificatoreVirtuale(inizio, fine, velocita)
+        signal.signal(signal.SIGINT, lambda signum, frame: pianificatore.ferma())
+        ultimi_stati, gruppi = {}, {}
+        for sorgente, tipo, intervallo in sensori: gruppi.setdefault(intervallo, []).append((sorgente, tipo))
+
+        def ciclo_gruppo(gruppo, flotta):
+            esegui_ciclo_flotta(gruppo, flotta, pianificatore.datetime_corrente().isoformat(), ultimi_stati)
+
+        for intervallo, gruppo in gruppi.items():
+            flotta = GeneratoreFlotta.da_generatori([crea_generatore(tipo) for _, tipo in gruppo])
+            pianificatore.aggiungi(f"flotta-{intervallo}s", partial(ciclo_gruppo, gruppo, flotta), intervallo)
+        inizio_reale, inizio_cpu = time.perf_counter(), time.process_time()
+        pianificatore.esegui()
+        for (sorgente, tipo), (stato, timestamp) in ultimi_stati.items(): motore.scrivi_stato(sorgente, tipo, stato, timestamp)
+        motore.chiudi()
+        connessione.send(("fine", {"sensori": len(sensori), "righe": motore.righe_inviate,
+                                   "secondi": time.perf_counter() - inizio_reale, "secondi_cpu": time.process_time() - inizio_cpu}))
+    except Exception:
+        connessione.send(("errore", traceback.format_exc()))
+    finally:
+        connessione.close()
+
+def esegui_backfill_parallelo(sensori, durata, num_shard=0, velocita=None, intervallo_produzione=15):
+    """
+    Come main.esegui_backfill, ma con i sensori (sorgente_id, tipo, intervallo) divisi su num_shard
+    processi (0 = uno per core). Va chiamata con la coda di ingestione attiva; restituisce la durata
+    reale in secondi e scrive nel log le statistiche di ogni shard.
+    """
+    fine = datetime.now()
+    inizio = fine - durata
+    partizioni = partiziona_sorgenti(sensori, num_shard or os.cpu_count() or 1)
+    coppie = [(sorgente, tipo) for sorgente, tipo, _ in sensori]
+    ids = dict(zip(coppie, ids_sensori(coppie)))  # I dizionari si scrivono solo qui: gli shard ricevono gli id
+    aperti = MotoreSQLite().allarmi_aperti()
+
+    # Il principale ha già dei thread attivi (log, ingestione): con fork potrebbero restare lock presi nei figli
+    contesto = multiprocessing.get_context("spawn")
+    processi, connessioni = [], {}
+    for indice, partizione in enumerate(partizioni):
+        sorgenti = {sorgente for sorgente, _, _ in partizione}
+        aperti_shard = aperti[aperti["sorgente_id"].isin(sorgenti)]
+        ricezione, invio = contesto.Pipe(duplex=False)
+        processo = contesto.Process(target=esegui_shard, name=f"shard-{indice}", daemon=True,
+                                    args=(partizione, {sensore: ids[sensore] for sensore in ids if sensore[0] in sorgenti},
+                                          inizio, fine, velocita, aperti_shard if not aperti_shard.empty else None, invio))
+        processo.start()
+        invio.close()  # Così recv() segnala EOFError se lo shard muore
+        processi.append(processo); connessioni[ricezione] = indice
+    log_system_message(f"[BACKFILL] {len(partizioni)} shard: " + ", ".join(f"{i}: {len(p)} sensori" for i, p in enumerate(partizioni)))
+
+    orologi, conteggi, statistiche = [inizio] * len(partizioni), [None] * len(partizioni), {}
+    prossima_produzione = inizio
+    gestore_sigint = signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C arriva anche agli shard, che si fermano da soli
+    inizio_reale = time.perf_counter()
+    try:
+        while connessioni:
+            for connessione in wait(list(connessioni)):
+                indice = connessioni[connessione]
+                try:
+                    messaggio = connessione.recv()
+                except EOFError:
+                    messaggio = ("errore", "processo terminato senza statistiche")
+                if messaggio[0] == "blocco":
+                    _, righe, rollup, stati, transizioni, ultimo_timestamp, conteggi[indice] = messaggio
+                    accoda_blocco(QUERY_INSERT_MISURAZIONE, righe, rollup)  # Un solo blocco: righe e rollup nella stessa transazione
+                    accoda_blocco(QUERY_AGGIORNA_STATO, stati)
+                    if transizioni: accoda_transizioni_allarmi(transizioni)
+                    if ultimo_timestamp: orologi[indice] = datetime.fromisoformat(ultimo_timestamp)
+                    continue
+                if messaggio[0] == "fine": statistiche[indice] = messaggio[1]
+                else: log_system_message(f"[SHARD {indice}] Errore: {messaggio[1]}")
+                orologi[indice] = fine
+                del connessioni[connessione]
+            # Produzione fino al punto raggiunto da tutti gli shard, con l'efficienza dell'intero impianto
+            while prossima_produzione <= min(orologi):
+                noti = [c for c in conteggi if c is not None]
+                simula_ciclo_produzione(prossima_produzione.isoformat(), efficienza(np.sum(noti, axis=0)) if noti else EFFICIENZA_PREDEFINITA, silenzioso=True)
+                prossima_produzione += timedelta(seconds=intervallo_produzione)
+    except BaseException:
+        # Nessuno legge più le pipe: uno shard bloccato in send() non uscirebbe da solo
+        for connessione in connessioni: connessione.close()
+        for processo in processi: processo.terminate()
+        raise
+    finally:
+        signal.signal(signal.SIGINT, gestore_sigint)
+        for processo in processi:
+            processo.join(TIMEOUT_CHIUSURA_SHARD_SECONDI)
+            if processo.is_alive(): processo.kill(); processo.join()
+    durata_reale = time.perf_counter() - inizio_reale
+
+    for indice, s in sorted(statistiche.items()):
+        log_system_message(f"[SHARD {indice}] {s['sensori']} sensori, {s['righe']} letture in {s['secondi']:.1f} s "
+                           f"({s['righe'] / max(s['secondi'], 1e-9):,.0f} letture/s, CPU {s['secondi_cpu'] / max(s['secondi'], 1e-9):.0%})")
+    letture = sum(s["righe"] for s in statistiche.values())
+    log_system_message(f"[BACKFILL] {len(partizioni)} shard: {letture} letture in {durata_reale:.1f} s ({letture / max(durata_reale, 1e-9):,.0f} letture/s)")
+    return durata_reale
@@ -0,0 +1,13 @@
+# tests/conftest.py
+
+import pytest
+from infrastruttura import database
+
+@pytest.fixture
+def db_temporaneo(tmp_path, monkeypatch):
+    """infrastruttura.database su un file nuovo in tmp_path, con lo schema già impostato."""
+    database.chiudi_database()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    database.setup_database()
+    yield database.DB_PATH
+    database.chiudi_database()
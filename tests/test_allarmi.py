@@ -0,0 +1,49 @@
+# tests/test_allarmi.py
+
+import pandas as pd
+from simulazione.allarmi import MacchinaAllarmi
+from infrastruttura.database import APERTURA, AGGIORNAMENTO, CHIUSURA
+
+SENSORE = ("Serra_1", "Temperatura")  # OK (22, 28), WARNING (20, 30), isteresi 0.3, debounce 2
+
+def _eventi(macchina, valori):
+    eventi = []
+    for i, valore in enumerate(valori):
+        eventi += [(evento, stato) for _, _, evento, stato, _, _ in macchina.aggiorna([SENSORE], [valore], f"2025-01-01T00:00:{i:02d}")]
+    return eventi
+
+def test_apertura_e_chiusura_dopo_il_debounce():
+    macchina = MacchinaAllarmi()
+    assert _eventi(macchina, [29.0]) == []
+    assert _eventi(macchina, [29.0]) == [(APERTURA, "WARNING")]
+    assert macchina.aperti() == {SENSORE: ("WARNING", "2025-01-01T00:00:00")}
+    assert _eventi(macchina, [25.0, 25.0]) == [(CHIUSURA, "OK")]
+    assert macchina.aperti() == {}
+
+def test_lettura_isolata_non_apre():
+    assert _eventi(MacchinaAllarmi(), [29.0, 25.0, 29.0, 25.0]) == []
+
+def test_isteresi_trattiene_la_chiusura():
+    macchina = MacchinaAllarmi()
+    _eventi(macchina, [29.0, 29.0])
+    assert _eventi(macchina, [27.9, 27.9, 27.9]) == []  # Dentro OK ma non oltre l'isteresi (27.7)
+    assert _eventi(macchina, [27.5, 27.5]) == [(CHIUSURA, "OK")]
+
+def test_oscillazione_tra_warning_e_critical_apre():
+    macchina = MacchinaAllarmi()
+    assert _eventi(macchina, [29.5, 30.5, 29.5, 30.5]) == [(APERTURA, "WARNING")]
+    assert _eventi(macchina, [30.5, 30.5]) == [(AGGIORNAMENTO, "CRITICAL")]
+
+def test_oscillazione_tra_ok_e_warning_scende():
+    macchina = MacchinaAllarmi()
+    assert _eventi(macchina, [31.0, 31.0]) == [(APERTURA, "CRITICAL")]
+    assert _eventi(macchina, [25.0, 29.0]) == [(AGGIORNAMENTO, "WARNING")]
+    assert _eventi(macchina, [25.0, 25.0]) == [(CHIUSURA, "OK")]
+
+def test_ripristina_non_riapre():
+    macchina = MacchinaAllarmi()
+    macchina.ripristina(pd.DataFrame([(*SENSORE, "CRITICAL", "[]", "2024-12-31T23:00:00")],
+                                     columns=["sorgente_id", "tipo", "stato", "azioni", "aperto_il"]))
+    assert _eventi(macchina, [31.0, 31.0]) == []
+    assert macchina.aperti() == {SENSORE: ("CRITICAL", "2024-12-31T23:00:00")}
+    assert _eventi(macchina, [25.0, 25.0]) == [(CHIUSURA, "OK")]
@@ -0,0 +1,14 @@
+# tests/test_avvio.py
+
+import pytest
+from benchmarks.avvio import IMPORT_DIFFERITI, bench_avvio_a_freddo, bench_import, fuori_budget, tempi_import
+
+@pytest.mark.parametrize("modulo", list(IMPORT_DIFFERITI))
+def test_import_differiti_non_caricati(modulo):
+    tempi = tempi_import(modulo)
+    assert modulo in tempi
+    assert [nome for nome in IMPORT_DIFFERITI[modulo] if nome in tempi] == []
+
+@pytest.mark.slow
+def test_avvio_nei_budget():
+    assert fuori_budget(bench_import(), bench_avvio_a_freddo()) == []
@@ -0,0 +1,109 @@
+# tests/test_cache.py
+
+import threading
+import pytest
+from dashboard.utils import cache
+from infrastruttura.database import execute_query, QUERY_AGGIORNA_STATO
+
+class _Orologio:
+    def __init__(self): self.adesso = 1000.0
+    def __call__(self): return self.adesso
+
+@pytest.fixture
+def orologio(monkeypatch):
+    orologio = _Orologio()
+    monkeypatch.setattr(cache.time, "monotonic", orologio)
+    return orologio
+
+def _caricatore():
+    chiamate = []
+    def carica():
+        chiamate.append(1)
+        return {"valore": len(chiamate)}
+    return chiamate, carica
+
+def test_ttl_scade(db_temporaneo, orologio):
+    c = cache.CacheQuery(ttl=10)
+    chiamate, carica = _caricatore()
+    assert c.ottieni(("k",), (), carica) == {"valore": 1}
+    orologio.adesso += 9.9
+    assert c.ottieni(("k",), (), carica) == {"valore": 1}
+    orologio.adesso += 0.2
+    assert c.ottieni(("k",), (), carica) == {"valore": 2}
+    c.ottieni(("breve",), (), carica, ttl=1)
+    orologio.adesso += 1
+    c.ottieni(("breve",), (), carica)  # Il TTL per voce prevale su quello della cache
+    assert len(chiamate) == 4
+
+def test_invalidata_dalle_versioni(db_temporaneo, orologio):
+    c = cache.CacheQuery(intervallo_versioni=0.5)
+    chiamate, carica = _caricatore()
+    c.ottieni(("k",), ("stati_attuali",), carica)
+    execute_query(QUERY_AGGIORNA_STATO, ("Serra_1", "pH", "OK", "2025-01-01T00:00:00"))
+    c.ottieni(("k",), ("stati_attuali",), carica)  # Versioni non ancora rilette: ancora valida
+    assert len(chiamate) == 1
+    orologio.adesso += 0.5
+    c.ottieni(("k",), ("stati_attuali",), carica)
+    c.ottieni(("altra",), ("storico_allarmi",), carica)
+    orologio.adesso += 0.5
+    execute_query(QUERY_AGGIORNA_STATO, ("Serra_1", "pH", "WARNING", "2025-01-01T00:00:01"))
+    c.ottieni(("altra",), ("storico_allarmi",), carica)  # Tabella diversa: nessuna rilettura
+    assert len(chiamate) == 3
+
+def test_copie_e_lru(db_temporaneo):
+    c = cache.CacheQuery(max_voci=2)
+    chiamate, carica = _caricatore()
+    c.ottieni(("a",), (), carica)["valore"] = -1  # Il chiamante modifica la sua copia
+    assert c.ottieni(("a",), (), carica) == {"valore": 1}
+    c.ottieni(("b",), (), carica)
+    c.ottieni(("a",), (), carica)  # "a" diventa la più recente: esce "b"
+    c.ottieni(("c",), (), carica)
+    c.ottieni(("a",), (), carica)
+    assert len(chiamate) == 3 and c.statistiche()["scartate"] == 1
+    c.ottieni(("b",), (), carica)
+    assert len(chiamate) == 4
+
+def _in_parallelo(c, carica, quanti):
+    risultati = [None] * quanti
+    def richiedi(i):
+        try: risultati[i] = c.ottieni(("k",), (), carica)
+        except RuntimeError as e: risultati[i] = e
+    threads = [threading.Thread(target=richiedi, args=(i,)) for i in range(quanti)]
+    for t in threads: t.start()
+    return threads, risultati
+
+def _attendi_attese(c, quante):
+    for _ in range(500):
+        if c.statistiche()["attese"] == quante: return
+        threading.Event().wait(0.01)
+    raise AssertionError("I thread non si sono messi in attesa")
+
+def test_single_flight(db_temporaneo):
+    c = cache.CacheQuery()
+    via, chiamate = threading.Event(), []
+    def carica():
+        chiamate.append(1)
+        via.wait(5)
+        return {"valore": len(chiamate)}
+    threads, risultati = _in_parallelo(c, carica, 8)
+    _attendi_attese(c, 7)
+    via.set()
+    for t in threads: t.join(5)
+    assert len(chiamate) == 1 and risultati == [{"valore": 1}] * 8
+
+def test_single_flight_caricamento_fallito(db_temporaneo):
+    c = cache.CacheQuery()
+    via, chiamate = threading.Event(), []
+    def carica():
+        chiamate.append(1)
+        if len(chiamate) == 1:
+            via.wait(5)
+            raise RuntimeError("database occupato")
+        return "ok"
+    threads, risultati = _in_parallelo(c, carica, 4)
+    _attendi_attese(c, 3)
+    via.set()
+    for t in threads: t.join(5)
+    # Chi ha avviato il caricamento vede l'errore, gli altri riprovano in proprio
+    assert sum(isinstance(r, RuntimeError) for r in risultati) == 1 and risultati.count("ok") == 3
+    assert len(chiamate) == 4
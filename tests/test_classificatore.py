@@ -0,0 +1,9 @@
+# tests/test_classificatore.py
+
+import subprocess
+import sys
+
+def test_config_non_importa_infrastruttura():
+    codice = "import sys, config.classificatore; print(sorted(m for m in sys.modules if m.split('.')[0] == 'infrastruttura'))"
+    risultato = subprocess.run([sys.executable, "-c", codice], capture_output=True, text=True, check=True)
+    assert risultato.stdout.strip() == "[]"
@@ -0,0 +1,53 @@
+# tests/test_contatori.py
+
+import numpy as np
+from config.classificatore import CRITICAL, OK, UNKNOWN, WARNING
+from infrastruttura.contatori import ContatoriStati, EFFICIENZA_PREDEFINITA, SOTTOSISTEMI, riepilogo
+
+SERRE, PESCI, PANNELLI, ALTRI = range(len(SOTTOSISTEMI))
+
+def test_aggiorna_sposta_il_sensore_tra_gli_stati():
+    contatori = ContatoriStati()
+    contatori.aggiorna("Serra_1", "pH", "OK")
+    contatori.aggiorna("Serra_1", "pH", "OK")  # Stato invariato: nessun doppio conteggio
+    contatori.aggiorna("Pesci_1", "Ossigeno", "CRITICAL")
+    contatori.aggiorna("Serra_1", "pH", "WARNING")
+    contatori.aggiorna("Meteo_1", "Vento", "boh")
+    atteso = np.zeros_like(contatori.conteggi)
+    atteso[SERRE, WARNING] = atteso[PESCI, CRITICAL] = atteso[ALTRI, UNKNOWN] = 1
+    np.testing.assert_array_equal(contatori.conteggi, atteso)
+    assert contatori.conteggi.sum() == 3  # Un sensore, un conteggio
+
+def test_ricostruisci_coincide_con_gli_aggiornamenti():
+    storia = [("Serra_1", "pH", "OK"), ("Serra_2", "pH", "WARNING"), ("Serra_1", "pH", "CRITICAL"), ("Pannello_1", "Produzione", "OK"), ("Serra_2", "pH", "OK")]
+    incrementale = ContatoriStati()
+    incrementale.aggiorna_molti([(s, t) for s, t, _ in storia], [stato for _, _, stato in storia])
+    ricostruiti = ContatoriStati()
+    ricostruiti.aggiorna("Pesci_9", "pH", "CRITICAL")  # Sparisce: ricostruisci riparte da zero
+    ricostruiti.ricostruisci([("Serra_1", "pH", "CRITICAL"), ("Serra_2", "pH", "OK"), ("Pannello_1", "Produzione", "OK")])
+    np.testing.assert_array_equal(ricostruiti.conteggi, incrementale.conteggi)
+    assert riepilogo(ricostruiti.conteggi) == {"serre": {"OK": 1, "WARNING": 0, "CRITICAL": 1, "UNKNOWN": 0},
+                                               "pannelli": {"OK": 1, "WARNING": 0, "CRITICAL": 0, "UNKNOWN": 0}}
+
+def test_efficienza_e_collega():
+    contatori = ContatoriStati()
+    assert contatori.efficienza() == EFFICIENZA_PREDEFINITA
+    contatori.aggiorna_molti([("Serra_1", "pH"), ("Serra_2", "pH"), ("Pesci_1", "pH")], ["OK", "WARNING", "OK"])
+    assert contatori.efficienza() == 2 / 3
+    assert contatori.efficienza(["serre"]) == 0.5
+    condivisi = np.zeros_like(contatori.conteggi)
+    contatori.collega(condivisi)
+    contatori.aggiorna("Serra_2", "pH", "OK")
+    assert condivisi[SERRE, OK] == 2 and condivisi[SERRE, WARNING] == 0
+    contatori.scollega()
+    contatori.aggiorna("Serra_2", "pH", "CRITICAL")
+    assert condivisi[SERRE, CRITICAL] == 0  # Dopo scollega l'array esterno non viene più toccato
+
+def test_riconcilia_da_stati_attuali(db_temporaneo):
+    from infrastruttura.contatori import contatori_stati
+    from infrastruttura.database import execute_query, riconcilia_contatori_stati, QUERY_AGGIORNA_STATO
+    execute_query(QUERY_AGGIORNA_STATO, ("Serra_1", "pH", "WARNING", "2025-01-01T00:00:00"))
+    execute_query(QUERY_AGGIORNA_STATO, ("Pesci_1", "Ossigeno", "OK", "2025-01-01T00:00:00"))
+    riconcilia_contatori_stati()
+    assert riepilogo(contatori_stati().conteggi) == {"serre": {"OK": 0, "WARNING": 1, "CRITICAL": 0, "UNKNOWN": 0},
+                                                     "pesci": {"OK": 1, "WARNING": 0, "CRITICAL": 0, "UNKNOWN": 0}}
@@ -0,0 +1,39 @@
+# tests/test_export.py
+
+import pytest
+from infrastruttura.database import insert_misurazione
+from infrastruttura.export import blocchi_export
+
+pytest.importorskip("pyarrow")
+
+def test_export_misurazioni_include_archivio(db_temporaneo, tmp_path):
+    from datetime import datetime
+    from infrastruttura.archivio import Archiviatore
+    for giorno, valore in ((1, 7.0), (2, 7.1), (3, 7.2)):
+        insert_misurazione("Serra_1", "pH", valore, f"2025-01-0{giorno}T12:00:00")
+    archivio = str(tmp_path / "archivio")
+    righe, _, eliminate = Archiviatore(percorso=archivio, dopo_giorni=1).esegui_passata(adesso=datetime(2025, 1, 4, 12))
+    assert (righe, eliminate) == (2, 2)  # Il 3 gennaio resta in SQLite
+    esportate = [riga for blocco in blocchi_export("misurazioni", archivio=archivio) for riga in blocco]
+    assert [(t[:10], v) for t, _, _, v in esportate] == [("2025-01-01", 7.0), ("2025-01-02", 7.1), ("2025-01-03", 7.2)]
+    filtrate = [riga for blocco in blocchi_export("misurazioni", inizio="2025-01-02", fine="2025-01-03T12:00", archivio=archivio) for riga in blocco]
+    assert [v for *_, v in filtrate] == [7.1]
+
+def test_parti_orfane_eliminate_alla_passata_successiva(db_temporaneo, tmp_path, monkeypatch):
+    import glob, os
+    from datetime import datetime
+    from infrastruttura import archivio as modulo_archivio
+    for giorno in (1, 2, 3):
+        insert_misurazione("Serra_1", "pH", 7.0, f"2025-01-0{giorno}T12:00:00")
+    archivio = str(tmp_path / "archivio")
+    archiviatore = modulo_archivio.Archiviatore(percorso=archivio, dopo_giorni=1)
+    def crash(*args): raise OSError("crash prima del manifest")
+    with monkeypatch.context() as patch:
+        patch.setattr(modulo_archivio, "_salva_manifest", crash)
+        with pytest.raises(OSError): archiviatore.esegui_passata(adesso=datetime(2025, 1, 4, 12))
+    assert len(glob.glob(os.path.join(archivio, "**", "*.parquet"), recursive=True)) == 2  # Orfane: nessun manifest
+    insert_misurazione("Serra_1", "pH", 7.1, "2025-01-03T13:00:00")  # Nuovo max_id: i nomi delle parti cambiano
+    assert archiviatore.esegui_passata(adesso=datetime(2025, 1, 4, 12))[0] == 2
+    su_disco = {os.path.relpath(f, archivio) for f in glob.glob(os.path.join(archivio, "**", "*.parquet"), recursive=True)}
+    assert su_disco == {voce["percorso"] for voce in modulo_archivio.leggi_manifest(archivio)["file"]}
+    assert sum(len(blocco) for blocco in blocchi_export("misurazioni", archivio=archivio)) == 4
@@ -0,0 +1,25 @@
+# tests/test_flusso.py
+
+from dashboard.utils import flusso
+from infrastruttura.database import insert_misurazione
+
+def _scrivi(quante, inizio=0):
+    for i in range(inizio, inizio + quante): insert_misurazione("Serra_1", "pH", 7.0, f"2025-01-01T00:00:{i:02d}")
+
+def test_recupero_limitato_dopo_periodo_senza_iscritti(db_temporaneo, monkeypatch):
+    monkeypatch.setattr(flusso, "MAX_RIGHE_RECUPERO", 3)
+    diffusore = flusso.DiffusoreMisurazioni(intervallo=3600)  # Il thread non fa giri durante il test
+    _scrivi(5)
+    primo = diffusore.iscrivi("tipo", "pH", dopo_id=5)
+    assert primo.coda.empty()
+    diffusore.disiscrivi(primo)
+    _scrivi(10, inizio=5)  # Scritte senza nessun iscritto
+    secondo = diffusore.iscrivi("tipo", "pH", dopo_id=0)
+    ultimo_id, punti = secondo.coda.get_nowait()
+    assert ultimo_id == 15 and len(punti) == 3  # Solo le più recenti, dalla posizione riletta adesso
+
+def test_lettura_limitata_per_giro(db_temporaneo, monkeypatch):
+    monkeypatch.setattr(flusso, "MAX_RIGHE_RECUPERO", 4)
+    _scrivi(10)
+    righe = flusso.DiffusoreMisurazioni()._leggi(0)
+    assert [riga[0] for riga in righe] == [1, 2, 3, 4]
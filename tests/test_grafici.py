@@ -0,0 +1,55 @@
+# tests/test_grafici.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from dashboard.utils.grafici import indici_lttb, indici_m4, riduci_punti
+
+def _serie(n=10_000, seme=0):
+    rng = np.random.default_rng(seme)
+    x = np.cumsum(rng.integers(1, 5, n))  # Campionamento irregolare
+    y = np.cumsum(rng.normal(size=n))
+    picchi = [n // 8, n * 4 // 7]
+    y[picchi] = y.max() + 50, y.min() - 50  # Picchi isolati
+    return x, y, picchi
+
+def test_m4_tiene_estremi_di_ogni_colonna():
+    x, y, picchi = _serie()
+    indici = indici_m4(x, y, 400)
+    assert len(indici) <= 400 and np.all(np.diff(indici) > 0)
+    assert {0, len(x) - 1, *picchi} <= set(indici)
+    colonna = np.minimum((x - x[0]) * 100 // (x[-1] - x[0]), 99)
+    for c in np.unique(colonna):
+        nella_colonna = np.flatnonzero(colonna == c)
+        tenuti = np.intersect1d(indici, nella_colonna)
+        assert tenuti[0] == nella_colonna[0] and tenuti[-1] == nella_colonna[-1]
+        assert y[tenuti].min() == y[nella_colonna].min() and y[tenuti].max() == y[nella_colonna].max()
+
+def test_m4_asse_costante():
+    indici = indici_m4(np.zeros(10), np.arange(10.0)[::-1], 8)
+    assert list(indici) == [0, 9]  # Una sola colonna: primo/massimo e ultimo/minimo
+
+@pytest.mark.parametrize("punti", [3, 50, 999])
+def test_lttb_estremi_e_numero_di_punti(punti):
+    x, y, picchi = _serie()
+    indici = indici_lttb(x, y, punti)
+    assert len(indici) == punti and np.all(np.diff(indici) > 0)
+    assert indici[0] == 0 and indici[-1] == len(x) - 1
+    if punti >= 50:
+        assert set(picchi) <= set(indici)  # Il triangolo più grande del bucket è sul picco
+
+def test_lttb_pochi_punti_restano_tutti():
+    x, y, _ = _serie(n=20)
+    assert list(indici_lttb(x, y, 20)) == list(range(20))
+    assert list(indici_lttb(x, y, 2)) == list(range(20))
+
+@pytest.mark.parametrize("metodo", ["m4", "lttb"])
+def test_riduci_punti_tiene_interruzioni_e_cambi_di_stato(metodo):
+    _, y, _ = _serie(n=5000)
+    y[2000] = np.nan
+    stato = np.where(np.arange(5000) < 3000, "OK", "WARNING")
+    df = pd.DataFrame({"timestamp": pd.date_range("2025-01-01", periods=5000, freq="s"), "valore": y,
+                       "stato": stato, "sorgente_id": "Serra_1", "tipo": "pH"})
+    ridotto = riduci_punti(df, punti_massimi=200, metodo=metodo)
+    assert len(ridotto) < 300 and ridotto.index.is_monotonic_increasing
+    assert {0, 2000, 2999, 3000, 4999} <= set(ridotto.index)
@@ -0,0 +1,62 @@
+# tests/test_ingestione.py
+
+from infrastruttura.database import (connessione_lettura, esegui_batch, gruppi_transizioni_allarmi, ids_sensori, registra_transizioni_allarmi, righe_rollup,
+                                     APERTURA, CHIUSURA, QUERY_INSERT_MISURAZIONE)
+from infrastruttura.migrazioni import RISOLUZIONI_ROLLUP
+from infrastruttura.ingestione import CodaIngestione
+
+_TRANSIZIONI = [("Serra_1", "pH", APERTURA, "WARNING", "[]", "2025-01-01T00:00:00"),
+                ("Serra_1", "pH", CHIUSURA, "OK", "[]", "2025-01-01T00:00:01"),
+                ("Serra_1", "pH", APERTURA, "CRITICAL", "[]", "2025-01-01T00:00:02")]
+
+def _allarmi():
+    with connessione_lettura() as conn:
+        storico = conn.execute("SELECT evento, stato FROM storico_allarmi ORDER BY id").fetchall()
+        aperti = conn.execute("SELECT sorgente_id, tipo, stato, aperto_il FROM allarmi_aperti").fetchall()
+    return storico, aperti
+
+def _verifica_riapertura():
+    storico, aperti = _allarmi()
+    assert storico == [(APERTURA, "WARNING"), (CHIUSURA, "OK"), (APERTURA, "CRITICAL")]
+    assert aperti == [("Serra_1", "pH", "CRITICAL", "2025-01-01T00:00:02")]
+
+def test_riapertura_nello_stesso_flush(db_temporaneo):
+    coda = CodaIngestione(soglia_righe=1000, intervallo_flush=60)
+    for transizione in _TRANSIZIONI:  # Un tick per transizione, come accoda_transizioni_allarmi
+        for query, righe in gruppi_transizioni_allarmi([transizione]): coda.accoda_blocco(query, righe)
+    coda.avvia(); coda.ferma()
+    assert coda.statistiche()["batch_scritti"] == 1
+    _verifica_riapertura()
+
+def test_riapertura_nelle_stesse_transizioni(db_temporaneo):
+    registra_transizioni_allarmi(_TRANSIZIONI)
+    _verifica_riapertura()
+
+def test_rollup_preaggregati_scritti_una_volta(db_temporaneo):
+    (sorgente, tipo), = ids_sensori([("Serra_1", "pH")])
+    blocchi = [[(sorgente, tipo, 7.0 + i, 1_700_000_000_000 + i * 1000)] for i in range(3)]
+    coda = CodaIngestione(soglia_righe=1000, intervallo_flush=60)
+    coda.accoda_blocco(QUERY_INSERT_MISURAZIONE, blocchi[0], righe_rollup(blocchi[0]))
+    coda.accoda_blocco(QUERY_INSERT_MISURAZIONE, blocchi[1], righe_rollup(blocchi[1]))
+    coda.accoda_blocco(QUERY_INSERT_MISURAZIONE, blocchi[2])  # Rollup calcolati da esegui_batch
+    coda.avvia(); coda.ferma()
+    with connessione_lettura() as conn:
+        rollup = conn.execute("SELECT risoluzione_s, SUM(conteggio), SUM(somma) FROM rollup_misurazioni GROUP BY risoluzione_s").fetchall()
+        assert conn.execute("SELECT COUNT(*) FROM misurazioni_compatte").fetchone()[0] == 3
+    assert sorted(rollup) == [(risoluzione, 3, 24.0) for risoluzione in sorted(RISOLUZIONI_ROLLUP)]
+
+def test_rollup_upsert_su_piu_batch(db_temporaneo):
+    (sorgente, tipo), = ids_sensori([("Serra_1", "pH")])
+    inizio = 19675 * 86_400_000  # Mezzanotte UTC: minuto, ora e giorno iniziano insieme
+    esegui_batch([(QUERY_INSERT_MISURAZIONE, [(sorgente, tipo, 5.0, inizio + 30_000), (sorgente, tipo, 9.0, inizio + 10_000)])])
+    # Secondo batch nello stesso minuto con una lettura arrivata in ritardo (non deve diventare "ultimo") e una nel minuto dopo
+    esegui_batch([(QUERY_INSERT_MISURAZIONE, [(sorgente, tipo, 2.0, inizio + 20_000), (sorgente, tipo, 7.0, inizio + 90_000)])])
+    with connessione_lettura() as conn:
+        rollup = conn.execute("SELECT risoluzione_s, bucket_ms, minimo, massimo, somma, conteggio, ultimo, ultimo_ts_ms "
+                              "FROM rollup_misurazioni ORDER BY risoluzione_s, bucket_ms").fetchall()
+        attesi = conn.execute("SELECT r.s, ts_ms - ts_ms % (r.s * 1000) AS bucket, MIN(valore), MAX(valore), SUM(valore), COUNT(*) "
+                              "FROM misurazioni_compatte, (SELECT 60 AS s UNION ALL SELECT 3600 UNION ALL SELECT 86400) r "
+                              "GROUP BY r.s, bucket ORDER BY r.s, bucket").fetchall()
+    assert [riga[:6] for riga in rollup] == attesi
+    assert rollup == [(60, inizio, 2.0, 9.0, 16.0, 3, 5.0, inizio + 30_000), (60, inizio + 60_000, 7.0, 7.0, 7.0, 1, 7.0, inizio + 90_000),
+                      (3600, inizio, 2.0, 9.0, 23.0, 4, 7.0, inizio + 90_000), (86400, inizio, 2.0, 9.0, 23.0, 4, 7.0, inizio + 90_000)]
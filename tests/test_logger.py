@@ -0,0 +1,25 @@
+# tests/test_logger.py
+
+import logging
+import queue
+from infrastruttura import logger
+
+class _Raccolti(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messaggi = []
+    def emit(self, record): self.messaggi.append(record.msg)
+
+def _record(messaggio):
+    return logging.LogRecord("test", logging.INFO, __file__, 0, messaggio, None, None)
+
+def test_coda_piena_perde_solo_le_letture(monkeypatch):
+    monkeypatch.setattr(logger, "ATTESA_CODA_PIENA_SECONDI", 0.01)
+    raccolti = _Raccolti()
+    handler = logger.CodaLogNonBloccante(queue.Queue(1), [raccolti])
+    handler.emit(_record("primo"))  # Riempie la coda
+    handler.emit(_record({"sorgente_id": "Serra_1", "tipo": "pH", "valore": 7.0, "stato": "OK"}))
+    handler.emit(_record("messaggio di sistema"))
+    assert (handler.perse, handler.sincrone) == (1, 1)
+    assert raccolti.messaggi == ["messaggio di sistema"]
+    assert handler.queue.get_nowait().msg == "primo"
@@ -0,0 +1,52 @@
+# tests/test_migrazioni.py
+
+import sqlite3
+from infrastruttura import database
+from infrastruttura.migrazioni import MIGRAZIONI, _SCHEMA_INIZIALE, applica_migrazioni, versione_schema
+
+_LETTURE = [(1, "Serra_1", "pH", 7.1, "2025-01-01T00:00:00"), (2, "Serra_1", "Temperatura", 25.5, "2025-01-01T00:00:30.250"),
+            (3, "Pesci_1", "pH", 6.9, "2025-01-01T00:01:10")]
+
+def _database_versione_0(percorso):
+    # Come i database creati prima delle migrazioni: tabelle originali e user_version 0
+    conn = sqlite3.connect(percorso)
+    for istruzione in _SCHEMA_INIZIALE: conn.execute(istruzione)
+    conn.executemany("INSERT INTO misurazioni (id, sorgente_id, tipo, valore, timestamp) VALUES (?, ?, ?, ?, ?)", _LETTURE)
+    conn.commit(); conn.close()
+
+def test_migrazioni_da_versione_0(tmp_path, monkeypatch, capsys):
+    database.chiudi_database()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "v0.db"))
+    _database_versione_0(database.DB_PATH)
+    try:
+        database.setup_database()
+        with database.connessione_lettura() as conn:
+            assert versione_schema(conn) == MIGRAZIONI[-1][0]
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # INCREMENTAL dopo il VACUUM della migrazione 4
+            assert conn.execute("SELECT id, sorgente_id, tipo, valore, timestamp FROM misurazioni ORDER BY id").fetchall() == [
+                (id_, sorgente, tipo, valore, timestamp if "." in timestamp else timestamp + ".000") for id_, sorgente, tipo, valore, timestamp in _LETTURE]
+            assert conn.execute("SELECT COUNT(*) FROM sorgenti").fetchone()[0] == 2
+            assert conn.execute("SELECT COUNT(*) FROM tipi_sensore").fetchone()[0] == 2
+            assert conn.execute("SELECT risoluzione_s, SUM(conteggio) FROM rollup_misurazioni GROUP BY 1 ORDER BY 1").fetchall() == [(60, 3), (3600, 3), (86400, 3)]
+        capsys.readouterr()
+        database.chiudi_database()
+        database.setup_database()  # Di nuovo: nessuna migrazione da applicare
+        assert "Migrazione" not in capsys.readouterr().out
+        with database.connessione_lettura() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM misurazioni_compatte").fetchone()[0] == len(_LETTURE)
+    finally:
+        database.chiudi_database()
+
+def test_migrazione_allarmi_per_transizioni(tmp_path):
+    conn = sqlite3.connect(tmp_path / "v6.db", isolation_level=None)
+    applica_migrazioni(conn, MIGRAZIONI[:6])
+    conn.executemany("INSERT INTO stati_attuali VALUES (?, ?, ?, ?)", [("Serra_1", "pH", "WARNING", "2025-01-01T00:00:00"),
+                                                                      ("Serra_1", "Temperatura", "OK", "2025-01-01T00:00:00"),
+                                                                      ("Pesci_1", "Ossigeno", "CRITICAL", "2025-01-01T00:00:05")])
+    conn.execute("INSERT INTO storico_allarmi (sorgente_id, tipo, stato, azioni, timestamp) VALUES ('Serra_1', 'pH', 'WARNING', '[]', '2025-01-01T00:00:00')")
+    assert applica_migrazioni(conn) == 7
+    assert conn.execute("SELECT evento FROM storico_allarmi").fetchall() == [("APERTURA",)]
+    assert conn.execute("SELECT sorgente_id, tipo, stato, aperto_il FROM allarmi_aperti ORDER BY sorgente_id").fetchall() == [
+        ("Pesci_1", "Ossigeno", "CRITICAL", "2025-01-01T00:00:05"), ("Serra_1", "pH", "WARNING", "2025-01-01T00:00:00")]
+    assert versione_schema(conn) == 7
+    conn.close()
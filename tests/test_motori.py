@@ -0,0 +1,24 @@
+# tests/test_motori.py
+
+from infrastruttura.motori import MotoreCombinato, MotoreDati, MotoreMemoria
+
+class _MotoreFisso(MotoreDati):
+    def ultime_misurazioni(self, filtro, valore, limite): return "sqlite"
+    def stati_attuali(self): return "sqlite"
+
+def test_memoria_ripiega_se_mancano_letture():
+    memoria = MotoreMemoria.crea(nome=None, sensori_massimi=4, capacita=4)
+    for secondo in range(6): memoria.scrivi_misurazione("Serra_1", "pH", 7.0 + secondo, f"2025-01-01T00:00:0{secondo}")
+    df = memoria.ultime_misurazioni("sorgente_id", "Serra_1", 3)
+    assert df["valore"].tolist() == [12.0, 11.0, 10.0]
+    assert memoria.ultime_misurazioni("sorgente_id", "Serra_1", 5) is None  # Solo 4 letture nel ring buffer
+    assert MotoreCombinato(memoria, _MotoreFisso()).ultime_misurazioni("sorgente_id", "Serra_1", 5) == "sqlite"
+
+def test_memoria_piena_ripiega_su_sqlite():
+    memoria = MotoreMemoria.crea(nome=None, sensori_massimi=2, capacita=4)
+    for tipo in ("pH", "temperatura"): memoria.scrivi_misurazione("Serra_1", tipo, 7.0, "2025-01-01T00:00:00")
+    assert set(memoria.stati_attuali()) == {("Serra_1", "pH"), ("Serra_1", "temperatura")}
+    memoria.scrivi_misurazione("Serra_2", "pH", 7.0, "2025-01-01T00:00:00")  # Nessuno slot libero
+    combinato = MotoreCombinato(memoria, _MotoreFisso())
+    assert combinato.stati_attuali() == "sqlite"
+    assert combinato.ultime_misurazioni("sorgente_id", "Serra_1", 1) == "sqlite"
@@ -0,0 +1,44 @@
+# tests/test_paginazione.py
+
+import sqlite3
+import pandas as pd
+import pytest
+from dashboard.utils.paginazione import cursore_fine, query_pagina
+
+def _tutte_le_pagine(percorso, sort_by, righe=3):
+    ids, cursore = [], None
+    with sqlite3.connect(percorso) as conn:
+        for _ in range(10):  # Un cursore che non avanza ripeterebbe le stesse pagine all'infinito
+            query, params = query_pagina("dati_produzione", sort_by=sort_by, righe=righe, cursore=cursore)
+            df = pd.read_sql_query(query, conn, params=params)
+            ids += df["id"].tolist()
+            cursore = cursore_fine(df)
+            if len(df) < righe: break
+    return ids
+
+@pytest.mark.parametrize("direzione", ["asc", "desc"])
+def test_keyset_non_perde_righe_con_ordinamento_null(db_temporaneo, direzione):
+    with sqlite3.connect(db_temporaneo) as conn:
+        conn.executemany("INSERT INTO dati_produzione (id, timestamp, descrizione) VALUES (?, ?, ?)",
+                         [(i, f"2024-01-01T00:00:{i:02d}", None if i % 2 else f"nota {i}") for i in range(1, 11)])
+    ids = _tutte_le_pagine(db_temporaneo, [{"column_id": "descrizione", "direction": direzione}])
+    nulli, valori = [1, 3, 5, 7, 9], [10, 2, 4, 6, 8]  # "nota 10" < "nota 2" come testo
+    assert ids == (nulli + valori if direzione == "asc" else valori[::-1] + nulli[::-1])
+
+def _ids_filtrati(percorso, tabella, filtro):
+    with sqlite3.connect(percorso) as conn:
+        query, params = query_pagina(tabella, filter_query=filtro, righe=100)
+        return sorted(pd.read_sql_query(query, conn, params=params)["_chiave"].tolist())
+
+@pytest.mark.parametrize("filtro, attesi", [
+    ("{tipo} i= ph", [1]), ("{tipo} s= ph", []), ("{tipo} = pH", [1]), ("{tipo} ieq TEMPERATURA", [2]),
+    ("{tipo} scontains H", [1]), ("{tipo} scontains h", []), ("{tipo} icontains h", [1]), ("{tipo} contains ERA", [2]),
+])
+def test_filtri_con_prefisso_maiuscole(db_temporaneo, filtro, attesi):
+    from infrastruttura.database import insert_misurazione
+    insert_misurazione("Serra_1", "pH", 7.0, "2025-01-01T00:00:00")
+    insert_misurazione("Serra_1", "Temperatura", 25.0, "2025-01-01T00:00:00")
+    assert _ids_filtrati(db_temporaneo, "misurazioni", filtro) == attesi
+    with sqlite3.connect(db_temporaneo) as conn:
+        conn.executemany("INSERT INTO stati_attuali VALUES ('Serra_1', ?, 'OK', '2025-01-01T00:00:00')", [("pH",), ("Temperatura",)])
+    assert _ids_filtrati(db_temporaneo, "stati_attuali", filtro) == attesi
@@ -0,0 +1,11 @@
+# tests/test_piani_query.py
+
+from infrastruttura.piani_query import problemi_piano, verifica_piani_query
+
+def test_query_dashboard_usano_indici(db_temporaneo):
+    assert verifica_piani_query() == {}
+
+def test_problemi_piano_segnala_scansioni_e_ordinamenti():
+    piano = [(2, 0, 0, "SCAN misurazioni"), (3, 0, 0, "USE TEMP B-TREE FOR ORDER BY"),
+             (4, 0, 0, "SCAN stati_attuali"), (5, 0, 0, "SEARCH misurazioni USING COVERING INDEX idx (tipo=?)")]
+    assert problemi_piano(piano) == ["SCAN misurazioni", "USE TEMP B-TREE FOR ORDER BY"]
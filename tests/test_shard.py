@@ -0,0 +1,33 @@
+# tests/test_shard.py
+
+from simulazione.shard import partiziona_sorgenti
+
+def _letture_al_secondo(gruppo):
+    return sum(1 / intervallo for _, _, intervallo in gruppo)
+
+def test_partiziona_sorgenti_non_divide_e_bilancia():
+    sensori = [(f"Serra_{i}", tipo, 1) for i in range(4) for tipo in ("pH", "Temperatura", "Umidità")]
+    sensori += [(f"Pannello_{i}", "Produzione", 10) for i in range(6)]
+    shard = partiziona_sorgenti(sensori, 3)
+    assert sorted(sensore for gruppo in shard for sensore in gruppo) == sorted(sensori)
+    sorgenti = [{sorgente for sorgente, _, _ in gruppo} for gruppo in shard]
+    assert sum(len(s) for s in sorgenti) == len(set.union(*sorgenti))  # Ogni sorgente in un solo shard
+    carichi = [_letture_al_secondo(gruppo) for gruppo in shard]
+    assert max(carichi) - min(carichi) <= 3  # Al più il peso della sorgente più pesante (3 letture/s)
+
+def test_partiziona_sorgenti_con_meno_sorgenti_che_shard():
+    shard = partiziona_sorgenti([("Serra_1", "pH", 1), ("Serra_1", "Temperatura", 1)], 4)
+    assert shard == [[("Serra_1", "pH", 1), ("Serra_1", "Temperatura", 1)]]
+
+def test_errore_nel_principale_non_blocca_gli_shard(db_temporaneo, monkeypatch):
+    import time
+    from datetime import timedelta
+    import pytest
+    from simulazione import shard
+    def produzione_fallita(*args, **kwargs): raise RuntimeError("produzione fallita")
+    monkeypatch.setattr(shard, "simula_ciclo_produzione", produzione_fallita)
+    sensori = [(f"Serra_{i}", "pH", 1) for i in range(2)]
+    inizio = time.monotonic()
+    with pytest.raises(RuntimeError, match="produzione fallita"):
+        shard.esegui_backfill_parallelo(sensori, timedelta(days=2), num_shard=2)
+    assert time.monotonic() - inizio < shard.TIMEOUT_CHIUSURA_SHARD_SECONDI